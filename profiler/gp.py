@@ -0,0 +1,53 @@
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import timeit
+
+import torch
+
+import pyro
+import pyro.poutine as poutine
+from pyro.contrib.gp.kernels import RBF
+from pyro.contrib.gp.models import GPRegression
+from pyro.contrib.gp.util import CGSolver
+
+
+def make_model(N, solver):
+    X = torch.rand(N, 2) * 10
+    y = torch.sin(X).sum(-1) + 0.1 * torch.randn(N)
+    return GPRegression(X, y, RBF(input_dim=2), noise=torch.tensor(0.1), solver=solver)
+
+
+def log_likelihood_and_grad(gpr):
+    loss = -poutine.trace(gpr.model).get_trace().log_prob_sum()
+    loss.backward()
+
+
+def predict(gpr, Xnew):
+    with torch.no_grad():
+        gpr(Xnew)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profiling Cholesky and conjugate gradient solvers '
+                                                 'of pyro.contrib.gp.models.GPRegression.')
+    parser.add_argument('--sizes', nargs='*', type=int, default=[500, 1000, 2000, 4000],
+                        help='Numbers of training points. Default = [500, 1000, 2000, 4000]')
+    parser.add_argument('--num-test', default=100, type=int, help='Number of test points.')
+    parser.add_argument('--repeat', default=3, type=int,
+                        help='Number of repetitions of each timing, the minimum is reported.')
+    args = parser.parse_args()
+
+    pyro.set_rng_seed(0)
+    Xnew = torch.rand(args.num_test, 2) * 10
+    print('{:>8} {:>10} {:>16} {:>12}'.format('N', 'solver', 'loglik+grad (s)', 'predict (s)'))
+    for N in args.sizes:
+        for name, solver in [('cholesky', None), ('cg', CGSolver())]:
+            gpr = make_model(N, solver)
+            train_time = min(timeit.repeat(lambda: log_likelihood_and_grad(gpr), repeat=args.repeat, number=1))
+            predict_time = min(timeit.repeat(lambda: predict(gpr, Xnew), repeat=args.repeat, number=1))
+            print('{:>8} {:>10} {:>16.4f} {:>12.4f}'.format(N, name, train_time, predict_time))
+
+
+if __name__ == '__main__':
+    main()
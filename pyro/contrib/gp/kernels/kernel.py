@@ -2,6 +2,8 @@ from __future__ import absolute_import, division, print_function
 
 import numbers
 
+import torch
+
 from pyro.contrib.gp.parameterized import Parameterized
 
 
@@ -51,6 +53,59 @@ class Kernel(Parameterized):
         """
         raise NotImplementedError
 
+    def matmul(self, X, Z, V, block_size=1024):
+        r"""
+        Calculates the product :math:`k(X, Z) V` tile by tile, so that only
+        ``block_size`` :math:`\times` ``block_size`` tiles of the covariance matrix
+        are held in memory at once. Kernels derived from other kernels evaluate and
+        combine their components tile by tile.
+
+        :param torch.Tensor X: A 2D tensor with shape :math:`N \times input\_dim`.
+        :param torch.Tensor Z: An (optional) 2D tensor with shape
+            :math:`M \times input\_dim`. If ``None``, it is taken to be :math:`X`.
+        :param torch.Tensor V: A tensor with shape :math:`M` or :math:`M \times K`.
+        :param int block_size: The number of rows and columns of each tile.
+        :returns: a tensor with shape :math:`N` or :math:`N \times K`
+        :rtype: torch.Tensor
+        """
+        Xs = X.split(block_size)
+        Zs = Xs if Z is None else Z.split(block_size)
+        Vs = V.split(block_size)
+        result = []
+        for i, Xb in enumerate(Xs):
+            KV = 0
+            for j, (Zb, Vb) in enumerate(zip(Zs, Vs)):
+                # diagonal tiles of k(X, X) are computed with Z=None, e.g. for WhiteNoise
+                Kb = self(Xb) if Z is None and i == j else self(Xb, Zb)
+                KV = KV + Kb.matmul(Vb)
+            result.append(KV)
+        return torch.cat(result)
+
+    def iter_diag_plus_low_rank(self, X, Xu, Luu, block_size=1024):
+        r"""
+        Iterates block by block over the diagonal plus low rank decomposition
+
+            :math:`k(X, X) \approx W^T W + \mathrm{diag}(d),`
+
+        where :math:`W = L_{uu}^{-1} k(X_u, X)` for the Cholesky decomposition
+        :math:`L_{uu}` of :math:`k(X_u, X_u)`, and :math:`d` is chosen so that the
+        decomposition is exact on the diagonal. The cross covariance
+        :math:`k(X_u, X)` is never held in memory at once.
+
+        :param torch.Tensor X: A 2D tensor with shape :math:`N \times input\_dim`.
+        :param torch.Tensor Xu: Inducing points with shape :math:`M \times input\_dim`.
+        :param torch.Tensor Luu: Lower triangular decomposition of
+            :math:`k(X_u, X_u)` (with jitter).
+        :param int block_size: The number of rows of :math:`X` in each block.
+        :returns: an iterator of pairs ``(W_block, d_block)`` with shapes
+            :math:`M \times block\_size` and :math:`block\_size`, for consecutive
+            blocks of rows of :math:`X`.
+        """
+        for Xb in X.split(block_size):
+            Wb = self(Xu, Xb).trtrs(Luu, upper=False)[0]
+            db = self(Xb, diag=True) - Wb.pow(2).sum(dim=0)
+            yield Wb, db
+
     def _slice_input(self, X):
         r"""
         Slices :math:`X` according to ``self.active_dims``. If ``X`` is 1D then returns
@@ -167,6 +222,14 @@ class VerticalScaling(Transforming):
             return (self.vscaling_fn(X).unsqueeze(1) * self.kern(X, Z, diag=diag) *
                     self.vscaling_fn(Z).unsqueeze(0))
 
+    def matmul(self, X, Z, V, block_size=1024):
+        # f(X) * k(X, Z) * f(Z) @ V = f(X) * (k(X, Z) @ (f(Z) * V))
+        fX = self.vscaling_fn(X)
+        fZ = fX if Z is None else self.vscaling_fn(Z)
+        if V.dim() == 2:
+            return fX.unsqueeze(1) * self.kern.matmul(X, Z, fZ.unsqueeze(1) * V, block_size)
+        return fX * self.kern.matmul(X, Z, fZ * V, block_size)
+
 
 def _Horner_evaluate(x, coef):
     """
@@ -235,3 +298,12 @@ class Warping(Transforming):
             return K_iwarp
         else:
             return _Horner_evaluate(K_iwarp, self.owarping_coef)
+
+    def matmul(self, X, Z, V, block_size=1024):
+        if self.owarping_coef is not None:
+            return super(Warping, self).matmul(X, Z, V, block_size)
+        # warp inputs once rather than once per tile
+        if self.iwarping_fn is not None:
+            X = self.iwarping_fn(X)
+            Z = None if Z is None else self.iwarping_fn(Z)
+        return self.kern.matmul(X, Z, V, block_size)
@@ -45,7 +45,8 @@ class GPRegression(GPModel):
 
     .. note:: This model has :math:`\mathcal{O}(N^3)` complexity for training,
         :math:`\mathcal{O}(N^3)` complexity for testing. Here, :math:`N` is the number
-        of train inputs.
+        of train inputs. After calling :meth:`precompute`, testing has
+        :math:`\mathcal{O}(N^2)` complexity per test input.
 
     Reference:
 
@@ -63,25 +64,41 @@ class GPRegression(GPModel):
         process. By default, we use zero mean.
     :param float jitter: A small positive term which is added into the diagonal part of
         a covariance matrix to help stablize its Cholesky decomposition.
+    :param ~pyro.contrib.gp.util.CGSolver solver: An optional iterative solver, which
+        replaces Cholesky decompositions in :meth:`model` and :meth:`forward` by
+        conjugate gradients and stochastic Lanczos quadrature, for large :math:`N`.
+        In that case :meth:`model` computes a stochastic estimate of the log
+        likelihood and :meth:`forward` is not differentiable with respect to
+        parameters. By default, Cholesky decompositions are used.
     """
-    def __init__(self, X, y, kernel, noise=None, mean_function=None, jitter=1e-6):
+    def __init__(self, X, y, kernel, noise=None, mean_function=None, jitter=1e-6, solver=None):
         super(GPRegression, self).__init__(X, y, kernel, mean_function, jitter)
 
         noise = self.X.new_tensor(1.) if noise is None else noise
         self.noise = Parameter(noise)
         self.set_constraint("noise", torchdist.constraints.positive)
+        self.solver = solver
 
     @autoname.scope(prefix="GPR")
     def model(self):
         self.set_mode("model")
 
         N = self.X.size(0)
+        zero_loc = self.X.new_zeros(N)
+        f_loc = zero_loc + self.mean_function(self.X)
+        if self.solver is not None:
+            if self.y is None:
+                f_var = self.kernel(self.X, diag=True) + self.jitter + self.noise
+                return f_loc, f_var
+            log_likelihood = self.solver.log_likelihood(self.kernel, self.X, self.jitter + self.noise,
+                                                        self.y - f_loc)
+            return pyro.sample("y", dist.Delta(self.y, log_likelihood, event_dim=self.y.dim()),
+                               obs=self.y)
+
         Kff = self.kernel(self.X)
         Kff.view(-1)[::N + 1] += self.jitter + self.noise  # add noise to diagonal
         Lff = Kff.cholesky()
 
-        zero_loc = self.X.new_zeros(self.X.size(0))
-        f_loc = zero_loc + self.mean_function(self.X)
         if self.y is None:
             f_var = Lff.pow(2).sum(dim=-1)
             return f_loc, f_var
@@ -118,15 +135,41 @@ class GPRegression(GPModel):
         """
         self._check_Xnew_shape(Xnew)
         self.set_mode("guide")
+        return self._predict_batched(Xnew, full_cov, noiseless)
 
+    def _compute_predictive_state(self):
         N = self.X.size(0)
+        y_residual = self.y - self.mean_function(self.X)
+        if self.solver is not None:
+            alpha = self.solver.solve(self.kernel, self.X, self.jitter + self.noise,
+                                      y_residual.reshape(-1, N).t())
+            return None, alpha
+
         Kff = self.kernel(self.X).contiguous()
         Kff.view(-1)[::N + 1] += self.jitter + self.noise  # add noise to the diagonal
         Lff = Kff.cholesky()
+        return Lff, y_residual
 
-        y_residual = self.y - self.mean_function(self.X)
-        loc, cov = conditional(Xnew, self.X, self.kernel, y_residual, None, Lff,
-                               full_cov, jitter=self.jitter)
+    def _predict(self, Xnew, state, full_cov=False, noiseless=True):
+        if self.solver is None:
+            Lff, y_residual = state
+            loc, cov = conditional(Xnew, self.X, self.kernel, y_residual, None, Lff,
+                                   full_cov, jitter=self.jitter)
+        else:
+            # loc = Ksf @ inv(Kff) @ y_residual
+            # cov = Kss - Ksf @ inv(Kff) @ Kfs
+            _, alpha = state
+            C = Xnew.size(0)
+            latent_shape = self.y.shape[:-1]
+            Kfs = self.kernel(self.X, Xnew)
+            loc = Kfs.t().matmul(alpha).t().reshape(latent_shape + (C,))
+            Kffinv_Kfs = self.solver.solve(self.kernel, self.X, self.jitter + self.noise, Kfs)
+            if full_cov:
+                cov = self.kernel(Xnew) - Kfs.t().matmul(Kffinv_Kfs)
+                cov = cov.expand(latent_shape + (C, C))
+            else:
+                cov = self.kernel(Xnew, diag=True) - (Kfs * Kffinv_Kfs).sum(dim=0)
+                cov = cov.expand(latent_shape + (C,))
 
         if full_cov and not noiseless:
             M = Xnew.size(0)
@@ -165,8 +208,10 @@ class GPRegression(GPModel):
         N = X.size(0)
         Kff = self.kernel(X).contiguous()
         Kff.view(-1)[::N + 1] += noise  # add noise to the diagonal
+        Lff = Kff.cholesky()
+        logdet = 2 * Lff.diag().log().sum()
 
-        outside_vars = {"X": X, "y": y, "N": N, "Kff": Kff}
+        outside_vars = {"X": X, "y": y, "N": N, "Lff": Lff, "logdet": logdet}
 
         def sample_next(xnew, outside_vars):
             """Repeatedly samples from the Gaussian process posterior,
@@ -175,10 +220,7 @@ class GPRegression(GPModel):
             warn_if_nan(xnew)
 
             # Variables from outer scope
-            X, y, Kff = outside_vars["X"], outside_vars["y"], outside_vars["Kff"]
-
-            # Compute Cholesky decomposition of kernel matrix
-            Lff = Kff.cholesky()
+            X, y, Lff = outside_vars["X"], outside_vars["y"], outside_vars["Lff"]
             y_residual = y - self.mean_function(X)
 
             # Compute conditional mean and variance
@@ -189,19 +231,23 @@ class GPRegression(GPModel):
 
             ynew = torchdist.Normal(loc + self.mean_function(xnew), cov.sqrt()).rsample()
 
-            # Update kernel matrix
+            # Extend the Cholesky decomposition of the kernel matrix by a new row:
+            # [[Lff, 0], [v.T, pivot]] with v = inv(Lff) @ cross and
+            # pivot^2 = end - v.T @ v
             N = outside_vars["N"]
-            Kffnew = Kff.new_empty(N+1, N+1)
-            Kffnew[:N, :N] = Kff
-            cross = self.kernel(X, xnew).squeeze()
-            end = self.kernel(xnew, xnew).squeeze()
-            Kffnew[N, :N] = cross
-            Kffnew[:N, N] = cross
+            cross = self.kernel(X, xnew).reshape(N, 1)
             # No noise, just jitter for numerical stability
-            Kffnew[N, N] = end + self.jitter
+            end = self.kernel(xnew, xnew).squeeze() + self.jitter
+            v = cross.trtrs(Lff, upper=False)[0].squeeze(-1)
+            pivot_sq = end - v.pow(2).sum()
             # Heuristic to avoid adding degenerate points
-            if Kffnew.logdet() > -15.:
-                outside_vars["Kff"] = Kffnew
+            if pivot_sq > 0 and outside_vars["logdet"] + pivot_sq.log() > -15.:
+                Lffnew = Lff.new_zeros(N + 1, N + 1)
+                Lffnew[:N, :N] = Lff
+                Lffnew[N, :N] = v
+                Lffnew[N, N] = pivot_sq.sqrt()
+                outside_vars["Lff"] = Lffnew
+                outside_vars["logdet"] = outside_vars["logdet"] + pivot_sq.log()
                 outside_vars["N"] += 1
                 outside_vars["X"] = torch.cat((X, xnew))
                 outside_vars["y"] = torch.cat((y, ynew))
@@ -1,5 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
+import torch
+
 from pyro.contrib.gp.parameterized import Parameterized
 
 
@@ -94,6 +96,7 @@ class GPModel(Parameterized):
         self.mean_function = (mean_function if mean_function is not None else
                               _zero_mean_function)
         self.jitter = jitter
+        self._step_cache = None
 
     def model(self):
         """
@@ -190,6 +193,86 @@ class GPModel(Parameterized):
                              .format(X.size(0), y.size(-1)))
         self.X = X
         self.y = y
+        self._predictive_cache = None
+
+    def precompute(self, batch_size=None):
+        """
+        Computes and caches the parts of the posterior predictive distribution
+        which depend only on train data and parameters (e.g. Cholesky
+        decompositions of train covariance matrices), so that subsequent calls
+        to :meth:`forward` only evaluate kernels at test inputs and solve
+        triangular systems.
+
+        The cache is recomputed lazily whenever a parameter value changes and is
+        dropped by :meth:`set_data`. Cached values are detached, so predictions
+        are not differentiable with respect to the model's parameters. Parameters
+        with priors are fixed at the values drawn from their guides when the
+        cache is computed.
+
+        :param int batch_size: An optional maximum number of test inputs to predict
+            at once when ``full_cov=False``, to bound peak memory.
+        """
+        self.set_mode("guide")
+        self._predictive_cache = {"batch_size": batch_size, "snapshot": None, "state": None}
+        self._get_predictive_state()
+
+    def _compute_predictive_state(self):
+        """
+        Computes the cacheable part of the posterior predictive distribution.
+        """
+        raise NotImplementedError
+
+    def _predict(self, Xnew, state, full_cov=False, noiseless=True):
+        """
+        Computes the posterior predictive distribution at ``Xnew`` given the
+        result of :meth:`_compute_predictive_state`.
+        """
+        raise NotImplementedError
+
+    def _get_predictive_state(self):
+        cache = self._predictive_cache
+        if cache is None:
+            return self._compute_predictive_state()
+
+        params = list(self.parameters())
+        snapshot = cache["snapshot"]
+        if (snapshot is None or len(snapshot) != len(params) or
+                not all(p is p_old and torch.equal(p, value) for p, (p_old, value) in zip(params, snapshot))):
+            with torch.no_grad():
+                cache["snapshot"] = [(p, p.detach().clone()) for p in params]
+                cache["state"] = self._compute_predictive_state()
+        return cache["state"]
+
+    def _predict_batched(self, Xnew, full_cov=False, noiseless=True):
+        state = self._get_predictive_state()
+        batch_size = None if self._predictive_cache is None else self._predictive_cache["batch_size"]
+        if full_cov or batch_size is None or Xnew.size(0) <= batch_size:
+            return self._predict(Xnew, state, full_cov, noiseless)
+
+        locs, covs = zip(*(self._predict(Xnew_batch, state, full_cov, noiseless)
+                           for Xnew_batch in Xnew.split(batch_size)))
+        return torch.cat(locs, dim=-1), torch.cat(covs, dim=-1)
+
+    def _kernel_cholesky(self, Z):
+        """
+        Computes the lower triangular decomposition of ``kernel(Z)`` plus jitter.
+
+        During an evaluation of the loss in :func:`~pyro.contrib.gp.util.train_minibatch`,
+        parameters do not change, so the decomposition is reused by repeated calls
+        of :meth:`model` (e.g. for several ELBO particles), unless some parameter
+        has a prior and hence is redrawn at each call.
+        """
+        cache = self._step_cache
+        if cache is not None and cache.get("Z") is Z:
+            return cache["L"]
+
+        N = Z.size(0)
+        K = self.kernel(Z).contiguous()
+        K.view(-1)[::N + 1] += self.jitter  # add jitter to the diagonal
+        L = K.cholesky()
+        if cache is not None and not any(m._priors for m in self.modules() if isinstance(m, Parameterized)):
+            cache["Z"], cache["L"] = Z, L
+        return L
 
     def _check_Xnew_shape(self, Xnew):
         """
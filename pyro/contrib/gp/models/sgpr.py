@@ -197,35 +197,39 @@ class SparseGPRegression(GPModel):
         # cov = Kss - Ksu @ inv(Kuu) @ Kus + Ksu @ S @ Kus
         #     = kss - Ksu @ inv(Kuu) @ Kus + Ws.T @ inv(L).T @ inv(L) @ Ws
 
+        return self._predict_batched(Xnew, full_cov, noiseless)
+
+    def _compute_predictive_state(self):
         N = self.X.size(0)
         M = self.Xu.size(0)
 
-        # TODO: cache these calculations to get faster inference
-
         Kuu = self.kernel(self.Xu).contiguous()
         Kuu.view(-1)[::M + 1] += self.jitter  # add jitter to the diagonal
         Luu = Kuu.cholesky()
 
-        Kuf = self.kernel(self.Xu, self.X)
-
-        W = Kuf.trtrs(Luu, upper=False)[0]
-        D = self.noise.expand(N)
-        if self.approx == "FITC":
-            Kffdiag = self.kernel(self.X, diag=True)
-            Qffdiag = W.pow(2).sum(dim=0)
-            D = D + Kffdiag - Qffdiag
-
-        W_Dinv = W / D
-        K = W_Dinv.matmul(W.t()).contiguous()
-        K.view(-1)[::M + 1] += 1  # add identity matrix to K
-        L = K.cholesky()
-
         # get y_residual and convert it into 2D tensor for packing
         y_residual = self.y - self.mean_function(self.X)
         y_2D = y_residual.reshape(-1, N).t()
-        W_Dinv_y = W_Dinv.matmul(y_2D)
 
-        # End caching ----------
+        # accumulate K = I + W @ inv(D) @ W.T and W @ inv(D) @ y block by block of X,
+        # so that Kuf is never held in memory at once
+        K = torch.eye(M, dtype=Luu.dtype, device=Luu.device)
+        W_Dinv_y = 0
+        start = 0
+        for Wb, db in self.kernel.iter_diag_plus_low_rank(self.X, self.Xu, Luu):
+            end = start + Wb.size(1)
+            Db = self.noise.expand(end - start)
+            if self.approx == "FITC":
+                Db = Db + db
+            Wb_Dinv = Wb / Db
+            K = K + Wb_Dinv.matmul(Wb.t())
+            W_Dinv_y = W_Dinv_y + Wb_Dinv.matmul(y_2D[start:end])
+            start = end
+        L = K.cholesky()
+        return Luu, L, W_Dinv_y
+
+    def _predict(self, Xnew, state, full_cov=False, noiseless=True):
+        Luu, L, W_Dinv_y = state
 
         Kus = self.kernel(self.Xu, Xnew)
         Ws = Kus.trtrs(Luu, upper=False)[0]
@@ -6,9 +6,11 @@ from torch.nn import Parameter
 
 import pyro
 import pyro.distributions as dist
+import pyro.poutine as poutine
 from pyro.contrib import autoname
 from pyro.contrib.gp.models.model import GPModel
 from pyro.contrib.gp.util import conditional
+from pyro.contrib.minibatch import IndexStream
 from pyro.distributions.util import eye_like
 
 
@@ -78,15 +80,20 @@ class VariationalGP(GPModel):
 
         self.whiten = whiten
         self._sample_latent = True
+        self._data_source = None
+
+    def _get_data_source(self, data, subsample_size, prefetch):
+        if data is not None:
+            raise ValueError("VariationalGP has variational parameters for each of its data points, "
+                             "so it can only be trained on minibatches of its own data.")
+        return IndexStream(self.X.size(0), subsample_size)
 
     @autoname.scope(prefix="VGP")
     def model(self):
         self.set_mode("model")
 
         N = self.X.size(0)
-        Kff = self.kernel(self.X).contiguous()
-        Kff.view(-1)[::N + 1] += self.jitter  # add jitter to the diagonal
-        Lff = Kff.cholesky()
+        Lff = self._kernel_cholesky(self.X)
 
         zero_loc = self.X.new_zeros(self.f_loc.shape)
         if self.whiten:
@@ -107,8 +114,14 @@ class VariationalGP(GPModel):
         f_var = f_scale_tril.pow(2).sum(dim=-1)
         if self.y is None:
             return f_loc, f_var
-        else:
+        elif self._data_source is None:
             return self.likelihood(f_loc, f_var, self.y)
+        else:
+            # only evaluate the likelihood of the next minibatch, scaled up to N
+            with pyro.plate("data", N, subsample=self._data_source) as ind:
+                f_loc, f_var, y = f_loc[..., ind], f_var[..., ind], self.y[..., ind]
+            with poutine.scale(scale=N / ind.size(0)):
+                return self.likelihood(f_loc, f_var, y)
 
     @autoname.scope(prefix="VGP")
     def guide(self):
@@ -10,6 +10,7 @@ import pyro.poutine as poutine
 from pyro.contrib import autoname
 from pyro.contrib.gp.models.model import GPModel
 from pyro.contrib.gp.util import conditional
+from pyro.contrib.minibatch import DataSource, MemmapTensor
 from pyro.distributions.util import eye_like
 
 
@@ -69,7 +70,7 @@ class VariationalSparseGP(GPModel):
         For the multi-class classification problems, ``latent_shape[-1]`` should
         corresponse to the number of classes.
     :param int num_data: The size of full training dataset. It is useful for training
-        this model with mini-batch.
+        this model with mini-batch, see :func:`~pyro.contrib.gp.util.train_minibatch`.
     :param bool whiten: A flag to tell if variational parameters ``u_loc`` and
         ``u_scale_tril`` are transformed by the inverse of ``Luu``, where ``Luu`` is
         the lower triangular decomposition of :math:`kernel(X_u, X_u)`. Enable this
@@ -99,15 +100,25 @@ class VariationalSparseGP(GPModel):
         self.num_data = num_data if num_data is not None else self.X.size(0)
         self.whiten = whiten
         self._sample_latent = True
+        self._data_source = None
+
+    def _get_data_source(self, data, subsample_size, prefetch):
+        X, y = (self.X, self.y) if data is None else data
+        # DataSource reads data points along the first dim, whereas y has shape latent_shape + (N,)
+        if isinstance(y, MemmapTensor):
+            if len(y.shape) > 1:
+                raise ValueError("Expected a MemmapTensor y of one dim, but got shape {}."
+                                 .format(tuple(y.shape)))
+        else:
+            y = y.permute((y.dim() - 1,) + tuple(range(y.dim() - 1)))
+        return DataSource((X, y), subsample_size, prefetch=prefetch)
 
     @autoname.scope(prefix="VSGP")
     def model(self):
         self.set_mode("model")
 
         M = self.Xu.size(0)
-        Kuu = self.kernel(self.Xu).contiguous()
-        Kuu.view(-1)[::M + 1] += self.jitter  # add jitter to the diagonal
-        Luu = Kuu.cholesky()
+        Luu = self._kernel_cholesky(self.Xu)
 
         zero_loc = self.Xu.new_zeros(self.u_loc.shape)
         if self.whiten:
@@ -120,15 +131,23 @@ class VariationalSparseGP(GPModel):
                         dist.MultivariateNormal(zero_loc, scale_tril=Luu)
                             .to_event(zero_loc.dim() - 1))
 
-        f_loc, f_var = conditional(self.X, self.Xu, self.kernel, self.u_loc, self.u_scale_tril,
+        X, y, num_data = self.X, self.y, self.num_data
+        if self._data_source is not None:
+            # draw the next minibatch from the dataset
+            with pyro.plate("data", subsample=self._data_source) as ind:
+                X, y = self._data_source[ind]
+            y = y.permute(tuple(range(1, y.dim())) + (0,))
+            num_data = self._data_source.size
+
+        f_loc, f_var = conditional(X, self.Xu, self.kernel, self.u_loc, self.u_scale_tril,
                                    Luu, full_cov=False, whiten=self.whiten, jitter=self.jitter)
 
-        f_loc = f_loc + self.mean_function(self.X)
-        if self.y is None:
+        f_loc = f_loc + self.mean_function(X)
+        if y is None:
             return f_loc, f_var
         else:
-            with poutine.scale(scale=self.num_data / self.X.size(0)):
-                return self.likelihood(f_loc, f_var, self.y)
+            with poutine.scale(scale=num_data / X.size(0)):
+                return self.likelihood(f_loc, f_var, y)
 
     @autoname.scope(prefix="VSGP")
     def guide(self):
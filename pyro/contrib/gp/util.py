@@ -1,9 +1,14 @@
 from __future__ import absolute_import, division, print_function
 
+import math
+
 import torch
+import torch.utils.checkpoint
 
+from pyro.contrib.minibatch import prefetch as prefetch_iterable
 from pyro.infer import TraceMeanField_ELBO
 from pyro.infer.util import torch_backward, torch_item
+from pyro.ops.linalg import conjugate_gradient, lanczos_logdet, pivoted_cholesky
 
 
 def conditional(Xnew, X, kernel, f_loc, f_scale_tril=None, Lff=None, full_cov=False,
@@ -146,6 +151,157 @@ def conditional(Xnew, X, kernel, f_loc, f_scale_tril=None, Lff=None, full_cov=Fa
     return (loc, cov) if full_cov else (loc, var)
 
 
+class CGSolver(object):
+    r"""
+    Iterative linear algebra for Gaussian Process models with covariance matrix
+    :math:`K = k(X, X) + \sigma^2 I`, which needs only products with :math:`K`.
+    Solves use batched conjugate gradients, preconditioned by a low rank pivoted
+    Cholesky decomposition of :math:`k(X, X)`, and log determinants use
+    stochastic Lanczos quadrature. Products are computed tile by tile by
+    :meth:`~pyro.contrib.gp.kernels.kernel.Kernel.matmul`, so the
+    :math:`N \times N` kernel matrix is never held in memory at once. This
+    reduces the :math:`\mathcal{O}(N^3)` time and :math:`\mathcal{O}(N^2)`
+    memory of Cholesky decompositions to :math:`\mathcal{O}(N^2)` time per
+    iteration and :math:`\mathcal{O}(N)` memory per block.
+
+    Log likelihoods are stochastic estimates, whose gradients are computed from
+    the solves by Hutchinson's trace estimator.
+
+    :param int max_iter: Maximum number of conjugate gradient iterations.
+    :param float tol: Tolerance on the relative residual of conjugate gradients.
+    :param int num_probes: Number of random probe vectors for trace and log
+        determinant estimates.
+    :param int num_lanczos_iter: Number of Lanczos iterations for log determinant
+        estimates.
+    :param int precond_rank: Rank of the pivoted Cholesky preconditioner. Set to
+        0 to disable preconditioning.
+    :param int block_size: Number of rows and columns of each tile of the kernel matrix.
+    :param bool checkpoint: Whether to recompute kernel blocks during the backward
+        pass rather than storing them, to also bound memory when computing
+        gradients. This is incompatible with :func:`torch.autograd.grad`.
+    """
+    def __init__(self, max_iter=1000, tol=1e-4, num_probes=10, num_lanczos_iter=30, precond_rank=10,
+                 block_size=1024, checkpoint=False):
+        self.max_iter = max_iter
+        self.tol = tol
+        self.num_probes = num_probes
+        self.num_lanczos_iter = num_lanczos_iter
+        self.precond_rank = precond_rank
+        self.block_size = block_size
+        self.checkpoint = checkpoint
+
+    def matmul(self, kernel, X, noise, V):
+        r"""
+        Computes :math:`(k(X, X) + \sigma^2 I) V` block by block.
+
+        :param ~pyro.contrib.gp.kernels.kernel.Kernel kernel: A Pyro kernel object.
+        :param torch.Tensor X: An input data.
+        :param torch.Tensor noise: The diagonal term :math:`\sigma^2`.
+        :param torch.Tensor V: An :math:`N \times K` matrix.
+        :rtype: torch.Tensor
+        """
+        return kernel.matmul(X, None, V, self.block_size) + noise * V
+
+    def _preconditioner(self, kernel, X, noise):
+        if self.precond_rank <= 0:
+            return None
+        with torch.no_grad():
+            diag = kernel(X, diag=True)
+
+            def get_row(i):
+                row = kernel(X[i:i + 1], X)[0]
+                row[i] = diag[i]  # e.g. WhiteNoise only contributes with Z=None
+                return row
+
+            L = pivoted_cholesky(diag, get_row, min(self.precond_rank, X.size(0)))
+            if L.size(1) == 0:
+                return None
+            # inv(L @ L.T + noise * I) by the Woodbury identity
+            C = L.t().matmul(L)
+            C.view(-1)[::L.size(1) + 1] += noise
+            Lc = C.cholesky()
+
+        def precond(V):
+            LtV = L.t().matmul(V)
+            CinvLtV = LtV.trtrs(Lc, upper=False)[0].trtrs(Lc.t(), upper=True)[0]
+            return (V - L.matmul(CinvLtV)) / noise
+
+        return precond
+
+    def solve(self, kernel, X, noise, B):
+        r"""
+        Solves :math:`(k(X, X) + \sigma^2 I) A = B`. The solution is detached.
+
+        :param ~pyro.contrib.gp.kernels.kernel.Kernel kernel: A Pyro kernel object.
+        :param torch.Tensor X: An input data.
+        :param torch.Tensor noise: The diagonal term :math:`\sigma^2`.
+        :param torch.Tensor B: An :math:`N \times K` right hand side.
+        :rtype: torch.Tensor
+        """
+        with torch.no_grad():
+            noise = noise.detach()
+            return conjugate_gradient(lambda V: self.matmul(kernel, X, noise, V), B.detach(),
+                                      self._preconditioner(kernel, X, noise), self.max_iter, self.tol)
+
+    def _quad_form(self, kernel, X, noise, A, B):
+        # computes sum_j A[:, j].T @ K @ B[:, j] with gradients, block by block
+        if not self.checkpoint:
+            return (A * self.matmul(kernel, X, noise, B)).sum()
+
+        def diag_tile(Ai, Xi, Bi, _):
+            return (Ai * kernel(Xi).matmul(Bi)).sum()
+
+        def tile(Ai, Xi, Xj, Bj, _):
+            return (Ai * kernel(Xi, Xj).matmul(Bj)).sum()
+
+        # a dummy input requiring grad makes checkpoint propagate gradients to kernel params
+        dummy = X.new_zeros((), requires_grad=True)
+        result = noise * (A * B).sum()
+        As, Xs, Bs = A.split(self.block_size), X.split(self.block_size), B.split(self.block_size)
+        for i, (Ai, Xi) in enumerate(zip(As, Xs)):
+            for j, (Xj, Bj) in enumerate(zip(Xs, Bs)):
+                if i == j:
+                    result = result + torch.utils.checkpoint.checkpoint(diag_tile, Ai, Xi, Bj, dummy)
+                else:
+                    result = result + torch.utils.checkpoint.checkpoint(tile, Ai, Xi, Xj, Bj, dummy)
+        return result
+
+    def log_likelihood(self, kernel, X, noise, y):
+        r"""
+        Estimates the log likelihood of a zero mean multivariate normal
+        distribution with covariance :math:`k(X, X) + \sigma^2 I`, summed over
+        the batch dimensions of ``y``.
+
+        :param ~pyro.contrib.gp.kernels.kernel.Kernel kernel: A Pyro kernel object.
+        :param torch.Tensor X: An input data.
+        :param torch.Tensor noise: The diagonal term :math:`\sigma^2`.
+        :param torch.Tensor y: An observation whose last dimension has size :math:`N`.
+        :rtype: torch.Tensor
+        """
+        N = X.size(0)
+        y_2D = y.reshape(-1, N).t()
+        num_batch = y_2D.size(1)
+        probes = y_2D.new_empty(N, self.num_probes).bernoulli_(0.5).mul_(2).sub_(1)
+        solution = self.solve(kernel, X, noise, torch.cat([y_2D, probes], dim=1))
+        alpha, U = solution[:, :num_batch], solution[:, num_batch:]
+
+        with torch.no_grad():
+            noise_ = noise.detach()
+            logdet = lanczos_logdet(lambda V: self.matmul(kernel, X, noise_, V), probes,
+                                    self.num_lanczos_iter)
+            value = -0.5 * ((alpha * y_2D).sum() + num_batch * (logdet + N * math.log(2 * math.pi)))
+        if not torch.is_grad_enabled():
+            return value
+
+        # the gradient of the surrogate is -alpha wrt y, and wrt params of K it is
+        # 0.5 * alpha.T @ dK @ alpha - 0.5 * num_batch * tr(inv(K) @ dK), where the
+        # trace is estimated as mean(U.T @ dK @ probes) with U = inv(K) @ probes
+        A = torch.cat([alpha, U * (-num_batch / self.num_probes)], dim=1)
+        B = torch.cat([alpha, probes], dim=1)
+        surrogate = -(alpha * y_2D).sum() + 0.5 * self._quad_form(kernel, X, noise, A, B)
+        return value + surrogate - surrogate.detach()
+
+
 def train(gpmodule, optimizer=None, loss_fn=None, retain_graph=None, num_steps=1000):
     """
     A helper to optimize parameters for a GP module.
@@ -177,3 +333,100 @@ def train(gpmodule, optimizer=None, loss_fn=None, retain_graph=None, num_steps=1
         loss = optimizer.step(closure)
         losses.append(torch_item(loss))
     return losses
+
+
+def train_minibatch(gpmodule, data=None, subsample_size=None, optimizer=None, loss_fn=None,
+                    retain_graph=None, num_steps=1000, prefetch=True):
+    """
+    A helper to optimize parameters of a
+    :class:`~pyro.contrib.gp.models.vsgp.VariationalSparseGP` or
+    :class:`~pyro.contrib.gp.models.vgp.VariationalGP` module on minibatches of
+    data, so that the cost of each step does not grow with the size of the
+    dataset. Each step evaluates the likelihood of one minibatch, scaled up to
+    the size of the dataset.
+
+    ``data`` can be either
+
+    + ``None`` or a tuple ``(X, y)`` of tensors or
+      :class:`~pyro.contrib.minibatch.MemmapTensor` s, from which minibatches of
+      size ``subsample_size`` are drawn by a :func:`~pyro.plate` at each step,
+      visiting every data point once per epoch. ``None`` stands for the data of
+      ``gpmodule``, and is the only option for ``VariationalGP``, whose
+      variational parameters are tied to its data points (so only the cost of
+      its likelihood term is reduced). Or
+    + an iterable of minibatches ``(X, y)``, e.g. a
+      :class:`torch.utils.data.DataLoader`, which is iterated again when
+      exhausted. In this case ``gpmodule.num_data`` must be the size of the
+      dataset.
+
+    Minibatches are read ahead on a background thread if ``prefetch=True``.
+    Within an evaluation of the loss, the Cholesky decomposition of the prior
+    covariance (e.g. :math:`k(X_u, X_u)`) is reused by repeated evaluations of
+    the model (e.g. for several ELBO particles), unless some parameters have
+    priors.
+
+    :param ~pyro.contrib.gp.models.GPModel gpmodule: A GP module.
+    :param data: The training data, see above.
+    :param int subsample_size: The size of minibatches drawn from a dataset.
+    :param ~torch.optim.Optimizer optimizer: A PyTorch optimizer instance.
+        By default, we use Adam with ``lr=0.01``.
+    :param callable loss_fn: A loss function which takes inputs are
+        ``gpmodule.model``, ``gpmodule.guide``, and returns ELBO loss.
+        By default, ``loss_fn=TraceMeanField_ELBO().differentiable_loss``.
+    :param bool retain_graph: An optional flag of ``torch.autograd.backward``.
+    :param int num_steps: Number of steps to run SVI.
+    :param bool prefetch: Whether to read the next minibatch on a background
+        thread during each step. Defaults to True.
+    :returns: a list of losses during the training procedure
+    :rtype: list
+    """
+    batches = None
+    if data is None or isinstance(data, tuple):
+        if subsample_size is None:
+            raise ValueError("subsample_size is required to draw minibatches from a dataset.")
+        source = gpmodule._get_data_source(data, subsample_size, prefetch)
+    elif not hasattr(gpmodule, "num_data"):
+        raise ValueError("Training on an iterable of minibatches requires a model with "
+                         "num_data, e.g. VariationalSparseGP.")
+    else:
+        source = None
+
+        def cycle():
+            while True:
+                empty = True
+                for batch in data:
+                    empty = False
+                    yield batch
+                if empty:
+                    raise ValueError("Expected a nonempty iterable of minibatches.")
+
+        batches = prefetch_iterable(cycle()) if prefetch else cycle()
+
+    optimizer = (torch.optim.Adam(gpmodule.parameters(), lr=0.01)
+                 if optimizer is None else optimizer)
+    loss_fn = TraceMeanField_ELBO().differentiable_loss if loss_fn is None else loss_fn
+
+    def closure():
+        # parameters may change between calls of the closure, e.g. for LBFGS
+        gpmodule._step_cache = {}
+        optimizer.zero_grad()
+        loss = loss_fn(gpmodule.model, gpmodule.guide)
+        torch_backward(loss, retain_graph)
+        return loss
+
+    losses = []
+    X, y = gpmodule.X, gpmodule.y
+    gpmodule._data_source = source
+    try:
+        for i in range(num_steps):
+            if batches is not None:
+                gpmodule.set_data(*next(batches))
+            loss = optimizer.step(closure)
+            losses.append(torch_item(loss))
+    finally:
+        if prefetch and batches is not None:
+            batches.close()
+        gpmodule._data_source = None
+        gpmodule._step_cache = None
+        gpmodule.set_data(X, y)
+    return losses
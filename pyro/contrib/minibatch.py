@@ -0,0 +1,284 @@
+"""
+Minibatch Data Sources
+----------------------
+
+This module provides streams of minibatch indices and data sources that can
+be bound to :class:`~pyro.plate` via its ``subsample`` argument. At each step
+the plate draws the next minibatch from the stream, records it in the trace
+so that the model and guide agree on the same indices, and scales log
+likelihoods by ``size / len(minibatch)`` as usual::
+
+    source = DataSource(data, subsample_size=100)
+
+    def model():
+        with pyro.plate("data", subsample=source) as ind:
+            batch = source[ind]
+            ...
+
+Indices are shuffled once per epoch, so each step costs time and memory
+proportional to the minibatch size rather than the dataset size. Datasets
+larger than memory can be read lazily from disk via :class:`MemmapTensor`.
+Minibatches from other iterables, e.g. a :class:`torch.utils.data.DataLoader`,
+can be read ahead on a background thread via :func:`prefetch`.
+"""
+from __future__ import absolute_import, division, print_function
+
+import threading
+
+import numpy as np
+import torch
+from six.moves import queue
+
+
+class IndexStream(object):
+    """
+    Stream of minibatches of indices into a collection of size ``size``, where
+    each epoch visits every index exactly once.
+
+    A random permutation is drawn once per epoch and minibatches are views
+    into it, so no per-step allocation proportional to ``size`` is needed.
+
+    :param int size: the size of the collection being subsampled.
+    :param int subsample_size: the size of each minibatch.
+    :param bool shuffle: whether to shuffle indices at each epoch. Defaults to
+        True.
+    :param bool drop_last: whether to drop the last minibatch of each epoch if
+        it is smaller than ``subsample_size``. Defaults to False.
+    :param str device: optional device to place indices on.
+
+    The attribute ``epoch`` counts the number of completed epochs.
+    """
+    def __init__(self, size, subsample_size, shuffle=True, drop_last=False, device=None):
+        if not 0 < subsample_size <= size:
+            raise ValueError("Expected 0 < subsample_size <= size, but got subsample_size={}, size={}"
+                             .format(subsample_size, size))
+        self.size = size
+        self.subsample_size = subsample_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.device = device
+        self.epoch = 0
+        self._perm = None
+        self._pos = 0
+        self._next_perm = None
+
+    def __len__(self):
+        return self.size
+
+    def _permutation(self):
+        if self.shuffle:
+            return torch.randperm(self.size)
+        return torch.arange(self.size, dtype=torch.long)
+
+    def _get_indices(self, advance):
+        perm, pos = self._perm, self._pos
+        end = self.size - self.subsample_size if self.drop_last else self.size - 1
+        new_epoch = perm is None or pos > end
+        if new_epoch:
+            if self._next_perm is None:
+                self._next_perm = self._permutation()
+            perm, pos = self._next_perm, 0
+        indices = perm[pos:pos + self.subsample_size]
+        if advance:
+            if new_epoch:
+                if self._perm is not None:
+                    self.epoch += 1
+                self._next_perm = None
+            self._perm, self._pos = perm, pos + self.subsample_size
+        if self.device is not None:
+            indices = indices.to(self.device)
+        return indices
+
+    def peek_indices(self):
+        """
+        :returns: the next minibatch of indices, without advancing the stream.
+        :rtype: torch.LongTensor
+        """
+        return self._get_indices(advance=False)
+
+    def next_indices(self):
+        """
+        :returns: the next minibatch of indices.
+        :rtype: torch.LongTensor
+        """
+        return self._get_indices(advance=True)
+
+
+class MemmapTensor(object):
+    """
+    Read-only tensor backed by a memory-mapped file, for datasets that do not
+    fit in memory. Indexing by a minibatch of indices along the first dim
+    reads only the selected rows from disk.
+
+    :param str filename: path of a raw binary file, e.g. as written by
+        :meth:`numpy.ndarray.tofile`.
+    :param dtype: numpy dtype of the elements.
+    :param tuple shape: shape of the stored array.
+    """
+    def __init__(self, filename, dtype, shape):
+        self.filename = filename
+        self._array = np.memmap(filename, dtype=dtype, mode="r", shape=tuple(shape))
+
+    @property
+    def shape(self):
+        return torch.Size(self._array.shape)
+
+    def __len__(self):
+        return self._array.shape[0]
+
+    def __getitem__(self, indices):
+        if isinstance(indices, torch.Tensor):
+            indices = indices.cpu().numpy()
+        return torch.from_numpy(np.ascontiguousarray(self._array[indices]))
+
+
+class DataSource(IndexStream):
+    """
+    :class:`IndexStream` over one or more datasets that gathers the data of
+    each minibatch, optionally prefetching the next minibatch on a background
+    thread while the current step runs.
+
+    Pass the source as ``subsample`` to :class:`~pyro.plate`, then index the
+    source with the yielded indices to obtain the data::
+
+        source = DataSource((features, labels), subsample_size=256)
+
+        def model():
+            with pyro.plate("data", subsample=source) as ind:
+                x, y = source[ind]
+                ...
+
+    :param data: a tensor or :class:`MemmapTensor`, or a tuple of these, all
+        of the same length along the first dim.
+    :param int subsample_size: the size of each minibatch.
+    :param bool prefetch: whether to gather the next minibatch on a background
+        thread. Defaults to True.
+    :param str device: optional device to place indices and data on.
+
+    Remaining keyword arguments are passed to :class:`IndexStream`.
+    """
+    def __init__(self, data, subsample_size, prefetch=True, device=None, **kwargs):
+        self.data = data
+        datasets = data if isinstance(data, tuple) else (data,)
+        sizes = set(len(x) for x in datasets)
+        if len(sizes) != 1:
+            raise ValueError("Expected datasets of equal length, but got lengths {}".format(sorted(sizes)))
+        super(DataSource, self).__init__(sizes.pop(), subsample_size, device=device, **kwargs)
+        self.prefetch = prefetch
+        self._current = None  # (indices, batch)
+        self._pending = None  # (indices, thread, result)
+
+    def _gather(self, indices):
+        datasets = self.data if isinstance(self.data, tuple) else (self.data,)
+        batch = []
+        for x in datasets:
+            x = x[indices.cpu() if isinstance(x, MemmapTensor) else indices.to(x.device)]
+            if self.device is not None:
+                x = x.to(self.device)
+            batch.append(x)
+        return tuple(batch) if isinstance(self.data, tuple) else batch[0]
+
+    def _start_prefetch(self):
+        indices = self.peek_indices()
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self._gather(indices)))
+        thread.daemon = True
+        thread.start()
+        self._pending = indices, thread, result
+
+    def next_indices(self):
+        if self._pending is not None:
+            indices, thread, result = self._pending
+            self._pending = None
+            thread.join()
+            super(DataSource, self).next_indices()
+            batch = result[0] if result else self._gather(indices)
+        else:
+            indices = super(DataSource, self).next_indices()
+            batch = self._gather(indices)
+        self._current = indices, batch
+        if self.prefetch:
+            self._start_prefetch()
+        return indices
+
+    def __getitem__(self, indices):
+        """
+        :param torch.LongTensor indices: a minibatch of indices.
+        :returns: the data at ``indices``, reusing the gathered minibatch if
+            ``indices`` was drawn from this source.
+        """
+        if self._current is not None:
+            current_indices, batch = self._current
+            if indices is current_indices or (indices.shape == current_indices.shape and
+                                              torch.equal(indices, current_indices)):
+                return batch
+        return self._gather(indices)
+
+
+def prefetch(iterable, size=1):
+    """
+    Iterates over ``iterable`` while a background thread reads up to ``size``
+    items ahead, so that e.g. loading the next minibatch overlaps with the
+    current training step. Exceptions raised by ``iterable`` are re-raised by
+    the returned iterator. Call its ``close()`` method to stop the background
+    thread before ``iterable`` is exhausted, e.g. for infinite iterables.
+
+    :param iterable: an iterable, e.g. a :class:`torch.utils.data.DataLoader`.
+    :param int size: the maximum number of items to read ahead.
+    :returns: an iterator over the items of ``iterable``.
+    """
+    return _PrefetchIterator(iterable, size)
+
+
+class _PrefetchIterator(object):
+    _done = object()
+
+    def __init__(self, iterable, size):
+        self._items = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, args=(iterable,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item, error):
+        # waits for space in the queue, giving up once the iterator is closed
+        while not self._stop.is_set():
+            try:
+                self._items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _worker(self, iterable):
+        try:
+            for item in iterable:
+                if not self._put(item, None):
+                    return
+        except Exception as e:
+            self._put(self._done, e)
+        else:
+            self._put(self._done, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._stop.is_set():
+            raise StopIteration
+        item, error = self._items.get()
+        if item is self._done:
+            self._stop.set()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    next = __next__  # for Python 2
+
+    def close(self):
+        """
+        Stops the background thread and waits for it to finish.
+        """
+        self._stop.set()
+        self._thread.join()
@@ -90,11 +90,9 @@ class EmpiricalMarginal(Empirical):
 
     def _populate_traces(self, trace_posterior, sites):
         assert isinstance(sites, (list, str))
-        for tr, log_weight, chain_id in zip(trace_posterior.exec_traces,
-                                            trace_posterior.log_weights,
-                                            trace_posterior.chain_ids):
-            value = tr.nodes[sites]["value"] if isinstance(sites, str) else \
-                torch.stack([tr.nodes[site]["value"] for site in sites], 0)
+        for value, log_weight, chain_id in zip(trace_posterior._get_site_values(sites),
+                                               trace_posterior.log_weights,
+                                               trace_posterior.chain_ids):
             self._add_sample(value, log_weight=log_weight, chain_id=chain_id)
 
 
@@ -188,6 +186,17 @@ class TracePosterior(object):
         """
         return Marginals(self, sites)
 
+    def _get_site_values(self, sites):
+        """
+        Iterates over the values of ``sites`` in the collected samples, in the
+        order of :attr:`exec_traces`. Values of multiple sites are stacked.
+
+        :param sites: a site name or a list of site names.
+        """
+        for tr in self.exec_traces:
+            yield tr.nodes[sites]["value"] if isinstance(sites, str) else \
+                torch.stack([tr.nodes[site]["value"] for site in sites], 0)
+
     @abstractmethod
     def _traces(self, *args, **kwargs):
         """
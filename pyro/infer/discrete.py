@@ -3,10 +3,11 @@ from __future__ import absolute_import, division, print_function
 import functools
 from collections import OrderedDict
 
+import pyro
 import pyro.ops.packed as packed
 from pyro import poutine
-from pyro.ops.contract import contract_tensor_tree
-from pyro.ops.einsum.adjoint import require_backward
+from pyro.ops.contract import ContractionPlanCache, contract_tensor_tree
+from pyro.ops.einsum.adjoint import _LeafBackward
 from pyro.ops.rings import MapRing, SampleRing
 from pyro.poutine.enumerate_messenger import EnumerateMessenger
 from pyro.poutine.replay_messenger import ReplayMessenger
@@ -16,13 +17,6 @@ from pyro.util import jit_iter
 _RINGS = {0: MapRing, 1: SampleRing}
 
 
-def _make_ring(temperature):
-    try:
-        return _RINGS[temperature]()
-    except KeyError:
-        raise ValueError("temperature must be 0 (map) or 1 (sample) for now")
-
-
 class SamplePosteriorMessenger(ReplayMessenger):
     # This acts like ReplayMessenger but additionally replays cond_indep_stack.
 
@@ -33,92 +27,133 @@ class SamplePosteriorMessenger(ReplayMessenger):
             msg["cond_indep_stack"] = self.trace.nodes[msg["name"]]["cond_indep_stack"]
 
 
-def _sample_posterior(model, first_available_dim, temperature, *args, **kwargs):
-    # For internal use by infer_discrete.
+class _QueryBackward(_LeafBackward):
+    """
+    Leaf of the adjoint graph that additionally records the ordinal of the
+    backward pass that first reached it.
 
-    # Create an enumerated trace.
-    with poutine.block(), EnumerateMessenger(first_available_dim):
-        enum_trace = poutine.trace(model).get_trace(*args, **kwargs)
-    enum_trace = prune_subsample_sites(enum_trace)
-    enum_trace.compute_log_prob()
-    enum_trace.pack_tensors()
-    plate_to_symbol = enum_trace.plate_to_symbol
-
-    # Collect a set of query sample sites to which the backward algorithm will propagate.
-    log_probs = OrderedDict()
-    sum_dims = set()
-    queries = []
-    for node in enum_trace.nodes.values():
-        if node["type"] == "sample":
-            ordinal = frozenset(plate_to_symbol[f.name]
-                                for f in node["cond_indep_stack"] if f.vectorized)
-            log_prob = node["packed"]["log_prob"]
-            log_probs.setdefault(ordinal, []).append(log_prob)
-            sum_dims.update(log_prob._pyro_dims)
-            for frame in node["cond_indep_stack"]:
-                if frame.vectorized:
-                    sum_dims.remove(plate_to_symbol[frame.name])
-            # Note we mark all sample sites with require_backward to gather
-            # enumerated sites and adjust cond_indep_stack of all sample sites.
-            if not node["is_observed"]:
-                queries.append(log_prob)
-                require_backward(log_prob)
-
-    # Run forward-backward algorithm, collecting the ordinal of each connected component.
-    ring = _make_ring(temperature)
-    log_probs = contract_tensor_tree(log_probs, sum_dims, ring=ring)  # run forward algorithm
-    query_to_ordinal = {}
-    pending = object()  # a constant value for pending queries
-    for query in queries:
-        query._pyro_backward_result = pending
-    for ordinal, terms in log_probs.items():
-        for term in terms:
-            if hasattr(term, "_pyro_backward"):
-                term._pyro_backward()  # run backward algorithm
-        # Note: this is quadratic in number of ordinals
-        for query in queries:
-            if query not in query_to_ordinal and query._pyro_backward_result is not pending:
-                query_to_ordinal[query] = ordinal
-
-    # Construct a collapsed trace by gathering and adjusting cond_indep_stack.
-    collapsed_trace = poutine.Trace()
-    for node in enum_trace.nodes.values():
-        if node["type"] == "sample" and not node["is_observed"]:
-            # TODO move this into a Leaf implementation somehow
-            new_node = {
-                "type": "sample",
-                "name": node["name"],
-                "is_observed": False,
-                "infer": node["infer"].copy(),
-                "cond_indep_stack": node["cond_indep_stack"],
-                "value": node["value"],
-            }
-            log_prob = node["packed"]["log_prob"]
-            if hasattr(log_prob, "_pyro_backward_result"):
-                # Adjust the cond_indep_stack.
-                ordinal = query_to_ordinal[log_prob]
-                new_node["cond_indep_stack"] = tuple(
-                    f for f in node["cond_indep_stack"]
-                    if not f.vectorized or plate_to_symbol[f.name] in ordinal)
-
-                # Gather if node depended on an enumerated value.
-                sample = log_prob._pyro_backward_result
-                if sample is not None:
-                    new_value = packed.pack(node["value"], node["infer"]["_dim_to_symbol"])
-                    for index, dim in zip(jit_iter(sample), sample._pyro_sample_dims):
-                        if dim in new_value._pyro_dims:
-                            index._pyro_dims = sample._pyro_dims[1:]
-                            new_value = packed.gather(new_value, index, dim)
-                    new_node["value"] = packed.unpack(new_value, enum_trace.symbol_to_dim)
-
-            collapsed_trace.add_node(node["name"], **new_node)
-
-    # Replay the model against the collapsed trace.
-    with SamplePosteriorMessenger(trace=collapsed_trace):
-        return model(*args, **kwargs)
-
-
-def infer_discrete(fn=None, first_available_dim=None, temperature=1):
+    :param list current_ordinal: a one-element list holding the ordinal whose
+        backward pass is currently running.
+    """
+    def __init__(self, target, current_ordinal):
+        super(_QueryBackward, self).__init__(target)
+        self.current_ordinal = current_ordinal
+
+    def process(self, message):
+        target = self.target()
+        if not hasattr(target, "_pyro_backward_ordinal"):
+            target._pyro_backward_ordinal = self.current_ordinal[0]
+        return super(_QueryBackward, self).process(message)
+
+
+class _SamplePosterior(object):
+    # For internal use by infer_discrete.
+    # This caches contraction plans across calls whose enumerated traces have
+    # the same symbolic structure, so repeated calls only run tensor operations.
+
+    def __init__(self, model, first_available_dim, temperature, batch_size=None):
+        if temperature not in _RINGS:
+            raise ValueError("temperature must be 0 (map) or 1 (sample) for now")
+        self.model = model
+        self.first_available_dim = first_available_dim
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self.plan_cache = ContractionPlanCache()
+        if batch_size is not None:
+            self.model = self._batched(model, dim=first_available_dim)
+            self.first_available_dim = first_available_dim - 1
+
+    def _batched(self, fn, dim):
+        """
+        Wraps a callable inside an outermost :class:`~pyro.plate` over
+        ``batch_size`` independent sequences.
+        """
+        def wrapped_fn(*args, **kwargs):
+            with pyro.plate("infer_discrete_batch", self.batch_size, dim=dim):
+                return fn(*args, **kwargs)
+
+        return wrapped_fn
+
+    def __call__(self, *args, **kwargs):
+        model = self.model
+
+        # Create an enumerated trace.
+        with poutine.block(), EnumerateMessenger(self.first_available_dim):
+            enum_trace = poutine.trace(model).get_trace(*args, **kwargs)
+        enum_trace = prune_subsample_sites(enum_trace)
+        enum_trace.compute_log_prob()
+        enum_trace.pack_tensors()
+        plate_to_symbol = enum_trace.plate_to_symbol
+
+        # Collect a set of query sample sites to which the backward algorithm will propagate.
+        log_probs = OrderedDict()
+        sum_dims = set()
+        current_ordinal = [None]
+        for node in enum_trace.nodes.values():
+            if node["type"] == "sample":
+                ordinal = frozenset(plate_to_symbol[f.name]
+                                    for f in node["cond_indep_stack"] if f.vectorized)
+                log_prob = node["packed"]["log_prob"]
+                log_probs.setdefault(ordinal, []).append(log_prob)
+                sum_dims.update(log_prob._pyro_dims)
+                for frame in node["cond_indep_stack"]:
+                    if frame.vectorized:
+                        sum_dims.remove(plate_to_symbol[frame.name])
+                # Note we mark all sample sites with require_backward to gather
+                # enumerated sites and adjust cond_indep_stack of all sample sites.
+                if not node["is_observed"]:
+                    log_prob._pyro_backward = _QueryBackward(log_prob, current_ordinal)
+
+        # Run forward-backward algorithm. Each query records the ordinal of the
+        # connected component whose backward pass reaches it.
+        ring = _RINGS[self.temperature]()
+        log_probs = contract_tensor_tree(log_probs, sum_dims, ring=ring,
+                                         plan_cache=self.plan_cache)  # run forward algorithm
+        for ordinal, terms in log_probs.items():
+            current_ordinal[0] = ordinal
+            for term in terms:
+                if hasattr(term, "_pyro_backward"):
+                    term._pyro_backward()  # run backward algorithm
+
+        # Construct a collapsed trace by gathering and adjusting cond_indep_stack.
+        collapsed_trace = poutine.Trace()
+        for node in enum_trace.nodes.values():
+            if node["type"] == "sample" and not node["is_observed"]:
+                # TODO move this into a Leaf implementation somehow
+                new_node = {
+                    "type": "sample",
+                    "name": node["name"],
+                    "is_observed": False,
+                    "infer": node["infer"].copy(),
+                    "cond_indep_stack": node["cond_indep_stack"],
+                    "value": node["value"],
+                }
+                log_prob = node["packed"]["log_prob"]
+                if hasattr(log_prob, "_pyro_backward_ordinal"):
+                    # Adjust the cond_indep_stack.
+                    ordinal = log_prob._pyro_backward_ordinal
+                    new_node["cond_indep_stack"] = tuple(
+                        f for f in node["cond_indep_stack"]
+                        if not f.vectorized or plate_to_symbol[f.name] in ordinal)
+
+                    # Gather if node depended on an enumerated value.
+                    sample = log_prob._pyro_backward_result
+                    if sample is not None:
+                        new_value = packed.pack(node["value"], node["infer"]["_dim_to_symbol"])
+                        for index, dim in zip(jit_iter(sample), sample._pyro_sample_dims):
+                            if dim in new_value._pyro_dims:
+                                index._pyro_dims = sample._pyro_dims[1:]
+                                new_value = packed.gather(new_value, index, dim)
+                        new_node["value"] = packed.unpack(new_value, enum_trace.symbol_to_dim)
+
+                collapsed_trace.add_node(node["name"], **new_node)
+
+        # Replay the model against the collapsed trace.
+        with SamplePosteriorMessenger(trace=collapsed_trace):
+            return model(*args, **kwargs)
+
+
+def infer_discrete(fn=None, first_available_dim=None, temperature=1, batch_size=None):
     """
     A poutine that samples discrete sites marked with
     ``site["infer"]["enumerate"] = "parallel"`` from the posterior,
@@ -150,10 +185,18 @@ def infer_discrete(fn=None, first_available_dim=None, temperature=1):
         This should be a negative integer.
     :param int temperature: Either 1 (sample via forward-filter backward-sample)
         or 0 (optimize via Viterbi-like MAP inference). Defaults to 1 (sample).
+    :param int batch_size: Optional number of independent sequences to decode
+        at once. If specified, ``fn`` is run inside an outermost
+        :class:`~pyro.plate` of this size at ``first_available_dim``, and
+        enumeration starts one dimension to the left. ``fn`` should then
+        broadcast its data along this dimension.
+    :return: a callable that caches contraction plans across calls with the
+        same enumerated structure and shapes.
     """
     assert first_available_dim < 0, first_available_dim
     if fn is None:  # support use as a decorator
         return functools.partial(infer_discrete,
                                  first_available_dim=first_available_dim,
-                                 temperature=temperature)
-    return functools.partial(_sample_posterior, fn, first_available_dim, temperature)
+                                 temperature=temperature,
+                                 batch_size=batch_size)
+    return _SamplePosterior(fn, first_available_dim, temperature, batch_size)
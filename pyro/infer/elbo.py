@@ -8,7 +8,8 @@ from six import add_metaclass
 
 import pyro
 import pyro.poutine as poutine
-from pyro.infer.util import is_validation_enabled
+from pyro.infer.enum import StaticStructure, get_importance_trace
+from pyro.infer.util import get_plate_stacks, is_validation_enabled
 from pyro.poutine.util import prune_subsample_sites
 from pyro.util import check_site_shape
 
@@ -45,6 +46,20 @@ class ELBO(object):
         be ignored. Defaults to False.
     :param bool retain_graph: Whether to retain autograd graph during an SVI
         step. Defaults to None (False).
+    :param bool static_structure: Whether to assume that the structure of the
+        model and guide (site names, types, plates, shapes and enumeration
+        dims) is the same at every step. If True, validation and structural
+        bookkeeping are only performed on the first step, and again only if
+        the structure is found to change. Defaults to False.
+    :param bool fuse_particles: Whether to accumulate the terms of all sample
+        sites and particles in the autograd graph, and form the loss with a
+        single stacked reduction, scalar extraction and backward pass per step,
+        rather than one per site and particle. This keeps the graphs of all
+        particles in memory until the backward pass. It applies both with and
+        without ``vectorize_particles``. Defaults to False. Supported by
+        :class:`~pyro.infer.trace_elbo.Trace_ELBO`,
+        :class:`~pyro.infer.trace_mean_field_elbo.TraceMeanField_ELBO` and
+        :class:`~pyro.infer.renyi_elbo.RenyiELBO`.
 
     References
 
@@ -62,7 +77,9 @@ class ELBO(object):
                  vectorize_particles=False,
                  strict_enumeration_warning=True,
                  ignore_jit_warnings=False,
-                 retain_graph=None):
+                 retain_graph=None,
+                 static_structure=False,
+                 fuse_particles=False):
         if max_iarange_nesting is not None:
             warnings.warn("max_iarange_nesting is deprecated; use max_plate_nesting instead",
                           DeprecationWarning)
@@ -75,6 +92,9 @@ class ELBO(object):
             self.max_plate_nesting += 1
         self.strict_enumeration_warning = strict_enumeration_warning
         self.ignore_jit_warnings = ignore_jit_warnings
+        self.static_structure = static_structure
+        self._static_structure = StaticStructure() if static_structure else None
+        self.fuse_particles = fuse_particles
 
     def _guess_max_plate_nesting(self, model, guide, *args, **kwargs):
         """
@@ -142,6 +162,27 @@ class ELBO(object):
                                self._vectorized_num_particles(guide),
                                *args, **kwargs)
 
+    def _get_importance_trace(self, graph_type, model, guide, *args, **kwargs):
+        """
+        Returns a single trace from the guide, and the model that is run
+        against it, as in :func:`~pyro.infer.enum.get_importance_trace`.
+        """
+        if self._static_structure is not None:
+            return self._static_structure.get_importance_trace(
+                graph_type, self.max_plate_nesting, model, guide, *args, **kwargs)
+        return get_importance_trace(graph_type, self.max_plate_nesting, model, guide, *args, **kwargs)
+
+    def _get_plate_stacks(self, model_trace):
+        """
+        Returns the plate stacks of the sample sites of a model trace from
+        :meth:`_get_importance_trace`, as in
+        :func:`~pyro.infer.util.get_plate_stacks`, reusing those cached if
+        ``static_structure=True``.
+        """
+        if self._static_structure is not None:
+            return self._static_structure.plate_stacks
+        return get_plate_stacks(model_trace)
+
     @abstractmethod
     def _get_trace(self, model, guide, *args, **kwargs):
         """
@@ -5,9 +5,9 @@ import numbers
 from six.moves.queue import LifoQueue
 
 from pyro import poutine
-from pyro.infer.util import is_validation_enabled
-from pyro.poutine import Trace
-from pyro.poutine.util import prune_subsample_sites
+from pyro.infer.util import get_plate_stacks, is_validation_enabled
+from pyro.poutine.messenger import Messenger
+from pyro.poutine.util import site_is_subsample
 from pyro.util import check_model_guide_match, check_site_shape, ignore_jit_warnings
 
 
@@ -34,33 +34,208 @@ def iter_discrete_extend(trace, site, **ignored):
         yield extended_trace
 
 
-def get_importance_trace(graph_type, max_plate_nesting, model, guide, *args, **kwargs):
+class _Branch(object):
     """
-    Returns a single trace from the guide, and the model that is run
-    against it.
+    A pending branch of sequential enumeration: the ``index``-th value of the
+    enumerated ``values`` of site ``name``, following a shared ``prefix``.
     """
+    def __init__(self, prefix, name, infer, values, index=1):
+        self.prefix = prefix
+        self.name = name
+        self.infer = infer
+        self.values = values
+        self.index = index
+        self._replay = None
+
+    def get_replay(self):
+        # Materialize the prefix once and share it among all sibling branches.
+        if self._replay is None:
+            self._replay = {}
+            node = self.prefix
+            while node is not None:
+                name, value, infer, node = node
+                self._replay[name] = value, infer
+        return self._replay
+
+
+class SequentialEnumMessenger(Messenger):
+    """
+    Depth-first sequential enumeration over sample sites marked
+    ``infer={"enumerate": "sequential"}``, where each execution of the wrapped
+    function yields a complete trace.
+
+    Unlike :func:`~pyro.poutine.queue` with :func:`iter_discrete_escape` and
+    :func:`iter_discrete_extend`, which aborts an execution at each site that
+    has not yet been enumerated and pushes a copy of the partial trace for every
+    value of that site, this continues the current execution with the first
+    value of the site and pushes a single pending branch for the remaining
+    values. Sibling branches share the recorded prefix of sample values and the
+    enumerated support of their site, so neither partial executions nor trace
+    copies are wasted.
+
+    :param queue: a LIFO queue of pending branches. Put ``None`` in the queue to
+        start a new execution from scratch, then call the wrapped function until
+        the queue is empty.
+    """
+    def __init__(self, queue):
+        super(SequentialEnumMessenger, self).__init__()
+        self.queue = queue
+        self._replay = {}
+        self._prefix = None
+        self._branch = None
+
+    def __enter__(self):
+        assert not self.queue.empty(), "trying to get() from an empty queue will deadlock"
+        branch = self.queue.get()
+        if branch is None:
+            self._replay = {}
+            self._prefix = None
+            self._branch = None
+        else:
+            self._replay = branch.get_replay()
+            self._prefix = branch.prefix
+            self._branch = branch.name, branch.values[branch.index], branch.infer
+            branch.index += 1
+            if branch.index < len(branch.values):
+                self.queue.put(branch)
+        return super(SequentialEnumMessenger, self).__enter__()
+
+    def _pyro_sample(self, msg):
+        if msg["is_observed"]:
+            return None
+        name = msg["name"]
+        if name in self._replay:
+            msg["value"], infer = self._replay[name]
+            msg["infer"] = infer.copy()
+            msg["done"] = True
+        elif self._branch is not None and name == self._branch[0]:
+            msg["value"], infer = self._branch[1:]
+            msg["infer"] = infer.copy()
+            msg["done"] = True
+        elif msg["infer"].get("enumerate") == "sequential":
+            values = msg["fn"].enumerate_support(expand=msg["infer"].get("expand", False))
+            msg["infer"] = msg["infer"].copy()
+            msg["infer"]["_enum_total"] = values.shape[0]
+            with ignore_jit_warnings(["Converting a tensor to a Python index",
+                                      ("Iterating over a tensor", RuntimeWarning)]):
+                values = list(values)
+            if len(values) > 1:
+                self.queue.put(_Branch(self._prefix, name, msg["infer"].copy(), values))
+            msg["value"] = values[0]
+            msg["done"] = True
+        return None
+
+    def _pyro_post_sample(self, msg):
+        # Sites of the shared prefix have already been recorded.
+        if msg["is_observed"] or msg["name"] in self._replay:
+            return None
+        # Each trace gets its own copy of the infer dict, as with iter_discrete_extend.
+        self._prefix = msg["name"], msg["value"], msg["infer"].copy(), self._prefix
+        return None
+
+
+def _trace_model_and_guide(graph_type, model, guide, *args, **kwargs):
     guide_trace = poutine.trace(guide, graph_type=graph_type).get_trace(*args, **kwargs)
     model_trace = poutine.trace(poutine.replay(model, trace=guide_trace),
                                 graph_type=graph_type).get_trace(*args, **kwargs)
-    if is_validation_enabled():
-        check_model_guide_match(model_trace, guide_trace, max_plate_nesting)
+    return model_trace, guide_trace
 
-    guide_trace = prune_subsample_sites(guide_trace)
-    model_trace = prune_subsample_sites(model_trace)
 
+def _compute_log_probs(model_trace, guide_trace, max_plate_nesting, check_shapes):
     model_trace.compute_log_prob()
     guide_trace.compute_score_parts()
+    if check_shapes:
+        for trace in (model_trace, guide_trace):
+            for site in trace.nodes.values():
+                if site["type"] == "sample":
+                    check_site_shape(site, max_plate_nesting)
+
+
+def get_importance_trace(graph_type, max_plate_nesting, model, guide, *args, **kwargs):
+    """
+    Returns a single trace from the guide, and the model that is run
+    against it.
+    """
+    model_trace, guide_trace = _trace_model_and_guide(graph_type, model, guide, *args, **kwargs)
     if is_validation_enabled():
-        for site in model_trace.nodes.values():
-            if site["type"] == "sample":
-                check_site_shape(site, max_plate_nesting)
-        for site in guide_trace.nodes.values():
-            if site["type"] == "sample":
-                check_site_shape(site, max_plate_nesting)
+        check_model_guide_match(model_trace, guide_trace, max_plate_nesting)
+
+    # Traces returned by get_trace() are already copies, so prune in place.
+    for trace in (model_trace, guide_trace):
+        for name, site in list(trace.nodes.items()):
+            if site_is_subsample(site):
+                trace.remove_node(name)
 
+    _compute_log_probs(model_trace, guide_trace, max_plate_nesting, is_validation_enabled())
     return model_trace, guide_trace
 
 
+def get_structure_fingerprint(trace):
+    """
+    Returns a hashable summary of the structure of a trace, i.e. the names,
+    types, plate stacks, shapes and enumeration dims of its sites, but not
+    their values.
+    """
+    fingerprint = []
+    for name, site in trace.nodes.items():
+        if site["type"] == "sample":
+            fn = site["fn"]
+            infer = site["infer"]
+            fingerprint.append((name, "sample", type(fn), site["is_observed"], site["cond_indep_stack"],
+                                getattr(site["value"], "shape", None),
+                                getattr(fn, "batch_shape", None), getattr(fn, "event_shape", None),
+                                infer.get("_enumerate_dim"), infer.get("is_auxiliary", False)))
+        else:
+            fingerprint.append((name, site["type"]))
+    return tuple(fingerprint)
+
+
+class StaticStructure(object):
+    """
+    Structural metadata of a (model, guide) pair that is cached across steps
+    by :class:`~pyro.infer.elbo.ELBO` when ``static_structure=True``.
+
+    Each call to :meth:`get_importance_trace` compares the structure of the
+    new traces to the cached fingerprint. Validation and structural
+    bookkeeping are only performed when the fingerprint changes, e.g. on the
+    first step.
+    """
+    def __init__(self):
+        self.fingerprint = None
+        self.subsample_sites = None
+        self.plate_stacks = None
+        self.plate_to_symbol = None
+
+    def get_importance_trace(self, graph_type, max_plate_nesting, model, guide, *args, **kwargs):
+        """
+        Like :func:`get_importance_trace`, but skips validation and reuses
+        cached metadata if the structure of the traces is unchanged. The plate
+        stacks of the model trace are cached as :attr:`plate_stacks`.
+        """
+        model_trace, guide_trace = _trace_model_and_guide(graph_type, model, guide, *args, **kwargs)
+        fingerprint = get_structure_fingerprint(model_trace), get_structure_fingerprint(guide_trace)
+        changed = fingerprint != self.fingerprint
+        if changed:
+            if is_validation_enabled():
+                check_model_guide_match(model_trace, guide_trace, max_plate_nesting)
+            self.subsample_sites = tuple((i, name)
+                                         for i, trace in enumerate((model_trace, guide_trace))
+                                         for name, site in trace.nodes.items()
+                                         if site_is_subsample(site))
+            self.plate_stacks = None
+            self.plate_to_symbol = {}
+
+        # Traces returned by get_trace() are already copies, so prune in place.
+        for i, name in self.subsample_sites:
+            (model_trace, guide_trace)[i].remove_node(name)
+
+        _compute_log_probs(model_trace, guide_trace, max_plate_nesting, changed and is_validation_enabled())
+        if changed:
+            self.plate_stacks = get_plate_stacks(model_trace)
+            self.fingerprint = fingerprint
+        return model_trace, guide_trace
+
+
 def iter_discrete_traces(graph_type, fn, *args, **kwargs):
     """
     Iterate over all discrete choices of a stochastic function.
@@ -76,10 +251,8 @@ def iter_discrete_traces(graph_type, fn, *args, **kwargs):
     :returns: An iterator over traces pairs.
     """
     queue = LifoQueue()
-    queue.put(Trace())
-    traced_fn = poutine.trace(
-        poutine.queue(fn, queue, escape_fn=iter_discrete_escape, extend_fn=iter_discrete_extend),
-        graph_type=graph_type)
+    queue.put(None)
+    traced_fn = poutine.trace(SequentialEnumMessenger(queue)(fn), graph_type=graph_type)
     while not queue.empty():
         yield traced_fn.get_trace(*args, **kwargs)
 
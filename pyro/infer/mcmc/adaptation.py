@@ -146,7 +146,7 @@ class WarmupAdapter(object):
         parameters.
 
         :param int t: time step, beginning at 0.
-        :param dict z: latent variables.
+        :param dict z: latent variables, or a flat tensor packing their values.
         :param float accept_prob: acceptance probability of the proposal.
         """
         if t >= self._warmup_steps or self._adaptation_disabled:
@@ -158,7 +158,7 @@ class WarmupAdapter(object):
         if self.adapt_step_size:
             self._update_step_size(accept_prob.item())
         if mass_matrix_adaptation_phase:
-            z_flat = torch.cat([z[name].reshape(-1) for name in sorted(z)])
+            z_flat = z if torch.is_tensor(z) else torch.cat([z[name].reshape(-1) for name in sorted(z)])
             self._mass_matrix_adapt_scheme.update(z_flat.detach())
         if t == window.end:
             if self._current_window == num_windows - 1:
@@ -13,8 +13,8 @@ from pyro.distributions.util import eye_like
 from pyro.infer import config_enumerate
 from pyro.infer.mcmc.adaptation import WarmupAdapter
 from pyro.infer.mcmc.trace_kernel import TraceKernel
-from pyro.infer.mcmc.util import TraceEinsumEvaluator
-from pyro.ops.integrator import velocity_verlet
+from pyro.infer.mcmc.util import CHAIN_PLATE, FlatLayout, TraceEinsumEvaluator
+from pyro.ops.integrator import _batched_where, _flat_potential_grad, batched_velocity_verlet, velocity_verlet
 from pyro.poutine.subsample_messenger import _Subsample
 from pyro.util import optional, torch_isinf, torch_isnan, ignore_jit_warnings
 
@@ -56,7 +56,10 @@ class HMC(TraceKernel):
         discrete sample sites that can be enumerated over in parallel.
     :param bool jit_compile: Optional parameter denoting whether to use
         the PyTorch JIT to trace the log density computation, and use this
-        optimized executable trace in the integrator.
+        optimized executable trace in the integrator. The traced potential
+        energy is a function of the tensors of the latent values and of the
+        model's args only, and is reused across runs with args of the same
+        signature.
     :param dict jit_options: A dictionary contains optional arguments for
         :func:`torch.jit.trace` function.
     :param bool ignore_jit_warnings: Flag to ignore warnings from the JIT
@@ -68,6 +71,14 @@ class HMC(TraceKernel):
         of the names of latent variables, not the order of their appearance in
         the model.
 
+    .. note:: This kernel supports running multiple chains in lockstep in a
+        single process via ``MCMC(..., chain_method="vectorized")``. Each chain
+        has its own step size, mass matrix and acceptance statistics, while the
+        potential energy of all chains is computed in a single run of the model
+        inside an outermost :func:`pyro.plate`. This requires that all batch
+        dimensions of the model's sample sites are declared via
+        :func:`pyro.plate`, so that the model can be vectorized.
+
     Example:
 
         >>> true_coefs = torch.tensor([1., 2., 3.])
@@ -103,6 +114,8 @@ class HMC(TraceKernel):
                  ignore_jit_warnings=False,
                  target_accept_prob=0.8):
         self.model = model
+        # the model as given, before being wrapped for enumeration or vectorized chains
+        self._raw_model = model
         self.max_plate_nesting = max_plate_nesting
         if trajectory_length is not None:
             self.trajectory_length = trajectory_length
@@ -129,12 +142,13 @@ class HMC(TraceKernel):
                                       is_diag_mass=not full_mass)
         super(HMC, self).__init__()
 
-    def _get_trace(self, z):
+    def _get_trace(self, z, args=None, kwargs=None):
         z_trace = self._prototype_trace
         for name, value in z.items():
             z_trace.nodes[name]["value"] = value
         trace_poutine = poutine.trace(poutine.replay(self.model, trace=z_trace))
-        trace_poutine(*self._args, **self._kwargs)
+        trace_poutine(*(self._args if args is None else args),
+                      **(self._kwargs if kwargs is None else kwargs))
         return trace_poutine.trace
 
     @staticmethod
@@ -146,16 +160,28 @@ class HMC(TraceKernel):
     def _compute_trace_log_prob(self, model_trace):
         return self._trace_prob_evaluator.log_prob(model_trace)
 
+    def _sum_chains(self, value):
+        # Sums all elements of `value`, separately for each chain if chains are vectorized.
+        if self._num_chains is None:
+            return value.sum()
+        return value.reshape(self._num_chains, -1).sum(-1)
+
     def _kinetic_energy(self, r):
-        r_flat = torch.cat([r[site_name].reshape(-1) for site_name in sorted(r)])
         if self.inverse_mass_matrix.dim() == 2:
-            return 0.5 * self.inverse_mass_matrix.matmul(r_flat).dot(r_flat)
+            return 0.5 * self.inverse_mass_matrix.matmul(r).dot(r)
         else:
-            return 0.5 * self.inverse_mass_matrix.dot(r_flat ** 2)
+            return 0.5 * self.inverse_mass_matrix.dot(r ** 2)
 
-    def _potential_energy(self, z):
+    def _flat_potential_energy(self, z):
         if self._jit_compile:
             return self._potential_energy_jit(z)
+        # The integrator works on a flat vector `z`, which is unpacked into
+        # (views of) the values of each site only at the boundary of the model.
+        return self._potential_energy(self._layout.unpack(z))
+
+    def _potential_energy(self, z):
+        if self._jit_compile:
+            return self._potential_energy_jit(self._layout.pack(z))
         # Since the model is specified in the constrained space, transform the
         # unconstrained R.V.s `z` to the constrained space.
         z_constrained = z.copy()
@@ -165,43 +191,44 @@ class HMC(TraceKernel):
         potential_energy = -self._compute_trace_log_prob(trace)
         # adjust by the jacobian for this transformation.
         for name, transform in self.transforms.items():
-            potential_energy += transform.log_abs_det_jacobian(z_constrained[name], z[name]).sum()
+            potential_energy += self._sum_chains(transform.log_abs_det_jacobian(z_constrained[name], z[name]))
         return potential_energy
 
     def _potential_energy_jit(self, z):
-        names, vals = zip(*sorted(z.items()))
+        tensor_args = _get_tensor_args(self._args, self._kwargs)
         if self._compiled_potential_fn:
-            return self._compiled_potential_fn(*vals)
-
-        def compiled(*zi):
-            z_constrained = list(zi)
+            return self._compiled_potential_fn(z, *tensor_args)
+
+        def compiled(z_flat, *tensor_args):
+            # The tensors of the model's args are inputs of the traced function,
+            # rather than constants of its graph. The function is compiled anew
+            # at each run (see _reset), since the graph also bakes in values
+            # captured from the model, e.g. params and global tensors.
+            args, kwargs = _substitute_tensor_args(self._args, self._kwargs, tensor_args)
+            z = self._layout.unpack(z_flat)
+            z_constrained = z.copy()
             # transform to constrained space.
-            for i, name in enumerate(names):
-                if name in self.transforms:
-                    transform = self.transforms[name]
-                    z_constrained[i] = transform.inv(z_constrained[i])
-            z_constrained = dict(zip(names, z_constrained))
-            trace = self._get_trace(z_constrained)
+            for name, transform in self.transforms.items():
+                z_constrained[name] = transform.inv(z[name])
+            trace = self._get_trace(z_constrained, args, kwargs)
             potential_energy = -self._compute_trace_log_prob(trace)
             # adjust by the jacobian for this transformation.
-            for i, name in enumerate(names):
-                if name in self.transforms:
-                    transform = self.transforms[name]
-                    potential_energy += transform.log_abs_det_jacobian(z_constrained[name], zi[i]).sum()
+            for name, transform in self.transforms.items():
+                potential_energy += self._sum_chains(transform.log_abs_det_jacobian(z_constrained[name], z[name]))
             return potential_energy
 
         with pyro.validation_enabled(False), optional(ignore_jit_warnings(), self._ignore_jit_warnings):
-            self._compiled_potential_fn = torch.jit.trace(compiled, vals, **self._jit_options)
-        return self._compiled_potential_fn(*vals)
+            self._compiled_potential_fn = torch.jit.trace(compiled, (z,) + tensor_args, **self._jit_options)
+        return self._compiled_potential_fn(z, *tensor_args)
 
     def _energy(self, z, r):
-        return self._kinetic_energy(r) + self._potential_energy(z)
+        return self._kinetic_energy(r) + self._flat_potential_energy(z)
 
     def _reset(self):
         self._t = 0
         self._accept_cnt = 0
         self._r_shapes = {}
-        self._r_numels = {}
+        self._layout = None
         self._args = None
         self._compiled_potential_fn = None
         self._kwargs = None
@@ -213,6 +240,10 @@ class HMC(TraceKernel):
         self._potential_energy_last = None
         self._z_grads_last = None
         self._warmup_steps = None
+        self._num_chains = None
+        self._chain_adapters = []
+        self._chain_shapes = {}
+        self._unvectorized_model = None
 
     def _find_reasonable_step_size(self):
         step_size = self.step_size
@@ -221,10 +252,10 @@ class HMC(TraceKernel):
         # near the target_accept_prob. If accept_prob:=exp(-delta_energy) is small,
         # then we have to decrease step_size; otherwise, increase step_size.
         z, potential_energy, z_grads = self._fetch_from_cache()
-        r, _ = self._sample_r(name="r_presample_0")
+        r = self._sample_r(name="r_presample_0")
         energy_current = self._kinetic_energy(r) + potential_energy
         z_new, r_new, z_grads_new, potential_energy_new = velocity_verlet(
-            z, r, self._potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
+            z, r, self._flat_potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
         energy_new = self._kinetic_energy(r_new) + potential_energy_new
         delta_energy = energy_new - energy_current
         # direction=1 means keep increasing step_size, otherwise decreasing step_size.
@@ -242,10 +273,10 @@ class HMC(TraceKernel):
         while direction_new == direction:
             t += 1
             step_size = step_size_scale * step_size
-            r, _ = self._sample_r(name="r_presample_{}".format(t))
+            r = self._sample_r(name="r_presample_{}".format(t))
             energy_current = self._kinetic_energy(r) + potential_energy
             z_new, r_new, z_grads_new, potential_energy_new = velocity_verlet(
-                z, r, self._potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
+                z, r, self._flat_potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
             energy_new = self._kinetic_energy(r_new) + potential_energy_new
             delta_energy = energy_new - energy_current
             direction_new = 1 if self._direction_threshold < -delta_energy else -1
@@ -257,29 +288,10 @@ class HMC(TraceKernel):
         without enumeration. This optimistically assumes static model
         structure.
         """
-        with poutine.block():
-            model_trace = poutine.trace(self.model).get_trace(*self._args, **self._kwargs)
-        sites = [site
-                 for site in model_trace.nodes.values()
-                 if site["type"] == "sample"]
-
-        dims = [frame.dim
-                for site in sites
-                for frame in site["cond_indep_stack"]
-                if frame.vectorized]
-        self.max_plate_nesting = -min(dims) if dims else 0
+        self.max_plate_nesting = _guess_max_plate_nesting(self.model, self._args, self._kwargs)
 
     def _sample_r(self, name):
-        r_dist = self._adapter.r_dist
-        r_flat = pyro.sample(name, r_dist)
-        r = {}
-        pos = 0
-        for name in sorted(self._r_shapes):
-            next_pos = pos + self._r_numels[name]
-            r[name] = r_flat[pos:next_pos].reshape(self._r_shapes[name])
-            pos = next_pos
-        assert pos == r_flat.size(0)
-        return r, r_flat
+        return pyro.sample(name, self._adapter.r_dist)
 
     @property
     def inverse_mass_matrix(self):
@@ -325,10 +337,24 @@ class HMC(TraceKernel):
     def _initialize_model_properties(self):
         if self.max_plate_nesting is None:
             self._guess_max_plate_nesting()
+        max_plate_nesting = self.max_plate_nesting
+        chain_plate = None
+        if self._num_chains is not None:
+            # Batch all chains along an outermost plate; the unvectorized model
+            # is restored on cleanup.
+            self._unvectorized_model = poutine.enum(config_enumerate(self.model),
+                                                    first_available_dim=-1 - max_plate_nesting)
+            # The shapes of the latent sites for a single chain are read off the
+            # unvectorized model, since the size-1 dims padded by broadcasting with
+            # the chain plate cannot be told apart from genuine size-1 batch dims.
+            unvectorized_trace = poutine.trace(self._unvectorized_model).get_trace(*self._args, **self._kwargs)
+            self.model = _vectorize_chains(self.model, self._num_chains, dim=-1 - max_plate_nesting)
+            max_plate_nesting += 1
+            chain_plate = CHAIN_PLATE
         # Wrap model in `poutine.enum` to enumerate over discrete latent sites.
         # No-op if model does not have any discrete latents.
         self.model = poutine.enum(config_enumerate(self.model),
-                                  first_available_dim=-1 - self.max_plate_nesting)
+                                  first_available_dim=-1 - max_plate_nesting)
         if self._automatic_transform_enabled:
             self.transforms = {}
         trace = poutine.trace(self.model).get_trace(*self._args, **self._kwargs)
@@ -344,18 +370,24 @@ class HMC(TraceKernel):
                 self.transforms[name] = biject_to(node["fn"].support).inv
                 site_value = self.transforms[name](node["value"])
             self._r_shapes[name] = site_value.shape
-            self._r_numels[name] = site_value.numel()
+            if self._num_chains is not None:
+                self._chain_shapes[name] = unvectorized_trace.nodes[name]["value"].shape
         self._trace_prob_evaluator = TraceEinsumEvaluator(trace,
                                                           self._has_enumerable_sites,
-                                                          self.max_plate_nesting)
-        mass_matrix_size = sum(self._r_numels.values())
+                                                          max_plate_nesting,
+                                                          chain_plate=chain_plate)
+        self._layout = FlatLayout(self._r_shapes, () if self._num_chains is None else (self._num_chains,))
+        mass_matrix_size = self._layout.size
         if self._adapter.is_diag_mass:
             initial_mass_matrix = site_value.new_ones(mass_matrix_size)
         else:
             initial_mass_matrix = eye_like(site_value, mass_matrix_size)
-        self._adapter.configure(self._warmup_steps,
-                                inv_mass_matrix=initial_mass_matrix,
-                                find_reasonable_step_size_fn=self._find_reasonable_step_size)
+        if self._num_chains is None:
+            self._adapter.configure(self._warmup_steps,
+                                    inv_mass_matrix=initial_mass_matrix,
+                                    find_reasonable_step_size_fn=self._find_reasonable_step_size)
+        else:
+            self._configure_chain_adapters(initial_mass_matrix)
         self._initialize_step_size()  # this method also caches z and its potential energy
 
     def _initialize_step_size(self):
@@ -364,7 +396,15 @@ class HMC(TraceKernel):
         # automatically transform `z` to unconstrained space, if needed.
         for name, transform in self.transforms.items():
             z[name] = transform(z[name])
-        potential_energy = self._potential_energy(z)
+        z = self._layout.pack(z)
+        if self._num_chains is not None:
+            # batched integration needs the gradients at z of all chains
+            z_grads, potential_energy = _flat_potential_grad(self._flat_potential_energy, z)
+            self._cache(z, potential_energy, z_grads)
+            if self._adapter.adapt_step_size:
+                self._reset_chain_step_sizes()
+            return
+        potential_energy = self._flat_potential_energy(z)
         self._cache(z, potential_energy, None)
         if self._adapter.adapt_step_size:
             self._adapter.reset_step_size_adaptation()
@@ -376,8 +416,145 @@ class HMC(TraceKernel):
         self._initialize_model_properties()
 
     def cleanup(self):
+        if self._unvectorized_model is not None:
+            self.model = self._unvectorized_model
         self._reset()
 
+    def vectorize_chains(self, num_chains):
+        self._num_chains = num_chains
+
+    def _get_replay_model(self, *args, **kwargs):
+        # The model as run by (unvectorized) chains, i.e. enumerating discrete latent sites.
+        max_plate_nesting = self.max_plate_nesting
+        if max_plate_nesting is None:
+            # e.g. parallel chains guess max_plate_nesting in their own processes
+            max_plate_nesting = _guess_max_plate_nesting(self._raw_model, args, kwargs)
+        return poutine.enum(config_enumerate(self._raw_model), first_available_dim=-1 - max_plate_nesting)
+
+    def _configure_chain_adapters(self, initial_mass_matrix):
+        self._chain_adapters = []
+        for _ in range(self._num_chains):
+            adapter = WarmupAdapter(self._adapter.step_size,
+                                    adapt_step_size=self._adapter.adapt_step_size,
+                                    adapt_mass_matrix=self._adapter.adapt_mass_matrix,
+                                    target_accept_prob=self._adapter.target_accept_prob,
+                                    is_diag_mass=self._adapter.is_diag_mass)
+            # Step sizes of all chains are searched for jointly by `_reset_chain_step_sizes`,
+            # so each adapter simply keeps its current step size when resetting.
+            adapter.configure(self._warmup_steps,
+                              inv_mass_matrix=initial_mass_matrix,
+                              find_reasonable_step_size_fn=lambda adapter=adapter: adapter.step_size)
+            self._chain_adapters.append(adapter)
+
+    def _chain_step_size(self):
+        inverse_mass_matrix = self._chain_adapters[0].inverse_mass_matrix
+        return inverse_mass_matrix.new_tensor([adapter.step_size for adapter in self._chain_adapters])
+
+    def _chain_inverse_mass_matrix(self):
+        return torch.stack([adapter.inverse_mass_matrix for adapter in self._chain_adapters])
+
+    def _chain_kinetic_energy(self, r):
+        inverse_mass_matrix = self._chain_inverse_mass_matrix()
+        if inverse_mass_matrix.dim() == 3:
+            return 0.5 * (inverse_mass_matrix.matmul(r.unsqueeze(-1)).squeeze(-1) * r).sum(-1)
+        else:
+            return 0.5 * (inverse_mass_matrix * r ** 2).sum(-1)
+
+    def _sample_chain_r(self, name):
+        inverse_mass_matrix = self._chain_inverse_mass_matrix()
+        loc = inverse_mass_matrix.new_zeros(inverse_mass_matrix.shape[:2])
+        if self._adapter.is_diag_mass:
+            r_dist = dist.Normal(loc, inverse_mass_matrix.rsqrt()).to_event(1)
+        else:
+            scale_tril = torch.stack([adapter.r_dist.scale_tril for adapter in self._chain_adapters])
+            r_dist = dist.MultivariateNormal(loc, scale_tril=scale_tril)
+        return pyro.sample(name, r_dist)
+
+    def _find_chain_step_size(self):
+        # Same as `_find_reasonable_step_size`, where each chain stops
+        # scaling its step size once its direction changes.
+        step_size = self._chain_step_size()
+        inverse_mass_matrix = self._chain_inverse_mass_matrix()
+        z, potential_energy, z_grads = self._fetch_from_cache()
+        r = self._sample_chain_r(name="r_presample_0")
+        energy_current = self._chain_kinetic_energy(r) + potential_energy
+        z_new, r_new, z_grads_new, potential_energy_new = batched_velocity_verlet(
+            z, r, self._flat_potential_energy, inverse_mass_matrix, step_size, z_grads=z_grads)
+        energy_new = self._chain_kinetic_energy(r_new) + potential_energy_new
+        delta_energy = energy_new - energy_current
+        # comparisons with `NaN` are False, so the direction is -1 for diverging chains
+        direction = torch.where(self._direction_threshold < -delta_energy,
+                                step_size.new_tensor(1.), step_size.new_tensor(-1.))
+        step_size_scale = 2 ** direction
+        searching = direction != 0  # i.e. all chains
+        t = 0
+        while searching.any():
+            t += 1
+            step_size = torch.where(searching, step_size_scale * step_size, step_size)
+            r = self._sample_chain_r(name="r_presample_{}".format(t))
+            energy_current = self._chain_kinetic_energy(r) + potential_energy
+            z_new, r_new, z_grads_new, potential_energy_new = batched_velocity_verlet(
+                z, r, self._flat_potential_energy, inverse_mass_matrix, step_size, z_grads=z_grads)
+            energy_new = self._chain_kinetic_energy(r_new) + potential_energy_new
+            delta_energy = energy_new - energy_current
+            direction_new = torch.where(self._direction_threshold < -delta_energy,
+                                        step_size.new_tensor(1.), step_size.new_tensor(-1.))
+            searching = searching & (direction_new == direction)
+        return step_size
+
+    def _reset_chain_step_sizes(self):
+        with pyro.validation_enabled(False):
+            step_size = self._find_chain_step_size()
+        for adapter, chain_step_size in zip(self._chain_adapters, step_size.tolist()):
+            adapter.step_size = chain_step_size
+            adapter.reset_step_size_adaptation()
+
+    def _adapt_chains(self, z, accept_prob):
+        inverse_mass_matrices = [adapter.inverse_mass_matrix for adapter in self._chain_adapters]
+        for i, adapter in enumerate(self._chain_adapters):
+            adapter.step(self._t, z[i], accept_prob[i])
+        # All chains share the same adaptation schedule, so their mass matrices change together.
+        mass_matrix_changed = any(adapter.inverse_mass_matrix is not inverse_mass_matrix
+                                  for adapter, inverse_mass_matrix
+                                  in zip(self._chain_adapters, inverse_mass_matrices))
+        if mass_matrix_changed and self._adapter.adapt_step_size:
+            self._reset_chain_step_sizes()
+
+    def _sample_chains(self):
+        z, potential_energy, z_grads = self._fetch_from_cache()
+        r = self._sample_chain_r(name="r_t={}".format(self._t))
+        energy_current = self._chain_kinetic_energy(r) + potential_energy
+        step_size = self._chain_step_size()
+        num_steps = (self.trajectory_length / step_size).long().clamp(min=1)
+
+        # Temporarily disable distributions args checking as
+        # NaNs are expected during step size adaptation
+        with optional(pyro.validation_enabled(False), self._t < self._warmup_steps):
+            z_new, r_new, z_grads_new, potential_energy_new = batched_velocity_verlet(
+                z, r, self._flat_potential_energy, self._chain_inverse_mass_matrix(), step_size, num_steps,
+                z_grads=z_grads)
+            # apply Metropolis correction.
+            energy_proposal = self._chain_kinetic_energy(r_new) + potential_energy_new
+        delta_energy = energy_proposal - energy_current
+        # Set accept prob to 0.0 for chains with `NaN` delta_energy, which may be
+        # the case for a diverging trajectory when using a large step size.
+        accept_prob = (-delta_energy).exp().clamp(max=1.)
+        accept_prob = torch.where(delta_energy != delta_energy, accept_prob.new_zeros(()), accept_prob)
+        rand = pyro.sample("rand_t={}".format(self._t), dist.Uniform(accept_prob.new_zeros(self._num_chains),
+                                                                     accept_prob.new_ones(self._num_chains)))
+        accepted = rand < accept_prob
+        self._accept_cnt = self._accept_cnt + accepted.long()
+        z = _batched_where(accepted, z_new, z)
+        potential_energy = torch.where(accepted, potential_energy_new, potential_energy)
+        z_grads = _batched_where(accepted, z_grads_new, z_grads)
+        self._cache(z, potential_energy, z_grads)
+
+        if self._t < self._warmup_steps:
+            self._adapt_chains(z, accept_prob)
+
+        self._t += 1
+        return z
+
     def _cache(self, z, potential_energy, z_grads):
         self._z_last = z
         self._potential_energy_last = potential_energy
@@ -386,15 +563,15 @@ class HMC(TraceKernel):
     def _fetch_from_cache(self):
         return self._z_last, self._potential_energy_last, self._z_grads_last
 
-    def sample(self, trace):
+    def _sample_z(self):
         z, potential_energy, z_grads = self._fetch_from_cache()
-        r, _ = self._sample_r(name="r_t={}".format(self._t))
+        r = self._sample_r(name="r_t={}".format(self._t))
         energy_current = self._kinetic_energy(r) + potential_energy
 
         # Temporarily disable distributions args checking as
         # NaNs are expected during step size adaptation
         with optional(pyro.validation_enabled(False), self._t < self._warmup_steps):
-            z_new, r_new, z_grads_new, potential_energy_new = velocity_verlet(z, r, self._potential_energy,
+            z_new, r_new, z_grads_new, potential_energy_new = velocity_verlet(z, r, self._flat_potential_energy,
                                                                               self.inverse_mass_matrix,
                                                                               self.step_size,
                                                                               self.num_steps,
@@ -419,15 +596,96 @@ class HMC(TraceKernel):
             self._adapter.step(self._t, z, accept_prob)
 
         self._t += 1
+        return z
 
-        # get trace with the constrained values for `z`.
-        z = z.copy()
+    def _sample_constrained(self):
+        z = self._sample_z() if self._num_chains is None else self._sample_chains()
+        # get the constrained values for `z`.
+        z = self._layout.unpack(z)
         for name, transform in self.transforms.items():
             z[name] = transform.inv(z[name])
-        return self._get_trace(z)
+        return z
+
+    def sample(self, trace):
+        return self._get_trace(self._sample_constrained())
+
+    def sample_values(self, values):
+        """
+        Lightweight alternative to :meth:`sample`, which returns the values of
+        the latent sites of the next sample, rather than its trace. This avoids
+        running the model once per sample.
+
+        :param dict values: latent values of the current sample. These are
+            ignored, since the kernel keeps track of the current state.
+        :return: dict mapping latent site names to their values (in constrained
+            space). If chains are vectorized, values of all chains are stacked
+            along the leftmost dimension.
+        :rtype: dict
+        """
+        z = self._sample_constrained()
+        if self._num_chains is not None:
+            z = {name: value.reshape((self._num_chains,) + self._chain_shapes[name])
+                 for name, value in z.items()}
+        return z
 
     def diagnostics(self):
+        if self._num_chains is not None:
+            # averages over chains
+            return OrderedDict([
+                ("step size", "{:.2e}".format(self._chain_step_size().mean().item())),
+                ("acc. rate", "{:.3f}".format(self._accept_cnt.float().mean().item() / self._t))
+            ])
         return OrderedDict([
             ("step size", "{:.2e}".format(self.step_size)),
             ("acc. rate", "{:.3f}".format(self._accept_cnt / self._t))
         ])
+
+
+def _guess_max_plate_nesting(model, args, kwargs):
+    """
+    Guesses max_plate_nesting by running the model once
+    without enumeration. This optimistically assumes static model
+    structure.
+    """
+    with poutine.block():
+        model_trace = poutine.trace(model).get_trace(*args, **kwargs)
+    sites = [site
+             for site in model_trace.nodes.values()
+             if site["type"] == "sample"]
+
+    dims = [frame.dim
+            for site in sites
+            for frame in site["cond_indep_stack"]
+            if frame.vectorized]
+    return -min(dims) if dims else 0
+
+
+def _get_tensor_args(args, kwargs):
+    """
+    Returns the tensors among ``args`` and ``kwargs``, in a fixed order.
+    """
+    return (tuple(arg for arg in args if torch.is_tensor(arg)) +
+            tuple(kwargs[key] for key in sorted(kwargs) if torch.is_tensor(kwargs[key])))
+
+
+def _substitute_tensor_args(args, kwargs, tensor_args):
+    """
+    Inverse of :func:`_get_tensor_args`, which replaces the tensors among
+    ``args`` and ``kwargs`` by ``tensor_args``.
+    """
+    tensor_args = iter(tensor_args)
+    args = tuple(next(tensor_args) if torch.is_tensor(arg) else arg for arg in args)
+    kwargs = {key: next(tensor_args) if torch.is_tensor(kwargs[key]) else kwargs[key] for key in sorted(kwargs)}
+    return args, kwargs
+
+
+def _vectorize_chains(model, num_chains, dim):
+    """
+    Wraps ``model`` in an outermost plate of size ``num_chains``, so that a
+    single run of the returned model evaluates all chains.
+    """
+    def vectorized_model(*args, **kwargs):
+        with pyro.plate(CHAIN_PLATE, num_chains, dim=dim):
+            return model(*args, **kwargs)
+
+    return vectorized_model
@@ -14,10 +14,14 @@ import torch
 import torch.multiprocessing as mp
 
 import pyro
+import pyro.poutine as poutine
+from pyro.distributions import Categorical
 from pyro.infer import TracePosterior
 from pyro.infer.abstract_infer import Marginals
 from pyro.infer.mcmc.logger import initialize_logger, initialize_progbar, DIAGNOSTIC_MSG, TqdmHandler
+from pyro.poutine import Trace
 import pyro.ops.stats as stats
+from pyro.ops.welford import WelfordBatchMeans
 from pyro.util import optional
 
 
@@ -66,10 +70,10 @@ def logger_thread(log_queue, warmup_steps, num_samples, num_chains, disable_prog
 class _Worker(object):
     def __init__(self, chain_id, result_queue, log_queue, event,
                  kernel, num_samples, warmup_steps=0,
-                 args=None, kwargs=None):
+                 args=None, kwargs=None, sample_values=False):
         self.chain_id = chain_id
         self.trace_gen = _SingleSampler(kernel, num_samples=num_samples, warmup_steps=warmup_steps,
-                                        disable_progbar=True)
+                                        disable_progbar=True, sample_values=sample_values)
         self.args = args if args is not None else []
         self.kwargs = kwargs if kwargs is not None else {}
         self.rng_seed = (torch.initial_seed() + chain_id) % MAX_SEED
@@ -113,9 +117,11 @@ class _ParallelSampler(TracePosterior):
     `torch.multiprocessing` module (itself a light wrapper over the python
     `multiprocessing` module) to spin up parallel workers.
     """
-    def __init__(self, kernel, num_samples, warmup_steps, num_chains, mp_context, disable_progbar):
+    def __init__(self, kernel, num_samples, warmup_steps, num_chains, mp_context, disable_progbar,
+                 sample_values=False):
         super(_ParallelSampler, self).__init__()
         self.kernel = kernel
+        self.sample_values = sample_values
         self.warmup_steps = warmup_steps
         self.num_chains = num_chains
         self.workers = []
@@ -141,7 +147,7 @@ class _ParallelSampler(TracePosterior):
         self.workers = []
         for i in range(self.num_chains):
             worker = _Worker(i, self.result_queue, self.log_queue, self.events[i], self.kernel,
-                             self.num_samples, self.warmup_steps, args, kwargs)
+                             self.num_samples, self.warmup_steps, args, kwargs, self.sample_values)
             worker.daemon = True
             self.workers.append(self.ctx.Process(name=str(i), target=worker.run))
 
@@ -184,21 +190,30 @@ class _ParallelSampler(TracePosterior):
 class _SingleSampler(TracePosterior):
     """
     Single process runner class optimized for the case `num_chains=1`.
+    If ``sample_values=True``, this generates the latent values of samples
+    via ``kernel.sample_values`` rather than their traces.
     """
-    def __init__(self, kernel, num_samples, warmup_steps, disable_progbar):
+    def __init__(self, kernel, num_samples, warmup_steps, disable_progbar, sample_values=False):
         self.kernel = kernel
         self.warmup_steps = warmup_steps
         self.num_samples = num_samples
         self.logger = None
         self.disable_progbar = disable_progbar
+        self.sample_values = sample_values
+        self.streaming_diagnostics = None
         super(_SingleSampler, self).__init__()
 
-    def _gen_samples(self, num_samples, init_trace):
+    def _gen_samples(self, num_samples, init_trace, streaming_diagnostics=None):
         trace = init_trace
+        sample = self.kernel.sample_values if self.sample_values else self.kernel.sample
         for _ in range(num_samples):
-            trace = self.kernel.sample(trace)
-            diagnostics = json.dumps(self.kernel.diagnostics())
-            self.logger.info(diagnostics, extra={"msg_type": DIAGNOSTIC_MSG})
+            trace = sample(trace)
+            diagnostics = self.kernel.diagnostics()
+            if streaming_diagnostics is not None:
+                streaming_diagnostics.update({name: value.unsqueeze(0) for name, value in trace.items()})
+                diagnostics = OrderedDict(diagnostics or ())
+                diagnostics.update(streaming_diagnostics.summary())
+            self.logger.info(json.dumps(diagnostics), extra={"msg_type": DIAGNOSTIC_MSG})
             yield trace
 
     def _traces(self, *args, **kwargs):
@@ -211,17 +226,204 @@ class _SingleSampler(TracePosterior):
             progress_bar = initialize_progbar(self.warmup_steps, self.num_samples, disable=self.disable_progbar)
         self.logger = initialize_logger(self.logger, logger_id, progress_bar, log_queue)
         self.kernel.setup(self.warmup_steps, *args, **kwargs)
-        trace = self.kernel.initial_trace
+        trace = None if self.sample_values else self.kernel.initial_trace
         with optional(progress_bar, not is_multiprocessing):
             for trace in self._gen_samples(self.warmup_steps, trace):
                 continue
             if progress_bar:
                 progress_bar.set_description("Sample")
-            for trace in self._gen_samples(self.num_samples, trace):
+            # Latent values are summarized online into estimates of the
+            # effective sample size and split R-hat of the chain.
+            self.streaming_diagnostics = _StreamingDiagnostics() if self.sample_values else None
+            for trace in self._gen_samples(self.num_samples, trace, self.streaming_diagnostics):
                 yield (trace, 1.0)
         self.kernel.cleanup()
 
 
+class _VectorizedSampler(TracePosterior):
+    """
+    Single process runner class for the case `num_chains > 1`, which runs all
+    chains in lockstep, batched along an outermost chain plate. This generates
+    the latent values of all chains at each step, stacked along the leftmost
+    dimension.
+    """
+    def __init__(self, kernel, num_samples, warmup_steps, num_chains, disable_progbar):
+        self.kernel = kernel
+        self.warmup_steps = warmup_steps
+        self.num_samples = num_samples
+        self.num_chains = num_chains
+        self.logger = None
+        self.disable_progbar = disable_progbar
+        self.streaming_diagnostics = None
+        super(_VectorizedSampler, self).__init__(num_chains=num_chains)
+
+    def _gen_samples(self, num_samples, init_values, streaming_diagnostics=None):
+        values = init_values
+        for _ in range(num_samples):
+            values = self.kernel.sample_values(values)
+            diagnostics = self.kernel.diagnostics()
+            if streaming_diagnostics is not None:
+                streaming_diagnostics.update(values)
+                diagnostics = OrderedDict(diagnostics or ())
+                diagnostics.update(streaming_diagnostics.summary())
+            self.logger.info(json.dumps(diagnostics), extra={"msg_type": DIAGNOSTIC_MSG})
+            yield values
+
+    def _traces(self, *args, **kwargs):
+        progress_bar = initialize_progbar(self.warmup_steps, self.num_samples, disable=self.disable_progbar)
+        self.logger = initialize_logger(logging.getLogger("pyro.infer.mcmc"), "", progress_bar)
+        self.kernel.vectorize_chains(self.num_chains)
+        self.kernel.setup(self.warmup_steps, *args, **kwargs)
+        values = None
+        with progress_bar:
+            for values in self._gen_samples(self.warmup_steps, values):
+                continue
+            progress_bar.set_description("Sample")
+            self.streaming_diagnostics = _StreamingDiagnostics()
+            for values in self._gen_samples(self.num_samples, values, self.streaming_diagnostics):
+                yield values, 0., None
+        self.kernel.cleanup()
+
+
+class _StreamingDiagnostics(object):
+    """
+    Online estimates of the effective sample size and split Gelman-Rubin
+    statistic of latent sites, updated as samples are generated. This keeps a
+    :class:`~pyro.ops.welford.WelfordBatchMeans` estimator per site, so that
+    its memory does not grow with the number of samples.
+
+    :param int num_batches: maximum number of batch means kept per site.
+    """
+    def __init__(self, num_batches=64):
+        self.num_batches = num_batches
+        self.estimators = OrderedDict()
+        self._summary = OrderedDict()
+
+    def update(self, values):
+        """
+        :param dict values: dict of latent values of all chains, with the chains
+            along the leftmost dimension.
+        """
+        batch_done = False
+        for name, value in values.items():
+            if name not in self.estimators:
+                self.estimators[name] = WelfordBatchMeans(self.num_batches)
+            estimator = self.estimators[name]
+            estimator.update(value.detach())
+            batch_done = batch_done or estimator.n_samples % estimator.batch_size == 0
+        # Estimates only change materially when a batch is complete.
+        if batch_done:
+            self._summary = self._compute_summary()
+
+    def _compute_summary(self):
+        try:
+            n_eff = min(e.get_effective_sample_size().min().item() for e in self.estimators.values())
+            r_hat = max(e.get_split_gelman_rubin().max().item() for e in self.estimators.values())
+        except RuntimeError:
+            return OrderedDict()
+        return OrderedDict([("min n_eff", "{:.1f}".format(n_eff)), ("max r_hat", "{:.3f}".format(r_hat))])
+
+    def diagnostics(self):
+        """
+        Gets the current estimates of effective sample size and split
+        Gelman-Rubin for each site, in the format of
+        :meth:`MCMCMarginals.diagnostics`.
+        """
+        diagnostics = OrderedDict()
+        for name, estimator in self.estimators.items():
+            diagnostics[name] = OrderedDict([("n_eff", estimator.get_effective_sample_size()),
+                                             ("r_hat", estimator.get_split_gelman_rubin())])
+        return diagnostics
+
+    def summary(self):
+        """
+        Gets the smallest effective sample size and largest split Gelman-Rubin
+        over all latent values, formatted for display in the progress bar.
+        """
+        return self._summary
+
+
+class _SampleStore(object):
+    """
+    Array-backed storage of the latent values of MCMC samples. The values of
+    each site are written to a tensor of shape ``(num_chains, num_samples) +
+    site_shape``, which is preallocated on the first write to that site.
+
+    :param int num_chains: Number of chains.
+    :param int num_samples: Number of samples per chain.
+    """
+    def __init__(self, num_chains, num_samples):
+        self.num_chains = num_chains
+        self.num_samples = num_samples
+        self.values = OrderedDict()
+        self._num_samples_by_chain = [0] * num_chains
+
+    def add(self, values, chain_id=None):
+        """
+        Writes the latent values of the next sample of a chain.
+
+        :param dict values: dict mapping latent site names to their values.
+        :param int chain_id: id of the chain. If None, the values of all chains
+            are given, stacked along the leftmost dimension.
+        """
+        chain_ids = slice(None) if chain_id is None else chain_id
+        idx = self._num_samples_by_chain[0 if chain_id is None else chain_id]
+        for name, value in values.items():
+            buffer = self.values.get(name)
+            if buffer is None:
+                site_shape = value.shape if chain_id is not None else value.shape[1:]
+                buffer = value.new_empty((self.num_chains, self.num_samples) + site_shape)
+                self.values[name] = buffer
+            buffer[chain_ids, idx] = value.detach()
+        if chain_id is None:
+            self._num_samples_by_chain = [idx + 1] * self.num_chains
+        else:
+            self._num_samples_by_chain[chain_id] = idx + 1
+
+    def __len__(self):
+        return self.num_chains * self.num_samples
+
+    def get_values(self, chain_id, idx):
+        """
+        :returns: dict mapping latent site names to their values in sample
+            ``idx`` of chain ``chain_id``.
+        :rtype: dict
+        """
+        return OrderedDict((name, value[chain_id, idx]) for name, value in self.values.items())
+
+
+class _LazyTraces(object):
+    """
+    Read-only sequence of the traces of samples held by a :class:`_SampleStore`,
+    ordered by chain. Each trace is rebuilt on access, by replaying ``model``
+    against the latent values of the sample.
+    """
+    def __init__(self, sample_store, model, args, kwargs):
+        self.sample_store = sample_store
+        self.model = model
+        self.args = args
+        self.kwargs = kwargs
+
+    def __len__(self):
+        return len(self.sample_store)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("trace index out of range")
+        chain_id, idx = divmod(i, self.sample_store.num_samples)
+        values_trace = Trace()
+        for name, value in self.sample_store.get_values(chain_id, idx).items():
+            values_trace.add_node(name, type="sample", is_observed=False, value=value, infer={})
+        with poutine.block():
+            return poutine.trace(poutine.replay(self.model, trace=values_trace)).get_trace(*self.args, **self.kwargs)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
 class MCMC(TracePosterior):
     """
     Wrapper class for Markov Chain Monte Carlo algorithms. Specific MCMC algorithms
@@ -245,18 +447,30 @@ class MCMC(TracePosterior):
         during the warmup phase are discarded. If not provided, default is
         half of `num_samples`.
     :param int num_chains: Number of MCMC chains to run in parallel. Depending on
-        whether `num_chains` is 1 or more than 1, this class internally dispatches
-        to either `_SingleSampler` or `_ParallelSampler`.
+        whether `num_chains` is 1 or more than 1, and on ``chain_method``, this
+        class internally dispatches to either `_SingleSampler`, `_ParallelSampler`
+        or `_VectorizedSampler`.
     :param str mp_context: Multiprocessing context to use when `num_chains > 1`.
         Only applicable for Python 3.5 and above. Use `mp_context="spawn"` for
         CUDA.
     :param bool disable_progbar: Disable progress bar and diagnostics update.
+    :param str chain_method: How to run `num_chains > 1` chains. With the default
+        "parallel", each chain runs in its own process. With "vectorized", all
+        chains run in lockstep in a single process, batched along an outermost
+        :func:`pyro.plate`; this requires a kernel which supports
+        :meth:`~pyro.infer.mcmc.trace_kernel.TraceKernel.vectorize_chains`, and
+        a model whose batch dimensions are all declared via :func:`pyro.plate`.
+        Note that the ``"_RETURN"`` site of each chain's trace then holds the
+        return value of the vectorized model.
     """
     def __init__(self, kernel, num_samples, warmup_steps=None,
-                 num_chains=1, mp_context=None, disable_progbar=False):
+                 num_chains=1, mp_context=None, disable_progbar=False, chain_method="parallel"):
         self.warmup_steps = num_samples if warmup_steps is None else warmup_steps  # Stan
         self.num_samples = num_samples
-        if num_chains > 1:
+        if chain_method not in ("parallel", "vectorized"):
+            raise ValueError("chain_method must be one of 'parallel' or 'vectorized', got {}."
+                             .format(chain_method))
+        if num_chains > 1 and chain_method == "parallel":
             # verify num_chains is compatible with available CPU.
             available_cpu = max(mp.cpu_count() - 1, 1)  # reserving 1 for the main process.
             if num_chains > available_cpu:
@@ -264,17 +478,70 @@ class MCMC(TracePosterior):
                               "Resetting number of chains to available CPU count."
                               .format(num_chains, available_cpu))
                 num_chains = available_cpu
-        if num_chains > 1:
+        self.kernel = kernel
+        # Kernels which can generate the latent values of samples without their
+        # traces have their samples recorded in a `_SampleStore`.
+        sample_values = hasattr(kernel, "sample_values")
+        if num_chains > 1 and chain_method == "vectorized":
+            self.sampler = _VectorizedSampler(kernel, num_samples, self.warmup_steps, num_chains, disable_progbar)
+        elif num_chains > 1:
             self.sampler = _ParallelSampler(kernel, num_samples, self.warmup_steps,
-                                            num_chains, mp_context, disable_progbar)
+                                            num_chains, mp_context, disable_progbar, sample_values)
         else:
-            self.sampler = _SingleSampler(kernel, num_samples, self.warmup_steps, disable_progbar)
+            self.sampler = _SingleSampler(kernel, num_samples, self.warmup_steps, disable_progbar, sample_values)
+        self._sample_values = sample_values
         super(MCMC, self).__init__(num_chains=num_chains)
 
+    def _reset(self):
+        super(MCMC, self)._reset()
+        self.sample_store = None
+
     def _traces(self, *args, **kwargs):
         for sample in self.sampler._traces(*args, **kwargs):
             yield sample
 
+    def run(self, *args, **kwargs):
+        """
+        Runs the sampler. If the kernel implements ``sample_values``, only the
+        latent values of samples are recorded in :attr:`sample_store`, and the
+        traces in :attr:`exec_traces` are rebuilt on access.
+
+        :param args: optional args taken by the model.
+        :param kwargs: optional keywords args taken by the model.
+        """
+        if not self._sample_values:
+            return super(MCMC, self).run(*args, **kwargs)
+        self._reset()
+        sample_store = _SampleStore(self.num_chains, self.num_samples)
+        with poutine.block():
+            for vals in self._traces(*args, **kwargs):
+                values, chain_id = vals[0], vals[2] if len(vals) == 3 else 0
+                sample_store.add(values, chain_id)
+        self.sample_store = sample_store
+        self.exec_traces = _LazyTraces(sample_store, self.kernel._get_replay_model(*args, **kwargs), args, kwargs)
+        self.log_weights = [0.] * len(sample_store)
+        self.chain_ids = [chain_id for chain_id in range(self.num_chains) for _ in range(self.num_samples)]
+        self._idx_by_chain = [list(range(chain_id * self.num_samples, (chain_id + 1) * self.num_samples))
+                              for chain_id in range(self.num_chains)]
+        self._categorical = Categorical(logits=torch.zeros(len(sample_store)))
+        return self
+
+    def _get_site_values(self, sites):
+        store = self.sample_store
+        names = [sites] if isinstance(sites, str) else sites
+        if store is None or not all(name in store.values for name in names):
+            # e.g. "_RETURN" is only available from the (lazily rebuilt) traces
+            for value in super(MCMC, self)._get_site_values(sites):
+                yield value
+            return
+        # samples are ordered by chain, see `run`
+        for chain_id in range(store.num_chains):
+            for idx in range(store.num_samples):
+                if isinstance(sites, str):
+                    yield store.values[sites][chain_id, idx]
+                else:
+                    yield torch.stack([store.values[name][chain_id, idx] for name in names], 0)
+
     def marginal(self, sites=None):
         """
         Marginalizes latent sites from the sampler.
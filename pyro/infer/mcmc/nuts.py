@@ -8,7 +8,7 @@ import pyro
 import pyro.distributions as dist
 from pyro.distributions.util import logsumexp
 from pyro.infer.mcmc.hmc import HMC
-from pyro.ops.integrator import velocity_verlet
+from pyro.ops.integrator import _batched_where, batched_velocity_verlet, velocity_verlet
 from pyro.util import optional, torch_isnan
 
 # sum_accept_probs and num_proposals are used to calculate
@@ -148,26 +148,120 @@ class NUTS(HMC):
 
     def _is_turning(self, r_left, r_right, r_sum):
         # We follow the strategy in Section A.4.2 of [2] for this implementation.
-        r_left_flat = torch.cat([r_left[site_name].reshape(-1) for site_name in sorted(r_left)])
-        r_right_flat = torch.cat([r_right[site_name].reshape(-1) for site_name in sorted(r_right)])
         if self.inverse_mass_matrix.dim() == 2:
-            if (self.inverse_mass_matrix.matmul(r_left_flat).dot(r_sum - r_left_flat) > 0 and
-                    self.inverse_mass_matrix.matmul(r_right_flat).dot(r_sum - r_right_flat) > 0):
+            if (self.inverse_mass_matrix.matmul(r_left).dot(r_sum - r_left) > 0 and
+                    self.inverse_mass_matrix.matmul(r_right).dot(r_sum - r_right) > 0):
                 return False
         else:
-            if (self.inverse_mass_matrix.mul(r_left_flat).dot(r_sum - r_left_flat) > 0 and
-                    self.inverse_mass_matrix.mul(r_right_flat).dot(r_sum - r_right_flat) > 0):
+            if (self.inverse_mass_matrix.mul(r_left).dot(r_sum - r_left) > 0 and
+                    self.inverse_mass_matrix.mul(r_right).dot(r_sum - r_right) > 0):
                 return False
         return True
 
-    def _build_basetree(self, z, r, z_grads, log_slice, direction, energy_current):
+    def _is_iterative_turning(self, r, r_sum, idx_min, idx_max):
+        # Checks the turning condition of the subtrees which end at the leaf with
+        # momentum `r`, and start at the leaves whose momenta are checkpointed at
+        # `idx_min`, ..., `idx_max`.
+        for i in range(idx_max, idx_min - 1, -1):
+            subtree_r_sum = r_sum - self._r_sum_ckpts[i] + self._r_ckpts[i]
+            if self._is_turning(self._r_ckpts[i], r, subtree_r_sum):
+                return True
+        return False
+
+    def _build_tree(self, z, r, z_grads, log_slice, direction, tree_depth, energy_current):
+        # Builds a tree of 2^tree_depth leaves iteratively, one leapfrog step at a time,
+        # following the strategy of Stan and NumPyro: the turning conditions of all
+        # (sub)trees which end at a new leaf are checked against the momenta and
+        # partial sums of momenta checkpointed at the first leaves of these trees,
+        # see `_leaf_idx_to_ckpt_idxs`. Sampling a proposal uniformly (or, with
+        # multinomial sampling, with probability proportional to its weight) among
+        # the leaves is done progressively as each leaf is added.
         step_size = self.step_size if direction == 1 else -self.step_size
-        z_new, r_new, z_grads, potential_energy = velocity_verlet(
-            z, r, self._potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
-        r_new_flat = torch.cat([r_new[site_name].reshape(-1) for site_name in sorted(r_new)])
-        energy_new = potential_energy + self._kinetic_energy(r_new)
+        z_first, r_first, z_first_grads = None, None, None
+        z_proposal = z_proposal_pe = z_proposal_grads = None
+        tree_weight = r_sum = None
+        sum_accept_probs = 0.
+        num_proposals = 0
+        turning = diverging = False
+        for leaf_idx in range(2 ** tree_depth):
+            z, r, z_grads, potential_energy = velocity_verlet(
+                z, r, self._flat_potential_energy, self.inverse_mass_matrix, step_size, z_grads=z_grads)
+            energy_new = potential_energy + self._kinetic_energy(r)
+            # handle the NaN case
+            energy_new = energy_new.new_tensor(float("inf")) if torch_isnan(energy_new) else energy_new
+            sliced_energy = energy_new + log_slice
+            diverging = (sliced_energy > self._max_sliced_energy)
+            delta_energy = energy_new - energy_current
+            sum_accept_probs = sum_accept_probs + (-delta_energy).exp().clamp(max=1.0)
+            num_proposals += 1
+
+            if self.use_multinomial_sampling:
+                leaf_weight = -sliced_energy
+            else:
+                # As a part of the slice sampling process (see below), along the trajectory
+                #   we eliminate states which p(z, r) < u, or dE > 0.
+                # Due to this elimination (and stop doubling conditions),
+                #   the weight of binary tree might not equal to 2^tree_depth.
+                leaf_weight = (sliced_energy.new_ones(()) if sliced_energy <= 0
+                               else sliced_energy.new_zeros(()))
+
+            if leaf_idx == 0:
+                z_first, r_first, z_first_grads = z, r, z_grads
+                z_proposal, z_proposal_pe, z_proposal_grads = z, potential_energy, z_grads
+                tree_weight = leaf_weight
+                r_sum = r
+            else:
+                if self.use_multinomial_sampling:
+                    tree_weight = logsumexp(torch.stack([tree_weight, leaf_weight]), dim=0)
+                    leaf_prob = (leaf_weight - tree_weight).exp()
+                else:
+                    tree_weight = tree_weight + leaf_weight
+                    leaf_prob = leaf_weight / tree_weight if tree_weight > 0 else tree_weight.new_zeros(())
+                # draw directly from the generator, as this is done for every leaf
+                if leaf_prob.new_empty(()).uniform_() < leaf_prob:
+                    z_proposal, z_proposal_pe, z_proposal_grads = z, potential_energy, z_grads
+                r_sum = r_sum + r
+
+            if diverging:
+                break
+            if leaf_idx % 2 == 0:
+                _, idx_max = _leaf_idx_to_ckpt_idxs(leaf_idx)
+                self._r_ckpts[idx_max] = r
+                self._r_sum_ckpts[idx_max] = r_sum
+            else:
+                idx_min, idx_max = _leaf_idx_to_ckpt_idxs(leaf_idx)
+                if self._is_iterative_turning(r, r_sum, idx_min, idx_max):
+                    turning = True
+                    break
+
+        # leaves of the tree are determined by the direction
+        if direction == 1:
+            return _TreeInfo(z_first, r_first, z_first_grads, z, r, z_grads, z_proposal, z_proposal_pe,
+                             z_proposal_grads, r_sum, tree_weight, turning, diverging, sum_accept_probs,
+                             num_proposals)
+        return _TreeInfo(z, r, z_grads, z_first, r_first, z_first_grads, z_proposal, z_proposal_pe,
+                         z_proposal_grads, r_sum, tree_weight, turning, diverging, sum_accept_probs,
+                         num_proposals)
+
+    def _is_chain_turning(self, r_left, r_right, r_sum):
+        # Batched version of `_is_turning`, which checks the turning condition of each chain.
+        inverse_mass_matrix = self._chain_inverse_mass_matrix()
+        if inverse_mass_matrix.dim() == 3:
+            v_left = inverse_mass_matrix.matmul(r_left.unsqueeze(-1)).squeeze(-1)
+            v_right = inverse_mass_matrix.matmul(r_right.unsqueeze(-1)).squeeze(-1)
+        else:
+            v_left = inverse_mass_matrix * r_left
+            v_right = inverse_mass_matrix * r_right
+        return ~(((v_left * (r_sum - r_left)).sum(-1) > 0) & ((v_right * (r_sum - r_right)).sum(-1) > 0))
+
+    def _build_chain_basetree(self, z, r, z_grads, log_slice, direction, energy_current):
+        # `direction` is a tensor holding the direction (1 for right, 0 for left) of each chain.
+        step_size = self._chain_step_size() * (2 * direction - 1)
+        z_new, r_new, z_grads, potential_energy = batched_velocity_verlet(
+            z, r, self._flat_potential_energy, self._chain_inverse_mass_matrix(), step_size, z_grads=z_grads)
+        energy_new = potential_energy + self._chain_kinetic_energy(r_new)
         # handle the NaN case
-        energy_new = energy_new.new_tensor(float("inf")) if torch_isnan(energy_new) else energy_new
+        energy_new = torch.where(energy_new != energy_new, energy_new.new_tensor(float("inf")), energy_new)
         sliced_energy = energy_new + log_slice
         diverging = (sliced_energy > self._max_sliced_energy)
         delta_energy = energy_new - energy_current
@@ -176,101 +270,162 @@ class NUTS(HMC):
         if self.use_multinomial_sampling:
             tree_weight = -sliced_energy
         else:
-            # As a part of the slice sampling process (see below), along the trajectory
-            #   we eliminate states which p(z, r) < u, or dE > 0.
-            # Due to this elimination (and stop doubling conditions),
-            #   the weight of binary tree might not equal to 2^tree_depth.
-            tree_weight = (sliced_energy.new_ones(()) if sliced_energy <= 0
-                           else sliced_energy.new_zeros(()))
+            tree_weight = (sliced_energy <= 0).type_as(sliced_energy)
 
         return _TreeInfo(z_new, r_new, z_grads, z_new, r_new, z_grads, z_new, potential_energy,
-                         z_grads, r_new_flat, tree_weight, False, diverging, accept_prob, 1)
+                         z_grads, r_new, tree_weight, torch.zeros_like(diverging), diverging, accept_prob,
+                         torch.ones_like(accept_prob))
 
-    def _build_tree(self, z, r, z_grads, log_slice, direction, tree_depth, energy_current):
+    def _build_chain_tree(self, z, r, z_grads, log_slice, direction, tree_depth, energy_current):
+        # Batched, recursive counterpart of `_build_tree`. All chains build their trees in lockstep; chains
+        # which stop doubling after the first half of the tree ignore its other half.
         if tree_depth == 0:
-            return self._build_basetree(z, r, z_grads, log_slice, direction, energy_current)
-
-        # build the first half of tree
-        half_tree = self._build_tree(z, r, z_grads, log_slice,
-                                     direction, tree_depth-1, energy_current)
-        z_proposal = half_tree.z_proposal
-        z_proposal_pe = half_tree.z_proposal_pe
-        z_proposal_grads = half_tree.z_proposal_grads
-
-        # Check conditions to stop doubling. If we meet that condition,
-        #     there is no need to build the other tree.
-        if half_tree.turning or half_tree.diverging:
-            return half_tree
+            return self._build_chain_basetree(z, r, z_grads, log_slice, direction, energy_current)
 
-        # Else, build remaining half of tree.
-        # If we are going to the right, start from the right leaf of the first half.
-        if direction == 1:
-            z = half_tree.z_right
-            r = half_tree.r_right
-            z_grads = half_tree.z_right_grads
-        else:  # otherwise, start from the left leaf of the first half
-            z = half_tree.z_left
-            r = half_tree.r_left
-            z_grads = half_tree.z_left_grads
-        other_half_tree = self._build_tree(z, r, z_grads, log_slice,
+        half_tree = self._build_chain_tree(z, r, z_grads, log_slice,
                                            direction, tree_depth-1, energy_current)
+        stopped = half_tree.turning | half_tree.diverging
+        if stopped.all():
+            return half_tree
+
+        is_right = direction == 1
+        z = _batched_where(is_right, half_tree.z_right, half_tree.z_left)
+        r = _batched_where(is_right, half_tree.r_right, half_tree.r_left)
+        z_grads = _batched_where(is_right, half_tree.z_right_grads, half_tree.z_left_grads)
+        other_half_tree = self._build_chain_tree(z, r, z_grads, log_slice,
+                                                 direction, tree_depth-1, energy_current)
 
         if self.use_multinomial_sampling:
             tree_weight = logsumexp(torch.stack([half_tree.weight, other_half_tree.weight]), dim=0)
+            other_half_tree_prob = (other_half_tree.weight - tree_weight).exp()
         else:
             tree_weight = half_tree.weight + other_half_tree.weight
-        sum_accept_probs = half_tree.sum_accept_probs + other_half_tree.sum_accept_probs
-        num_proposals = half_tree.num_proposals + other_half_tree.num_proposals
+            other_half_tree_prob = torch.where(tree_weight > 0, other_half_tree.weight / tree_weight,
+                                               tree_weight.new_zeros(()))
+        # chains that diverged in the first half of the tree may give NaN here; they are discarded below
+        other_half_tree_prob = torch.where(other_half_tree_prob != other_half_tree_prob,
+                                           other_half_tree_prob.new_zeros(()), other_half_tree_prob)
+        is_other_half_tree = pyro.sample("is_other_half_tree",
+                                         dist.Bernoulli(probs=other_half_tree_prob)) == 1
+
+        z_left = _batched_where(is_right, half_tree.z_left, other_half_tree.z_left)
+        r_left = _batched_where(is_right, half_tree.r_left, other_half_tree.r_left)
+        z_right = _batched_where(is_right, other_half_tree.z_right, half_tree.z_right)
+        r_right = _batched_where(is_right, other_half_tree.r_right, half_tree.r_right)
         r_sum = half_tree.r_sum + other_half_tree.r_sum
+        full_tree = _TreeInfo(
+            z_left, r_left, _batched_where(is_right, half_tree.z_left_grads, other_half_tree.z_left_grads),
+            z_right, r_right, _batched_where(is_right, other_half_tree.z_right_grads, half_tree.z_right_grads),
+            _batched_where(is_other_half_tree, other_half_tree.z_proposal, half_tree.z_proposal),
+            torch.where(is_other_half_tree, other_half_tree.z_proposal_pe, half_tree.z_proposal_pe),
+            _batched_where(is_other_half_tree, other_half_tree.z_proposal_grads, half_tree.z_proposal_grads),
+            r_sum, tree_weight,
+            other_half_tree.turning | self._is_chain_turning(r_left, r_right, r_sum),
+            other_half_tree.diverging,
+            half_tree.sum_accept_probs + other_half_tree.sum_accept_probs,
+            half_tree.num_proposals + other_half_tree.num_proposals)
+        return _select_chain_tree(stopped, half_tree, full_tree)
+
+    def _sample_chains(self):
+        z, potential_energy, z_grads = self._fetch_from_cache()
+        r = self._sample_chain_r(name="r_t={}".format(self._t))
+        energy_current = self._chain_kinetic_energy(r) + potential_energy
 
-        # The probability of that proposal belongs to which half of tree
-        #     is computed based on the weights of each half.
         if self.use_multinomial_sampling:
-            other_half_tree_prob = (other_half_tree.weight - tree_weight).exp()
+            log_slice = -energy_current
         else:
-            # For the special case that the weights of each half are both 0,
-            #   we choose the proposal from the first half
-            #   (any is fine, because the probability of picking it at the end is 0!).
-            other_half_tree_prob = (other_half_tree.weight / tree_weight if tree_weight > 0
-                                    else tree_weight.new_zeros(()))
-        is_other_half_tree = pyro.sample("is_other_half_tree",
-                                         dist.Bernoulli(probs=other_half_tree_prob))
-
-        if is_other_half_tree == 1:
-            z_proposal = other_half_tree.z_proposal
-            z_proposal_pe = other_half_tree.z_proposal_pe
-            z_proposal_grads = other_half_tree.z_proposal_grads
+            slice_exp_term = pyro.sample("slicevar_exp_t={}".format(self._t),
+                                         dist.Exponential(energy_current.new_ones(self._num_chains)))
+            log_slice = -energy_current - slice_exp_term
 
-        # leaves of the full tree are determined by the direction
-        if direction == 1:
-            z_left = half_tree.z_left
-            r_left = half_tree.r_left
-            z_left_grads = half_tree.z_left_grads
-            z_right = other_half_tree.z_right
-            r_right = other_half_tree.r_right
-            z_right_grads = other_half_tree.z_right_grads
+        z_left = z_right = z
+        r_left = r_right = r
+        z_left_grads = z_right_grads = z_grads
+        r_sum = r
+        sum_accept_probs = energy_current.new_zeros(self._num_chains)
+        num_proposals = energy_current.new_zeros(self._num_chains)
+        if self.use_multinomial_sampling:
+            tree_weight = energy_current.new_zeros(self._num_chains)
         else:
-            z_left = other_half_tree.z_left
-            r_left = other_half_tree.r_left
-            z_left_grads = other_half_tree.z_left_grads
-            z_right = half_tree.z_right
-            r_right = half_tree.r_right
-            z_right_grads = half_tree.z_right_grads
+            tree_weight = energy_current.new_ones(self._num_chains)
+        # chains which are still doubling their trees
+        active = energy_current.new_ones(self._num_chains) > 0
+        accepted = ~active
 
-        # We already check if first half tree is turning. Now, we check
-        #     if the other half tree or full tree are turning.
-        turning = other_half_tree.turning or self._is_turning(r_left, r_right, r_sum)
+        # Temporarily disable distributions args checking as
+        # NaNs are expected during step size adaptation.
+        with optional(pyro.validation_enabled(False), self._t < self._warmup_steps):
+            tree_depth = 0
+            while tree_depth < self._max_tree_depth and active.any():
+                direction = pyro.sample("direction_t={}_treedepth={}".format(self._t, tree_depth),
+                                        dist.Bernoulli(probs=tree_weight.new_full((self._num_chains,), 0.5)))
+                is_right = direction == 1
+                new_tree = self._build_chain_tree(_batched_where(is_right, z_right, z_left),
+                                                  _batched_where(is_right, r_right, r_left),
+                                                  _batched_where(is_right, z_right_grads, z_left_grads),
+                                                  log_slice, direction, tree_depth, energy_current)
+                # update leaves of active chains for the next doubling process
+                go_right = active & is_right
+                go_left = active & ~is_right
+                z_right = _batched_where(go_right, new_tree.z_right, z_right)
+                r_right = _batched_where(go_right, new_tree.r_right, r_right)
+                z_right_grads = _batched_where(go_right, new_tree.z_right_grads, z_right_grads)
+                z_left = _batched_where(go_left, new_tree.z_left, z_left)
+                r_left = _batched_where(go_left, new_tree.r_left, r_left)
+                z_left_grads = _batched_where(go_left, new_tree.z_left_grads, z_left_grads)
+
+                sum_accept_probs = torch.where(active, sum_accept_probs + new_tree.sum_accept_probs,
+                                               sum_accept_probs)
+                num_proposals = torch.where(active, num_proposals + new_tree.num_proposals, num_proposals)
+
+                active = active & ~(new_tree.turning | new_tree.diverging)  # stop doubling
 
-        # The divergence is checked by the second half tree (the first half is already checked).
-        diverging = other_half_tree.diverging
+                tree_depth += 1
 
-        return _TreeInfo(z_left, r_left, z_left_grads, z_right, r_right, z_right_grads, z_proposal,
-                         z_proposal_pe, z_proposal_grads, r_sum, tree_weight, turning, diverging,
-                         sum_accept_probs, num_proposals)
+                if self.use_multinomial_sampling:
+                    new_tree_prob = (new_tree.weight - tree_weight).exp()
+                else:
+                    new_tree_prob = new_tree.weight / tree_weight
+                rand = pyro.sample("rand_t={}_treedepth={}".format(self._t, tree_depth),
+                                   dist.Uniform(new_tree_prob.new_zeros(self._num_chains),
+                                                new_tree_prob.new_ones(self._num_chains)))
+                accept = active & (rand < new_tree_prob)
+                accepted = accepted | accept
+                z = _batched_where(accept, new_tree.z_proposal, z)
+                potential_energy = torch.where(accept, new_tree.z_proposal_pe, potential_energy)
+                z_grads = _batched_where(accept, new_tree.z_proposal_grads, z_grads)
+
+                r_sum = torch.where(active.unsqueeze(-1), r_sum + new_tree.r_sum, r_sum)
+                active = active & ~self._is_chain_turning(r_left, r_right, r_sum)  # stop doubling
+                # update tree_weight
+                if self.use_multinomial_sampling:
+                    new_tree_weight = logsumexp(torch.stack([tree_weight, new_tree.weight]), dim=0)
+                else:
+                    new_tree_weight = tree_weight + new_tree.weight
+                tree_weight = torch.where(active, new_tree_weight, tree_weight)
 
-    def sample(self, trace):
+        self._cache(z, potential_energy, z_grads)
+        if self._t < self._warmup_steps:
+            accept_prob = sum_accept_probs / num_proposals
+            self._adapt_chains(z, accept_prob)
+
+        self._accept_cnt = self._accept_cnt + accepted.long()
+
+        self._t += 1
+        return z
+
+    def _reset(self):
+        super(NUTS, self)._reset()
+        self._r_ckpts = None
+        self._r_sum_ckpts = None
+
+    def _sample_z(self):
         z, potential_energy, z_grads = self._fetch_from_cache()
-        r, r_flat = self._sample_r(name="r_t={}".format(self._t))
+        if self._r_ckpts is None:
+            # checkpoints of momenta and their partial sums used by `_build_tree`
+            self._r_ckpts = z.new_empty((self._max_tree_depth,) + z.shape)
+            self._r_sum_ckpts = z.new_empty((self._max_tree_depth,) + z.shape)
+        r = self._sample_r(name="r_t={}".format(self._t))
         energy_current = self._kinetic_energy(r) + potential_energy
 
         # Ideally, following a symplectic integrator trajectory, the energy is constant.
@@ -302,7 +457,7 @@ class NUTS(HMC):
         r_left = r_right = r
         z_left_grads = z_right_grads = z_grads
         accepted = False
-        r_sum = r_flat
+        r_sum = r
         sum_accept_probs = 0.
         num_proposals = 0
         if self.use_multinomial_sampling:
@@ -370,8 +525,26 @@ class NUTS(HMC):
             self._accept_cnt += 1
 
         self._t += 1
-        # get trace with the constrained values for `z`.
-        z = z.copy()
-        for name, transform in self.transforms.items():
-            z[name] = transform.inv(z[name])
-        return self._get_trace(z)
+        return z
+
+
+def _leaf_idx_to_ckpt_idxs(n):
+    """
+    Returns the range of checkpoint indices to check the turning condition of
+    the subtrees ending at leaf ``n`` (for odd ``n``); the checkpoint of leaf
+    ``n`` is stored at the upper end of this range (for even ``n``).
+    """
+    # number of non-zero bits except the last bit, e.g. 6 -> 2, 7 -> 2, 13 -> 2
+    idx_max = bin(n >> 1).count("1")
+    # number of contiguous trailing non-zero bits, e.g. 6 -> 0, 7 -> 3, 13 -> 1
+    num_subtrees = (n ^ (n + 1)).bit_length() - 1
+    idx_min = idx_max - num_subtrees + 1
+    return idx_min, idx_max
+
+
+def _select_chain_tree(cond, x, y):
+    """
+    Selects the fields of tree `x` for chains where `cond` is true, and those
+    of tree `y` otherwise.
+    """
+    return _TreeInfo(*(_batched_where(cond, x_field, y_field) for x_field, y_field in zip(x, y)))
@@ -25,6 +25,29 @@ class TraceKernel(object):
         """
         pass
 
+    def vectorize_chains(self, num_chains):
+        """
+        Optional method to run ``num_chains`` chains in lockstep in a single
+        process. This is called before :meth:`setup`, and lasts until
+        :meth:`cleanup`. Meanwhile, the model is run inside an outermost
+        :func:`pyro.plate` named :data:`~pyro.infer.mcmc.util.CHAIN_PLATE`,
+        and the traces taken and returned by :meth:`sample` hold the values
+        of all chains, batched along that plate. Kernels supporting this must
+        also implement ``sample_values``, which returns the latent values of
+        all chains stacked along the leftmost dimension.
+
+        :param int num_chains: Number of chains to run.
+        """
+        raise NotImplementedError("{} does not support vectorized chains.".format(type(self).__name__))
+
+    def _get_replay_model(self, *args, **kwargs):
+        """
+        Returns the model as run by the kernel, against which the traces of
+        samples are rebuilt from their latent values, for kernels implementing
+        ``sample_values``.
+        """
+        return self.model
+
     def diagnostics(self):
         """
         Relevant diagnostics (optional) to be printed at regular intervals
@@ -5,10 +5,54 @@ from opt_einsum import shared_intermediates
 
 from pyro.distributions.util import broadcast_shape, logsumexp
 from pyro.infer.util import is_validation_enabled
-from pyro.ops.contract import contract_to_tensor
+from pyro.ops.contract import ContractionPlanCache, contract_to_tensor
 from pyro.poutine.subsample_messenger import _Subsample
 from pyro.util import check_site_shape
 
+# Name of the outermost plate along which chains are batched when running
+# vectorized chains, see :meth:`~pyro.infer.mcmc.trace_kernel.TraceKernel.vectorize_chains`.
+CHAIN_PLATE = "num_chains_vectorized"
+
+
+class FlatLayout(object):
+    """
+    Layout of a dict of tensors packed into a single flat vector, which holds
+    the elements of each site contiguously, with sites ordered by name. The
+    offsets of the sites are computed once, so that a flat vector can be cheaply
+    unpacked into views of its site tensors.
+
+    :param dict shapes: dict mapping site names to the shapes of their values.
+    :param tuple batch_shape: leftmost batch shape shared by all sites (e.g.
+        that of vectorized chains), which is kept in the flat representation.
+    """
+    def __init__(self, shapes, batch_shape=()):
+        self.batch_shape = torch.Size(batch_shape)
+        batch_numel = self.batch_shape.numel()
+        self.shapes = OrderedDict(sorted(shapes.items()))
+        self.slices = OrderedDict()
+        pos = 0
+        for name, shape in self.shapes.items():
+            next_pos = pos + torch.Size(shape).numel() // batch_numel
+            self.slices[name] = slice(pos, next_pos)
+            pos = next_pos
+        self.size = pos
+
+    def pack(self, values):
+        """
+        :param dict values: dict mapping site names to their values.
+        :return: flat tensor of shape ``batch_shape + (size,)``.
+        :rtype: torch.Tensor
+        """
+        return torch.cat([values[name].reshape(self.batch_shape + (-1,)) for name in self.shapes], dim=-1)
+
+    def unpack(self, flat):
+        """
+        :param torch.Tensor flat: flat tensor of shape ``batch_shape + (size,)``.
+        :return: dict mapping site names to views of their values in ``flat``.
+        :rtype: dict
+        """
+        return {name: flat[..., self.slices[name]].reshape(shape) for name, shape in self.shapes.items()}
+
 
 class TraceTreeEvaluator(object):
     """
@@ -147,16 +191,23 @@ class TraceEinsumEvaluator(object):
         discrete enumerable sites.
     :param int max_plate_nesting: Optional bound on max number of nested
         :func:`pyro.plate` contexts.
+    :param str chain_plate: Optional name of an outermost :func:`pyro.plate`
+        along which independent MCMC chains are batched. If specified, a
+        separate log pdf is computed for each chain.
     """
     def __init__(self,
                  model_trace,
                  has_enumerable_sites=False,
-                 max_plate_nesting=None):
+                 max_plate_nesting=None,
+                 chain_plate=None):
         self.has_enumerable_sites = has_enumerable_sites
         self.max_plate_nesting = max_plate_nesting
+        self.chain_plate = chain_plate
         # To be populated using the model trace once.
         self._enum_dims = set()
+        self._target_ordinal = frozenset()
         self.ordering = {}
+        self.plan_cache = ContractionPlanCache()
         self._populate_cache(model_trace)
 
     def _populate_cache(self, model_trace):
@@ -179,6 +230,8 @@ class TraceEinsumEvaluator(object):
                                                 for f in site["cond_indep_stack"]
                                                 if f.vectorized)
         self._enum_dims = set(model_trace.symbol_to_dim) - set(model_trace.plate_to_symbol.values())
+        if self.chain_plate is not None:
+            self._target_ordinal = frozenset([model_trace.plate_to_symbol[self.chain_plate]])
 
     def _get_log_factors(self, model_trace):
         """
@@ -201,10 +254,30 @@ class TraceEinsumEvaluator(object):
         Returns the log pdf of `model_trace` by appropriately handling
         enumerated log prob factors.
 
-        :return: log pdf of the trace.
+        :return: log pdf of the trace, or a tensor of log pdfs of each chain
+            if ``chain_plate`` is specified.
         """
         if not self.has_enumerable_sites:
-            return model_trace.log_prob_sum()
+            if self.chain_plate is None:
+                return model_trace.log_prob_sum()
+            return self._chain_log_prob_sum(model_trace)
         log_probs = self._get_log_factors(model_trace)
         with shared_intermediates() as cache:
-            return contract_to_tensor(log_probs, self._enum_dims, cache=cache)
+            return contract_to_tensor(log_probs, self._enum_dims,
+                                      target_ordinal=self._target_ordinal, cache=cache,
+                                      plan_cache=self.plan_cache)
+
+    def _chain_log_prob_sum(self, model_trace):
+        """
+        Sums the `log_prob` terms of a trace without enumerated sites over all
+        dims except that of ``chain_plate``.
+        """
+        model_trace.compute_log_prob()
+        log_prob = 0.
+        for site in model_trace.nodes.values():
+            if site["type"] == "sample" and not isinstance(site["fn"], _Subsample):
+                chain_dim = next(f.dim for f in site["cond_indep_stack"] if f.name == self.chain_plate)
+                site_log_prob = site["log_prob"]
+                batch_shape = site_log_prob.shape[:site_log_prob.dim() + chain_dim + 1]
+                log_prob = log_prob + site_log_prob.reshape(batch_shape + (-1,)).sum(-1)
+        return log_prob
@@ -7,8 +7,7 @@ import torch
 
 from pyro.distributions.util import is_identically_zero
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace
-from pyro.infer.util import is_validation_enabled, torch_item
+from pyro.infer.util import is_validation_enabled, torch_item, torch_sum
 from pyro.util import check_if_enumerated, warn_if_nan
 
 
@@ -40,6 +39,9 @@ class RenyiELBO(ELBO):
         misuse of enumeration, i.e. that
         :class:`~pyro.infer.traceenum_elbo.TraceEnum_ELBO` is used iff there
         are enumerated sample sites.
+    :param bool fuse_particles: Whether to sum the terms of all sample sites
+        in the autograd graph and extract the ELBO as a scalar only once per
+        step, see :class:`~pyro.infer.elbo.ELBO`.
 
     References:
 
@@ -56,7 +58,8 @@ class RenyiELBO(ELBO):
                  max_plate_nesting=float('inf'),
                  max_iarange_nesting=None,  # DEPRECATED
                  vectorize_particles=False,
-                 strict_enumeration_warning=True):
+                 strict_enumeration_warning=True,
+                 fuse_particles=False):
         if max_iarange_nesting is not None:
             warnings.warn("max_iarange_nesting is deprecated; use max_plate_nesting instead",
                           DeprecationWarning)
@@ -69,15 +72,16 @@ class RenyiELBO(ELBO):
         super(RenyiELBO, self).__init__(num_particles=num_particles,
                                         max_plate_nesting=max_plate_nesting,
                                         vectorize_particles=vectorize_particles,
-                                        strict_enumeration_warning=strict_enumeration_warning)
+                                        strict_enumeration_warning=strict_enumeration_warning,
+                                        fuse_particles=fuse_particles)
 
     def _get_trace(self, model, guide, *args, **kwargs):
         """
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_plate_nesting, model, guide, *args, **kwargs)
+        model_trace, guide_trace = self._get_importance_trace(
+            "flat", model, guide, *args, **kwargs)
         if is_validation_enabled():
             check_if_enumerated(guide_trace)
         return model_trace, guide_trace
@@ -94,32 +98,44 @@ class RenyiELBO(ELBO):
 
         # grab a vectorized trace from the generator
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = 0.
+            elbo_terms = []
 
             # compute elbo
             for name, site in model_trace.nodes.items():
                 if site["type"] == "sample":
                     if is_vectorized:
                         log_prob_sum = site["log_prob"].detach().reshape(self.num_particles, -1).sum(-1)
+                    elif self.fuse_particles:
+                        log_prob_sum = site["log_prob_sum"].detach()
                     else:
                         log_prob_sum = torch_item(site["log_prob_sum"])
 
-                    elbo_particle = elbo_particle + log_prob_sum
+                    elbo_terms.append(log_prob_sum)
 
             for name, site in guide_trace.nodes.items():
                 if site["type"] == "sample":
                     log_prob, score_function_term, entropy_term = site["score_parts"]
                     if is_vectorized:
                         log_prob_sum = log_prob.detach().reshape(self.num_particles, -1).sum(-1)
+                    elif self.fuse_particles:
+                        log_prob_sum = site["log_prob_sum"].detach()
                     else:
                         log_prob_sum = torch_item(site["log_prob_sum"])
 
-                    elbo_particle = elbo_particle - log_prob_sum
+                    elbo_terms.append(-log_prob_sum)
 
-            elbo_particles.append(elbo_particle)
+            elbo_particles.append(torch_sum(elbo_terms))
 
         if is_vectorized:
             elbo_particles = elbo_particles[0]
+        elif self.fuse_particles:
+            # particles without sample sites sum to the number 0
+            tensor_holder = next((e for e in elbo_particles if torch.is_tensor(e)), None)
+            if tensor_holder is None:
+                elbo_particles = torch.zeros(len(elbo_particles))
+            else:
+                elbo_particles = torch.stack([e if torch.is_tensor(e) else tensor_holder.new_zeros(())
+                                              for e in elbo_particles])
         else:
             elbo_particles = torch.tensor(elbo_particles)  # no need to use .new*() here
 
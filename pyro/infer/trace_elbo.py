@@ -2,18 +2,20 @@ from __future__ import absolute_import, division, print_function
 
 import weakref
 
+import torch
+
 import pyro
 import pyro.ops.jit
 from pyro.distributions.util import is_identically_zero
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace
-from pyro.infer.util import MultiFrameTensor, get_plate_stacks, is_validation_enabled, torch_item
+from pyro.infer.util import MultiFrameTensor, get_plate_stacks, is_validation_enabled, torch_item, torch_sum
 from pyro.util import check_if_enumerated, warn_if_nan
 
 
-def _compute_log_r(model_trace, guide_trace):
+def _compute_log_r(model_trace, guide_trace, stacks=None):
     log_r = MultiFrameTensor()
-    stacks = get_plate_stacks(model_trace)
+    if stacks is None:
+        stacks = get_plate_stacks(model_trace)
     for name, model_site in model_trace.nodes.items():
         if model_site["type"] == "sample":
             log_r_term = model_site["log_prob"]
@@ -48,8 +50,8 @@ class Trace_ELBO(ELBO):
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_plate_nesting, model, guide, *args, **kwargs)
+        model_trace, guide_trace = self._get_importance_trace(
+            "flat", model, guide, *args, **kwargs)
         if is_validation_enabled():
             check_if_enumerated(guide_trace)
         return model_trace, guide_trace
@@ -61,6 +63,14 @@ class Trace_ELBO(ELBO):
 
         Evaluates the ELBO with an estimator that uses num_particles many samples/particles.
         """
+        if self.fuse_particles:
+            elbo_terms = []
+            for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
+                elbo_terms.extend(self._elbo_terms_particle(model_trace, guide_trace))
+            loss = -torch_item(torch_sum(elbo_terms)) / self.num_particles
+            warn_if_nan(loss, "loss")
+            return loss
+
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
             elbo_particle = torch_item(model_trace.log_prob_sum()) - torch_item(guide_trace.log_prob_sum())
@@ -71,38 +81,90 @@ class Trace_ELBO(ELBO):
         return loss
 
     def _differentiable_loss_particle(self, model_trace, guide_trace):
-        elbo_particle = 0
-        surrogate_elbo_particle = 0
+        elbo_terms, surrogate_elbo_terms = self._loss_terms_particle(model_trace, guide_trace)
+        elbo_particle = torch_sum(elbo_terms)
+        loss = -(elbo_particle.detach() if torch._C._get_tracing_state() else torch_item(elbo_particle))
+        surrogate_loss = -torch_sum(surrogate_elbo_terms)
+        return loss, surrogate_loss
+
+    def _elbo_terms_particle(self, model_trace, guide_trace):
+        """
+        Returns the list of (tensor) terms of the elbo of a particle, without
+        the surrogate elbo, which are summed by :meth:`loss` for
+        ``fuse_particles=True``.
+        """
+        elbo_terms = [site["log_prob_sum"] for site in model_trace.nodes.values() if site["type"] == "sample"]
+        elbo_terms.extend(-site["log_prob_sum"] for site in guide_trace.nodes.values() if site["type"] == "sample")
+        return elbo_terms
+
+    def _loss_terms_particle(self, model_trace, guide_trace):
+        """
+        Returns the lists of (tensor) terms of the elbo and surrogate elbo of
+        a particle, which are summed per particle by
+        :meth:`_differentiable_loss_particle`, or across all particles by
+        :meth:`_fused_loss_and_surrogate_loss`.
+        """
+        elbo_terms = []
+        surrogate_elbo_terms = []
         log_r = None
 
-        # compute elbo and surrogate elbo
         for name, site in model_trace.nodes.items():
             if site["type"] == "sample":
-                elbo_particle = elbo_particle + torch_item(site["log_prob_sum"])
-                surrogate_elbo_particle = surrogate_elbo_particle + site["log_prob_sum"]
+                elbo_terms.append(site["log_prob_sum"])
+                surrogate_elbo_terms.append(site["log_prob_sum"])
 
         for name, site in guide_trace.nodes.items():
             if site["type"] == "sample":
                 log_prob, score_function_term, entropy_term = site["score_parts"]
 
-                elbo_particle = elbo_particle - torch_item(site["log_prob_sum"])
+                elbo_terms.append(-site["log_prob_sum"])
 
                 if not is_identically_zero(entropy_term):
-                    surrogate_elbo_particle = surrogate_elbo_particle - entropy_term.sum()
+                    surrogate_elbo_terms.append(-entropy_term.sum())
 
                 if not is_identically_zero(score_function_term):
                     if log_r is None:
-                        log_r = _compute_log_r(model_trace, guide_trace)
+                        log_r = _compute_log_r(model_trace, guide_trace, self._get_plate_stacks(model_trace))
                     site = log_r.sum_to(site["cond_indep_stack"])
-                    surrogate_elbo_particle = surrogate_elbo_particle + (site * score_function_term).sum()
+                    surrogate_elbo_terms.append((site * score_function_term).sum())
 
-        return -elbo_particle, -surrogate_elbo_particle
+        return elbo_terms, surrogate_elbo_terms
+
+    def _fused_loss_and_surrogate_loss(self, model, guide, *args, **kwargs):
+        """
+        Computes the loss and surrogate loss over all particles with one stacked
+        reduction each, for ``fuse_particles=True``.
+
+        :returns: a tuple of the (detached) loss, the surrogate loss, and whether
+            the model or guide have any trainable params.
+        """
+        elbo_terms = []
+        surrogate_elbo_terms = []
+        trainable_params = False
+        for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
+            particle_elbo_terms, particle_surrogate_elbo_terms = self._loss_terms_particle(model_trace, guide_trace)
+            elbo_terms.extend(particle_elbo_terms)
+            surrogate_elbo_terms.extend(particle_surrogate_elbo_terms)
+            trainable_params = trainable_params or any(site["type"] == "param"
+                                                       for trace in (model_trace, guide_trace)
+                                                       for site in trace.nodes.values())
+
+        loss = -torch_sum(elbo_terms) / self.num_particles
+        if torch.is_tensor(loss):
+            loss = loss.detach()
+        surrogate_loss = -torch_sum(surrogate_elbo_terms) / self.num_particles
+        return loss, surrogate_loss, trainable_params
 
     def differentiable_loss(self, model, guide, *args, **kwargs):
         """
         Computes the surrogate loss that can be differentiated with autograd
         to produce gradient estimates for the model and guide parameters
         """
+        if self.fuse_particles:
+            loss, surrogate_loss, _ = self._fused_loss_and_surrogate_loss(model, guide, *args, **kwargs)
+            warn_if_nan(surrogate_loss, "loss")
+            return loss + (surrogate_loss - surrogate_loss.detach())
+
         loss = 0.
         surrogate_loss = 0.
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
@@ -120,6 +182,15 @@ class Trace_ELBO(ELBO):
         Computes the ELBO as well as the surrogate ELBO that is used to form the gradient estimator.
         Performs backward on the latter. Num_particle many samples are used to form the estimators.
         """
+        if self.fuse_particles:
+            loss, surrogate_loss, trainable_params = self._fused_loss_and_surrogate_loss(
+                model, guide, *args, **kwargs)
+            if trainable_params and getattr(surrogate_loss, 'requires_grad', False):
+                surrogate_loss.backward(retain_graph=self.retain_graph)
+            loss = torch_item(loss)
+            warn_if_nan(loss, "loss")
+            return loss
+
         loss = 0.0
         # grab a trace from the generator
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
@@ -168,33 +239,10 @@ class JitTrace_ELBO(Trace_ELBO):
                 loss = 0.0
                 surrogate_loss = 0.0
                 for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-                    elbo_particle = 0
-                    surrogate_elbo_particle = 0
-                    log_r = None
-
-                    # compute elbo and surrogate elbo
-                    for name, site in model_trace.nodes.items():
-                        if site["type"] == "sample":
-                            elbo_particle = elbo_particle + site["log_prob_sum"]
-                            surrogate_elbo_particle = surrogate_elbo_particle + site["log_prob_sum"]
-
-                    for name, site in guide_trace.nodes.items():
-                        if site["type"] == "sample":
-                            log_prob, score_function_term, entropy_term = site["score_parts"]
-
-                            elbo_particle = elbo_particle - site["log_prob_sum"]
-
-                            if not is_identically_zero(entropy_term):
-                                surrogate_elbo_particle = surrogate_elbo_particle - entropy_term.sum()
-
-                            if not is_identically_zero(score_function_term):
-                                if log_r is None:
-                                    log_r = _compute_log_r(model_trace, guide_trace)
-                                site = log_r.sum_to(site["cond_indep_stack"])
-                                surrogate_elbo_particle = surrogate_elbo_particle + (site * score_function_term).sum()
-
-                    loss = loss - elbo_particle / self.num_particles
-                    surrogate_loss = surrogate_loss - surrogate_elbo_particle / self.num_particles
+                    loss_particle, surrogate_loss_particle = self._differentiable_loss_particle(model_trace,
+                                                                                                guide_trace)
+                    loss = loss + loss_particle / self.num_particles
+                    surrogate_loss = surrogate_loss + surrogate_loss_particle / self.num_particles
 
                 return loss, surrogate_loss
 
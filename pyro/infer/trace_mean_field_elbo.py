@@ -9,7 +9,7 @@ from torch.distributions import kl_divergence
 import pyro.ops.jit
 from pyro.distributions.util import is_identically_zero, scale_and_mask
 from pyro.infer.trace_elbo import Trace_ELBO
-from pyro.infer.util import is_validation_enabled, torch_item
+from pyro.infer.util import is_validation_enabled, torch_item, torch_sum
 from pyro.util import warn_if_nan
 
 
@@ -84,6 +84,9 @@ class TraceMeanField_ELBO(Trace_ELBO):
 
         Evaluates the ELBO with an estimator that uses num_particles many samples/particles.
         """
+        if self.fuse_particles:
+            return super(TraceMeanField_ELBO, self).loss(model, guide, *args, **kwargs)
+
         loss = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
             loss_particle, _ = self._differentiable_loss_particle(model_trace, guide_trace)
@@ -93,12 +96,22 @@ class TraceMeanField_ELBO(Trace_ELBO):
         return loss
 
     def _differentiable_loss_particle(self, model_trace, guide_trace):
-        elbo_particle = 0
+        elbo_particle = torch_sum(self._loss_terms_particle(model_trace, guide_trace)[0])
+        loss = -(elbo_particle.detach() if torch._C._get_tracing_state() else torch_item(elbo_particle))
+        surrogate_loss = -elbo_particle
+        return loss, surrogate_loss
+
+    def _elbo_terms_particle(self, model_trace, guide_trace):
+        return self._loss_terms_particle(model_trace, guide_trace)[0]
+
+    def _loss_terms_particle(self, model_trace, guide_trace):
+        # The elbo is fully differentiable, so it is its own surrogate.
+        elbo_terms = []
 
         for name, model_site in model_trace.nodes.items():
             if model_site["type"] == "sample":
                 if model_site["is_observed"]:
-                    elbo_particle = elbo_particle + model_site["log_prob_sum"]
+                    elbo_terms.append(model_site["log_prob_sum"])
                 else:
                     guide_site = guide_trace.nodes[name]
                     if is_validation_enabled():
@@ -109,10 +122,10 @@ class TraceMeanField_ELBO(Trace_ELBO):
                         kl_qp = kl_divergence(guide_site["fn"], model_site["fn"])
                         kl_qp = scale_and_mask(kl_qp, scale=guide_site["scale"], mask=guide_site["mask"])
                         assert kl_qp.shape == guide_site["fn"].batch_shape
-                        elbo_particle = elbo_particle - kl_qp.sum()
+                        elbo_terms.append(-kl_qp.sum())
                     except NotImplementedError:
                         entropy_term = guide_site["score_parts"].entropy_term
-                        elbo_particle = elbo_particle + model_site["log_prob_sum"] - entropy_term.sum()
+                        elbo_terms.append(model_site["log_prob_sum"] - entropy_term.sum())
 
         # handle auxiliary sites in the guide
         for name, guide_site in guide_trace.nodes.items():
@@ -121,11 +134,9 @@ class TraceMeanField_ELBO(Trace_ELBO):
                 if is_validation_enabled():
                     _check_fully_reparametrized(guide_site)
                 entropy_term = guide_site["score_parts"].entropy_term
-                elbo_particle = elbo_particle - entropy_term.sum()
+                elbo_terms.append(-entropy_term.sum())
 
-        loss = -(elbo_particle.detach() if torch._C._get_tracing_state() else torch_item(elbo_particle))
-        surrogate_loss = -elbo_particle
-        return loss, surrogate_loss
+        return elbo_terms, elbo_terms
 
 
 class JitTraceMeanField_ELBO(TraceMeanField_ELBO):
@@ -14,10 +14,10 @@ import pyro.ops.jit
 import pyro.poutine as poutine
 from pyro.distributions.util import is_identically_zero
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace, iter_discrete_escape, iter_discrete_extend
+from pyro.infer.enum import SequentialEnumMessenger
 from pyro.infer.util import Dice, is_validation_enabled
 from pyro.ops import packed
-from pyro.ops.contract import contract_tensor_tree, contract_to_tensor
+from pyro.ops.contract import ContractionPlanCache, contract_tensor_tree, contract_to_tensor
 from pyro.poutine.enumerate_messenger import EnumerateMessenger
 from pyro.util import check_traceenum_requirements, ignore_jit_warnings, warn_if_nan
 
@@ -116,7 +116,7 @@ def _compute_model_factors(model_trace, guide_trace):
     return marginal_costs, log_factors, ordering, enum_dims, scale
 
 
-def _compute_dice_elbo(model_trace, guide_trace):
+def _compute_dice_elbo(model_trace, guide_trace, plan_cache=None):
     # Accumulate marginal model costs.
     marginal_costs, log_factors, ordering, sum_dims, scale = _compute_model_factors(
             model_trace, guide_trace)
@@ -130,7 +130,7 @@ def _compute_dice_elbo(model_trace, guide_trace):
         # replace contract_tensor_tree() with a RaggedTensor -> RaggedTensor contraction
         # that preserves some dependency structure.
         with shared_intermediates() as cache:
-            log_factors = contract_tensor_tree(log_factors, sum_dims, cache=cache)
+            log_factors = contract_tensor_tree(log_factors, sum_dims, cache=cache, plan_cache=plan_cache)
         for t, log_factors_t in log_factors.items():
             marginal_costs_t = marginal_costs.setdefault(t, [])
             for term in log_factors_t:
@@ -253,13 +253,23 @@ class TraceEnum_ELBO(ELBO):
     variables inside that :class:`~pyro.plate`.
     """
 
+    @property
+    def plan_cache(self):
+        """
+        A :class:`~pyro.ops.contract.ContractionPlanCache` of tensor
+        contraction plans that is reused across steps.
+        """
+        if getattr(self, '_plan_cache', None) is None:
+            self._plan_cache = ContractionPlanCache()
+        return self._plan_cache
+
     def _get_trace(self, model, guide, *args, **kwargs):
         """
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_plate_nesting, model, guide, *args, **kwargs)
+        model_trace, guide_trace = self._get_importance_trace(
+            "flat", model, guide, *args, **kwargs)
 
         if is_validation_enabled():
             check_traceenum_requirements(model_trace, guide_trace)
@@ -275,7 +285,10 @@ class TraceEnum_ELBO(ELBO):
                               'infer={"enumerate": "sequential"} or infer={"enumerate": "parallel"}? '
                               'If you do not want to enumerate, consider using Trace_ELBO instead.')
 
-        guide_trace.pack_tensors()
+        plate_to_symbol = None
+        if self._static_structure is not None:
+            plate_to_symbol = self._static_structure.plate_to_symbol
+        guide_trace.pack_tensors(plate_to_symbol)
         model_trace.pack_tensors(guide_trace.plate_to_symbol)
         return model_trace, guide_trace
 
@@ -298,12 +311,12 @@ class TraceEnum_ELBO(ELBO):
         guide = guide_enum(guide)
         model = model_enum(model)
 
+        # Enumerate sequential guide sites depth first, so that each guide
+        # execution yields a complete trace and sibling branches share a prefix.
         q = queue.LifoQueue()
-        guide = poutine.queue(guide, q,
-                              escape_fn=iter_discrete_escape,
-                              extend_fn=iter_discrete_extend)
+        guide = SequentialEnumMessenger(q)(guide)
         for i in range(1 if self.vectorize_particles else self.num_particles):
-            q.put(poutine.Trace())
+            q.put(None)
             while not q.empty():
                 yield self._get_trace(model, guide, *args, **kwargs)
 
@@ -316,7 +329,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = _compute_dice_elbo(model_trace, guide_trace, self.plan_cache)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -339,7 +352,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = _compute_dice_elbo(model_trace, guide_trace, self.plan_cache)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -363,7 +376,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = _compute_dice_elbo(model_trace, guide_trace, self.plan_cache)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -450,7 +463,7 @@ class JitTraceEnum_ELBO(TraceEnum_ELBO):
                 self = weakself()
                 elbo = 0.0
                 for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-                    elbo = elbo + _compute_dice_elbo(model_trace, guide_trace)
+                    elbo = elbo + _compute_dice_elbo(model_trace, guide_trace, self.plan_cache)
                 return elbo * (-1.0 / self.num_particles)
 
             self._differentiable_loss = differentiable_loss
@@ -3,14 +3,12 @@ from __future__ import absolute_import, division, print_function
 import weakref
 from operator import itemgetter
 
-import networkx
 import torch
 
 import pyro
 import pyro.ops.jit
 from pyro.distributions.util import is_identically_zero
 from pyro.infer import ELBO
-from pyro.infer.enum import get_importance_trace
 from pyro.infer.util import (MultiFrameTensor, detach_iterable, get_plate_stacks,
                              is_validation_enabled, torch_backward, torch_item)
 from pyro.util import check_if_enumerated, warn_if_nan
@@ -33,20 +31,21 @@ def _get_baseline_options(site):
 
 
 def _compute_downstream_costs(model_trace, guide_trace,  #
-                              non_reparam_nodes):
+                              non_reparam_nodes, stacks=None):
     # recursively compute downstream cost nodes for all sample sites in model and guide
     # (even though ultimately just need for non-reparameterizable sample sites)
     # 1. downstream costs used for rao-blackwellization
     # 2. model observe sites (as well as terms that arise from the model and guide having different
     # dependency structures) are taken care of via 'children_in_model' below
-    topo_sort_guide_nodes = list(reversed(list(networkx.topological_sort(guide_trace))))
+    topo_sort_guide_nodes = guide_trace.topological_sort(reverse=True)
     topo_sort_guide_nodes = [x for x in topo_sort_guide_nodes
                              if guide_trace.nodes[x]["type"] == "sample"]
     ordered_guide_nodes_dict = {n: i for i, n in enumerate(topo_sort_guide_nodes)}
 
     downstream_guide_cost_nodes = {}
     downstream_costs = {}
-    stacks = get_plate_stacks(model_trace)
+    if stacks is None:
+        stacks = get_plate_stacks(model_trace)
 
     for node in topo_sort_guide_nodes:
         downstream_costs[node] = MultiFrameTensor((stacks[node],
@@ -189,8 +188,8 @@ class TraceGraph_ELBO(ELBO):
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "dense", self.max_plate_nesting, model, guide, *args, **kwargs)
+        model_trace, guide_trace = self._get_importance_trace(
+            "dense", model, guide, *args, **kwargs)
         if is_validation_enabled():
             check_if_enumerated(guide_trace)
         return model_trace, guide_trace
@@ -234,7 +233,8 @@ class TraceGraph_ELBO(ELBO):
         # the following computations are only necessary if we have non-reparameterizable nodes
         baseline_loss = 0.0
         if non_reparam_nodes:
-            downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes)
+            downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes,
+                                                            self._get_plate_stacks(model_trace))
             surrogate_elbo_term, baseline_loss = _compute_elbo_non_reparam(guide_trace,
                                                                            non_reparam_nodes, downstream_costs)
             surrogate_elbo += surrogate_elbo_term
@@ -291,7 +291,8 @@ class JitTraceGraph_ELBO(TraceGraph_ELBO):
                     # the following computations are only necessary if we have non-reparameterizable nodes
                     baseline_loss = 0.0
                     if non_reparam_nodes:
-                        downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes)
+                        downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes,
+                                                                        self._get_plate_stacks(model_trace))
                         surrogate_elbo_term, baseline_loss = _compute_elbo_non_reparam(guide_trace,
                                                                                        non_reparam_nodes,
                                                                                        downstream_costs)
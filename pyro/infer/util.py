@@ -43,6 +43,20 @@ def torch_backward(x, retain_graph=None):
         x.backward(retain_graph=retain_graph)
 
 
+def torch_sum(terms):
+    """
+    Sums a list of tensors of the same shape with a single stacked reduction,
+    rather than one addition per term. Numbers among ``terms`` are also
+    accepted, and the result is a number if there are no tensors.
+    """
+    tensors = [term for term in terms if torch.is_tensor(term)]
+    total = sum(term for term in terms if not torch.is_tensor(term))
+    if not tensors:
+        return total
+    tensor_sum = torch.stack(tensors).sum(0) if len(tensors) > 1 else tensors[0]
+    return tensor_sum + total if total else tensor_sum
+
+
 def torch_exp(x):
     """
     Like ``x.exp()`` for a :class:`~torch.Tensor`, but also accepts
@@ -67,7 +81,11 @@ def zero_grads(tensors):
     """
     for p in tensors:
         if p.grad is not None:
-            p.grad = p.grad.new_zeros(p.shape)
+            if p.grad.requires_grad:
+                p.grad = p.grad.new_zeros(p.shape)
+            else:
+                # zero in place, so that gradients of flattened params remain views of their buffer
+                p.grad.zero_()
 
 
 def get_plate_stacks(trace):
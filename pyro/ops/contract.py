@@ -150,7 +150,162 @@ def _contract_component(ring, tensor_tree, sum_dims, target_dims):
     return ordinal, term
 
 
-def contract_tensor_tree(tensor_tree, sum_dims, cache=None, ring=None):
+class _PlanRecorder(object):
+    """
+    Proxy for a :class:`~pyro.ops.rings.Ring` that forwards ring operations
+    while recording them as a program over numbered terms. Terms are numbered
+    by order of creation, starting with the input terms.
+    """
+    def __init__(self, ring, terms):
+        self.ring = ring
+        self.program = []
+        self._terms = list(terms)  # keeps terms alive so that their ids are not recycled
+        self._slots = {}
+        for slot, term in enumerate(self._terms):
+            self._slots.setdefault(id(term), slot)
+
+    def slot(self, term):
+        return self._slots[id(term)]
+
+    def _record(self, name, inputs, args, outputs):
+        self.program.append((name, tuple(map(self.slot, inputs)), args, len(outputs)))
+        for term in outputs:
+            self._slots[id(term)] = len(self._terms)
+            self._terms.append(term)
+
+    def sumproduct(self, terms, dims):
+        dims = frozenset(dims)
+        term = self.ring.sumproduct(terms, dims)
+        self._record('sumproduct', terms, (dims,), (term,))
+        return term
+
+    def product(self, term, ordinal):
+        result = self.ring.product(term, ordinal)
+        self._record('product', (term,), (ordinal,), (result,))
+        return result
+
+    def broadcast(self, term, ordinal):
+        result = self.ring.broadcast(term, ordinal)
+        self._record('broadcast', (term,), (ordinal,), (result,))
+        return result
+
+    def global_local(self, term, dims, ordinal):
+        dims = frozenset(dims)
+        result = self.ring.global_local(term, dims, ordinal)
+        self._record('global_local', (term,), (dims, ordinal), result)
+        return result
+
+
+def _run_plan(ring, program, terms):
+    terms = list(terms)
+    for name, inputs, args, num_outputs in program:
+        inputs = [terms[slot] for slot in inputs]
+        if name == 'sumproduct':
+            result = ring.sumproduct(inputs, *args)
+        else:
+            result = getattr(ring, name)(inputs[0], *args)
+        if num_outputs == 1:
+            terms.append(result)
+        else:
+            terms.extend(result)
+    return terms
+
+
+class ContractionPlanCache(object):
+    """
+    Persistent cache of contraction plans for :func:`contract_tensor_tree` and
+    :func:`contract_to_tensor`.
+
+    A plan is the sequence of ring operations produced by partitioning terms
+    into connected components and eliminating dims plate by plate. Plans are
+    keyed by the symbolic signature of the inputs, i.e. the ordinals, packed
+    dims and shapes of all terms together with the sum, target dims and target
+    ordinal, so that repeated contractions of a static model skip planning and
+    only run tensor operations. Contraction paths of the underlying einsum
+    operations are memoized separately by
+    :func:`~pyro.ops.einsum.contract_expression`.
+
+    Plans of models with dynamic shapes are keyed anew at each contraction,
+    so the cache keeps only the ``max_size`` most recently used plans. Call
+    :meth:`clear` to free all plans.
+
+    :param int max_size: maximum number of plans to keep, evicting the least
+        recently used plan first. Set to ``None`` for an unbounded cache.
+        Defaults to 1024.
+    :ivar int hits: number of contractions that reused a cached plan.
+    :ivar int misses: number of contractions that recorded a new plan.
+    """
+    def __init__(self, max_size=1024):
+        if max_size is not None and max_size < 1:
+            raise ValueError("Expected max_size to be a positive int or None, but got {}.".format(max_size))
+        self.max_size = max_size
+        self._plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+    def clear(self):
+        """
+        Clears all plans and resets the hit and miss counters.
+        """
+        self._plans.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, fn, ring, tensor_tree, *args):
+        """
+        Runs ``fn(ring, tensor_tree, *args)`` using a cached plan if possible.
+        """
+        terms = [term for terms in tensor_tree.values() for term in terms]
+        ids = {}
+        signature = tuple((ordinal, tuple((term._pyro_dims, term.shape, ids.setdefault(id(term), len(ids)))
+                                          for term in terms_t))
+                          for ordinal, terms_t in tensor_tree.items())
+        key = (fn, type(ring), signature,
+               tuple(frozenset(arg) if isinstance(arg, set) else arg for arg in args))
+        if key in self._plans:
+            self.hits += 1
+            # mark the plan as most recently used
+            program, outputs = self._plans[key] = self._plans.pop(key)
+            results = _run_plan(ring, program, terms)
+            if isinstance(outputs, OrderedDict):
+                return OrderedDict((t, [results[slot] for slot in slots]) for t, slots in outputs.items())
+            return results[outputs]
+
+        self.misses += 1
+        recorder = _PlanRecorder(ring, terms)
+        result = fn(recorder, tensor_tree, *args)
+        if isinstance(result, OrderedDict):
+            outputs = OrderedDict((t, [recorder.slot(term) for term in terms_t]) for t, terms_t in result.items())
+        else:
+            outputs = recorder.slot(result)
+        self._plans[key] = recorder.program, outputs
+        if self.max_size is not None and len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+        return result
+
+
+def _contract_tensor_tree(ring, tensor_tree, sum_dims):
+    ordinals = {term: t for t, terms in tensor_tree.items() for term in terms}
+    all_terms = [term for terms in tensor_tree.values() for term in terms]
+    contracted_tree = OrderedDict()
+
+    # Split this tensor tree into connected components.
+    for terms, dims in _partition_terms(ring, all_terms, sum_dims):
+        component = OrderedDict()
+        for term in terms:
+            component.setdefault(ordinals[term], []).append(term)
+
+        # Contract this connected component down to a single tensor.
+        ordinal, term = _contract_component(ring, component, dims, set())
+        contracted_tree.setdefault(ordinal, []).append(term)
+
+    return contracted_tree
+
+
+def contract_tensor_tree(tensor_tree, sum_dims, cache=None, ring=None, plan_cache=None, memory_limit=None):
     """
     Contract out ``sum_dims`` in a tree of tensors via message passing.
     This partially contracts out plate dimensions.
@@ -166,6 +321,11 @@ def contract_tensor_tree(tensor_tree, sum_dims, cache=None, ring=None):
         cache.
     :param pyro.ops.rings.Ring ring: an optional algebraic ring defining tensor
         operations.
+    :param ContractionPlanCache plan_cache: an optional cache of contraction
+        plans to reuse across calls with the same symbolic signature.
+    :param int memory_limit: an optional bound on the number of elements of
+        intermediate tensors, used to construct the default ring. See
+        :class:`~pyro.ops.rings.Ring`.
     :returns: A contracted version of ``tensor_tree``
     :rtype: OrderedDict
     """
@@ -173,27 +333,48 @@ def contract_tensor_tree(tensor_tree, sum_dims, cache=None, ring=None):
     assert isinstance(sum_dims, set)
 
     if ring is None:
-        ring = LogRing(cache)
+        ring = LogRing(cache, memory_limit=memory_limit)
 
+    if plan_cache is not None:
+        return plan_cache(_contract_tensor_tree, ring, tensor_tree, sum_dims)
+    return _contract_tensor_tree(ring, tensor_tree, sum_dims)
+
+
+def _contract_to_tensor(ring, tensor_tree, sum_dims, target_ordinal, target_dims):
     ordinals = {term: t for t, terms in tensor_tree.items() for term in terms}
     all_terms = [term for terms in tensor_tree.values() for term in terms]
-    contracted_tree = OrderedDict()
+    contracted_terms = []
 
     # Split this tensor tree into connected components.
+    modulo_total = bool(target_dims)
     for terms, dims in _partition_terms(ring, all_terms, sum_dims):
+        if modulo_total and dims.isdisjoint(target_dims):
+            continue
         component = OrderedDict()
         for term in terms:
             component.setdefault(ordinals[term], []).append(term)
 
         # Contract this connected component down to a single tensor.
-        ordinal, term = _contract_component(ring, component, dims, set())
-        contracted_tree.setdefault(ordinal, []).append(term)
+        ordinal, term = _contract_component(ring, component, dims, target_dims & dims)
+        _check_plates_are_sensible(target_dims.intersection(term._pyro_dims),
+                                   ordinal - target_ordinal)
 
-    return contracted_tree
+        # Eliminate extra plate dims via product contractions.
+        contract_frames = ordinal - target_ordinal
+        if contract_frames:
+            assert not sum_dims.intersection(term._pyro_dims)
+            term = ring.product(term, contract_frames)
+
+        contracted_terms.append(term)
+
+    # Combine contracted tensors via product, then broadcast.
+    term = ring.sumproduct(contracted_terms, set())
+    assert sum_dims.intersection(term._pyro_dims) <= target_dims
+    return ring.broadcast(term, target_ordinal)
 
 
 def contract_to_tensor(tensor_tree, sum_dims, target_ordinal=None, target_dims=None,
-                       cache=None, ring=None):
+                       cache=None, ring=None, plan_cache=None, memory_limit=None):
     """
     Contract out ``sum_dims`` in a tree of tensors, via message
     passing. This reduces all terms down to a single tensor in the plate
@@ -215,6 +396,11 @@ def contract_to_tensor(tensor_tree, sum_dims, target_ordinal=None, target_dims=N
         cache.
     :param pyro.ops.rings.Ring ring: an optional algebraic ring defining tensor
         operations.
+    :param ContractionPlanCache plan_cache: an optional cache of contraction
+        plans to reuse across calls with the same symbolic signature.
+    :param int memory_limit: an optional bound on the number of elements of
+        intermediate tensors, used to construct the default ring. See
+        :class:`~pyro.ops.rings.Ring`.
     :returns: a single tensor
     :rtype: torch.Tensor
     """
@@ -227,38 +413,11 @@ def contract_to_tensor(tensor_tree, sum_dims, target_ordinal=None, target_dims=N
     assert isinstance(target_ordinal, frozenset)
     assert isinstance(target_dims, set) and target_dims <= sum_dims
     if ring is None:
-        ring = LogRing(cache)
-
-    ordinals = {term: t for t, terms in tensor_tree.items() for term in terms}
-    all_terms = [term for terms in tensor_tree.values() for term in terms]
-    contracted_terms = []
-
-    # Split this tensor tree into connected components.
-    modulo_total = bool(target_dims)
-    for terms, dims in _partition_terms(ring, all_terms, sum_dims):
-        if modulo_total and dims.isdisjoint(target_dims):
-            continue
-        component = OrderedDict()
-        for term in terms:
-            component.setdefault(ordinals[term], []).append(term)
-
-        # Contract this connected component down to a single tensor.
-        ordinal, term = _contract_component(ring, component, dims, target_dims & dims)
-        _check_plates_are_sensible(target_dims.intersection(term._pyro_dims),
-                                   ordinal - target_ordinal)
-
-        # Eliminate extra plate dims via product contractions.
-        contract_frames = ordinal - target_ordinal
-        if contract_frames:
-            assert not sum_dims.intersection(term._pyro_dims)
-            term = ring.product(term, contract_frames)
-
-        contracted_terms.append(term)
+        ring = LogRing(cache, memory_limit=memory_limit)
 
-    # Combine contracted tensors via product, then broadcast.
-    term = ring.sumproduct(contracted_terms, set())
-    assert sum_dims.intersection(term._pyro_dims) <= target_dims
-    return ring.broadcast(term, target_ordinal)
+    if plan_cache is not None:
+        return plan_cache(_contract_to_tensor, ring, tensor_tree, sum_dims, target_ordinal, target_dims)
+    return _contract_to_tensor(ring, tensor_tree, sum_dims, target_ordinal, target_dims)
 
 
 def einsum(equation, *operands, **kwargs):
@@ -330,6 +489,10 @@ def einsum(equation, *operands, **kwargs):
     :param str backend: An optional einsum backend, defaults to 'torch'.
     :param dict cache: An optional :func:`~opt_einsum.shared_intermediates`
         cache.
+    :param int memory_limit: An optional bound on the number of elements of
+        intermediate tensors. This is passed to the path search of opt_einsum,
+        and if no path satisfies the bound, contractions are sliced along their
+        largest sum dims (except for backends that record backward passes).
     :param bool modulo_total: Optionally allow einsum to arbitrarily scale
         each result plate, which can significantly reduce computation. This is
         safe to set whenever each result plate denotes a nonnormalized
@@ -346,6 +509,7 @@ def einsum(equation, *operands, **kwargs):
     plates = kwargs.pop('plates', '')
     backend = kwargs.pop('backend', 'torch')
     modulo_total = kwargs.pop('modulo_total', False)
+    memory_limit = kwargs.pop('memory_limit', None)
     try:
         Ring = BACKEND_TO_RING[backend]
     except KeyError:
@@ -389,7 +553,7 @@ def einsum(equation, *operands, **kwargs):
     # Compute outputs, sharing intermediate computations.
     results = []
     with shared_intermediates(cache) as cache:
-        ring = Ring(cache, dim_to_size=dim_to_size)
+        ring = Ring(cache, dim_to_size=dim_to_size, memory_limit=memory_limit)
         for output in outputs:
             sum_dims = set(output).union(*inputs) - set(plates)
             term = contract_to_tensor(tensor_tree, sum_dims,
@@ -5,6 +5,16 @@ import opt_einsum
 from pyro.util import ignore_jit_warnings
 
 _PATH_CACHE = {}
+_INTERMEDIATE_CACHE = {}
+
+
+class _Shape(object):
+    """
+    Stand-in for an operand of shape ``shape``, to search contraction paths
+    without allocating tensors.
+    """
+    def __init__(self, shape):
+        self.shape = shape
 
 
 def contract_expression(equation, *shapes, **kwargs):
@@ -29,6 +39,23 @@ def contract_expression(equation, *shapes, **kwargs):
     return expr
 
 
+def largest_intermediate(equation, *shapes, **kwargs):
+    """
+    Computes the number of elements of the largest intermediate tensor created
+    by contracting operands of given ``shapes`` along the path found by
+    :func:`opt_einsum.contract_path`. Results are cached.
+
+    :param int memory_limit: an optional bound on the number of elements of
+        intermediates to respect in the path search.
+    :rtype: int
+    """
+    key = equation, shapes, tuple(kwargs.items())
+    if key not in _INTERMEDIATE_CACHE:
+        _, info = opt_einsum.contract_path(equation, *map(_Shape, shapes), **kwargs)
+        _INTERMEDIATE_CACHE[key] = int(info.largest_intermediate)
+    return _INTERMEDIATE_CACHE[key]
+
+
 def contract(equation, *operands, **kwargs):
     """
     Wrapper around :func:`opt_einsum.contract` that optionally uses Pyro's
@@ -36,13 +63,15 @@ def contract(equation, *operands, **kwargs):
 
     :param bool cache_path: whether to cache the contraction path.
         Defaults to True.
+    :param int memory_limit: an optional bound on the number of elements of
+        intermediates, passed to the path search of opt_einsum.
     """
     backend = kwargs.pop('backend', 'numpy')
     out = kwargs.pop('out', None)
     shapes = [tuple(t.shape) for t in operands]
     with ignore_jit_warnings():
-        expr = contract_expression(equation, *shapes)
+        expr = contract_expression(equation, *shapes, **kwargs)
         return expr(*operands, backend=backend, out=out)
 
 
-__all__ = ['contract', 'contract_expression']
+__all__ = ['contract', 'contract_expression', 'largest_intermediate']
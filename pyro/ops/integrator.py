@@ -9,7 +9,10 @@ def velocity_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, num_step
     Second order symplectic integrator that uses the velocity verlet algorithm.
 
     :param dict z: dictionary of sample site names and their current values
-        (type :class:`~torch.Tensor`).
+        (type :class:`~torch.Tensor`). Alternatively, a flat tensor holding the
+        values of all sites, in which case ``r``, ``z_grads`` and the returned
+        positions, momenta and gradients are flat tensors too, and
+        ``potential_fn`` takes a flat tensor.
     :param dict r: dictionary of sample site names and corresponding momenta
         (type :class:`~torch.Tensor`).
     :param callable potential_fn: function that returns potential energy given z
@@ -25,6 +28,11 @@ def velocity_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, num_step
     :return tuple (z_next, r_next, z_grads, potential_energy): next position and momenta,
         together with the potential energy and its gradient w.r.t. ``z_next``.
     """
+    if torch.is_tensor(z):
+        for _ in range(num_steps):
+            z, r, z_grads, potential_energy = _flat_single_step_verlet(z, r, potential_fn, inverse_mass_matrix,
+                                                                       step_size, z_grads)
+        return z, r, z_grads, potential_energy
     z_next = z.copy()
     r_next = r.copy()
     for _ in range(num_steps):
@@ -58,6 +66,36 @@ def _single_step_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, z_gr
     return z, r, z_grads, potential_energy
 
 
+def _flat_single_step_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, z_grads=None):
+    r"""
+    Single step velocity verlet on flat tensors `z`, `r`, which avoids packing
+    and unpacking the momenta of each sample site.
+    """
+
+    z_grads = _flat_potential_grad(potential_fn, z)[0] if z_grads is None else z_grads
+
+    r = r + 0.5 * step_size * (-z_grads)  # r(n+1/2)
+    z = z + step_size * _flat_kinetic_grad(inverse_mass_matrix, r)  # z(n+1)
+    z_grads, potential_energy = _flat_potential_grad(potential_fn, z)
+    r = r + 0.5 * step_size * (-z_grads)  # r(n+1)
+
+    return z, r, z_grads, potential_energy
+
+
+def _flat_potential_grad(potential_fn, z):
+    z = z.detach().requires_grad_(True)
+    potential_energy = potential_fn(z)
+    # for a batch of independent systems, gradients of the total are per-system gradients
+    z_grads, = grad(potential_energy.sum(), (z,))
+    return z_grads, potential_energy.detach()
+
+
+def _flat_kinetic_grad(inverse_mass_matrix, r):
+    if inverse_mass_matrix.dim() == r.dim():
+        return inverse_mass_matrix * r
+    return inverse_mass_matrix.matmul(r.unsqueeze(-1)).squeeze(-1)
+
+
 def _potential_grad(potential_fn, z):
     z_keys, z_nodes = zip(*z.items())
     for node in z_nodes:
@@ -87,3 +125,123 @@ def _kinetic_grad(inverse_mass_matrix, r):
         pos = next_pos
     assert pos == grads_flat.size(0)
     return grads
+
+
+def batched_velocity_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, num_steps=1, z_grads=None):
+    r"""
+    Batched version of :func:`velocity_verlet`, which simultaneously integrates
+    a batch of independent systems (e.g. MCMC chains) stacked along the leftmost
+    dimension of each tensor in ``z`` and ``r``.
+
+    :param dict z: dictionary of sample site names and their current values,
+        each of shape ``(num_chains,) + site_shape``. Alternatively, a flat tensor
+        of shape ``(num_chains, D)``, as for :func:`velocity_verlet`.
+    :param dict r: dictionary of sample site names and corresponding momenta,
+        with the same shapes as ``z``.
+    :param callable potential_fn: function that returns a tensor of shape
+        ``(num_chains,)`` holding the potential energy of each system given z.
+    :param torch.Tensor inverse_mass_matrix: a tensor of shape ``(num_chains, D)``
+        (diagonal matrices) or ``(num_chains, D, D)`` (dense matrices), where ``D``
+        is the total number of elements of a single system's momenta.
+    :param torch.Tensor step_size: step sizes of shape ``(num_chains,)``.
+    :param num_steps: number of discrete time steps over which to integrate.
+        If a tensor of shape ``(num_chains,)`` is given, each system is only
+        advanced by its own number of steps, which must be at least 1.
+    :type num_steps: int or torch.Tensor
+    :param dict z_grads: optional gradients of potential energy at current ``z``.
+    :return tuple (z_next, r_next, z_grads, potential_energy): next position and momenta,
+        together with the potential energy and its gradient w.r.t. ``z_next``.
+    """
+    if torch.is_tensor(z):
+        flat = True
+        z_next, r_next = z, r
+        single_step_verlet = _flat_single_step_verlet
+        step_size = step_size.unsqueeze(-1)
+    else:
+        flat = False
+        z_next, r_next = z.copy(), r.copy()
+        single_step_verlet = _batched_single_step_verlet
+    if isinstance(num_steps, torch.Tensor):
+        max_num_steps = int(num_steps.max())
+    else:
+        max_num_steps, num_steps = num_steps, None
+    potential_energy = None
+    for i in range(max_num_steps):
+        z_step, r_step, z_grads_step, potential_energy_step = single_step_verlet(
+            z_next if flat else z_next.copy(), r_next if flat else r_next.copy(),
+            potential_fn, inverse_mass_matrix, step_size, z_grads)
+        if num_steps is None or i == 0:
+            z_next, r_next, z_grads, potential_energy = z_step, r_step, z_grads_step, potential_energy_step
+        else:
+            # freeze systems that have already taken their number of steps
+            moving = i < num_steps
+            z_next = _batched_where(moving, z_step, z_next)
+            r_next = _batched_where(moving, r_step, r_next)
+            z_grads = _batched_where(moving, z_grads_step, z_grads)
+            potential_energy = torch.where(moving, potential_energy_step, potential_energy)
+    return z_next, r_next, z_grads, potential_energy
+
+
+def _batched_single_step_verlet(z, r, potential_fn, inverse_mass_matrix, step_size, z_grads=None):
+    r"""
+    Batched single step velocity verlet that modifies the `z`, `r` dicts in place.
+    """
+
+    z_grads = _batched_potential_grad(potential_fn, z)[0] if z_grads is None else z_grads
+
+    for site_name in r:
+        half_step = _batched_expand(0.5 * step_size, r[site_name])
+        r[site_name] = r[site_name] + half_step * (-z_grads[site_name])  # r(n+1/2)
+
+    r_grads = _batched_kinetic_grad(inverse_mass_matrix, r)
+    for site_name in z:
+        z[site_name] = z[site_name] + _batched_expand(step_size, z[site_name]) * r_grads[site_name]  # z(n+1)
+
+    z_grads, potential_energy = _batched_potential_grad(potential_fn, z)
+    for site_name in r:
+        half_step = _batched_expand(0.5 * step_size, r[site_name])
+        r[site_name] = r[site_name] + half_step * (-z_grads[site_name])  # r(n+1)
+
+    return z, r, z_grads, potential_energy
+
+
+def _batched_potential_grad(potential_fn, z):
+    z_keys, z_nodes = zip(*z.items())
+    for node in z_nodes:
+        node.requires_grad_(True)
+    potential_energy = potential_fn(z)
+    # systems are independent, so gradients of the total are per-system gradients
+    grads = grad(potential_energy.sum(), z_nodes)
+    for node in z_nodes:
+        node.requires_grad_(False)
+    return dict(zip(z_keys, grads)), potential_energy.detach()
+
+
+def _batched_kinetic_grad(inverse_mass_matrix, r):
+    batch_size = inverse_mass_matrix.size(0)
+    r_flat = torch.cat([r[site_name].reshape(batch_size, -1) for site_name in sorted(r)], dim=-1)
+    if inverse_mass_matrix.dim() == 2:
+        grads_flat = inverse_mass_matrix * r_flat
+    else:
+        grads_flat = inverse_mass_matrix.matmul(r_flat.unsqueeze(-1)).squeeze(-1)
+
+    # unpacking
+    grads = {}
+    pos = 0
+    for site_name in sorted(r):
+        next_pos = pos + r[site_name].numel() // batch_size
+        grads[site_name] = grads_flat[:, pos:next_pos].reshape(r[site_name].shape)
+        pos = next_pos
+    assert pos == grads_flat.size(-1)
+    return grads
+
+
+def _batched_expand(x, like):
+    return x.reshape(x.shape + (1,) * (like.dim() - x.dim()))
+
+
+def _batched_where(cond, x, y):
+    if torch.is_tensor(x):
+        return torch.where(_batched_expand(cond, x), x, y)
+    return {name: torch.where(_batched_expand(cond, value), value, y[name])
+            for name, value in x.items()}
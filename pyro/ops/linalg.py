@@ -84,3 +84,120 @@ def inv3d(H, sym=False):
         Hinv[..., 2, 1] = H[..., 2, 0] * H[..., 0, 1] - H[..., 0, 0] * H[..., 2, 1]
     Hinv = Hinv / detH.unsqueeze(-1).unsqueeze(-1)
     return Hinv
+
+
+def conjugate_gradient(matmul, B, precond=None, max_iter=None, tol=1e-5):
+    r"""
+    Solves a symmetric positive definite system :math:`A X = B` by batched
+    (preconditioned) conjugate gradients, solving for each column of :math:`B`
+    in parallel. The matrix :math:`A` is accessed only through products.
+
+    :param callable matmul: A function computing :math:`A V` for an
+        :math:`N \times K` matrix :math:`V`.
+    :param torch.Tensor B: An :math:`N \times K` right hand side.
+    :param callable precond: An optional function computing :math:`P^{-1} V`
+        for a symmetric positive definite preconditioner :math:`P \approx A`.
+    :param int max_iter: Maximum number of iterations. Defaults to :math:`N`.
+    :param float tol: Tolerance on the relative residual norm of each column.
+    :returns: the solution :math:`X` of shape :math:`N \times K`.
+    :rtype: torch.Tensor
+    """
+    max_iter = B.size(0) if max_iter is None else max_iter
+    X = B.new_zeros(B.shape)
+    R = B
+    Z = R if precond is None else precond(R)
+    P = Z
+    RZ = (R * Z).sum(0)
+    threshold = tol * B.norm(dim=0)
+    zero = B.new_zeros(())
+    for _ in range(max_iter):
+        if (R.norm(dim=0) <= threshold).all():
+            break
+        AP = matmul(P)
+        PAP = (P * AP).sum(0)
+        alpha = torch.where(PAP > 0, RZ / PAP, zero)
+        X = X + alpha * P
+        R = R - alpha * AP
+        Z = R if precond is None else precond(R)
+        RZ_new = (R * Z).sum(0)
+        beta = torch.where(RZ > 0, RZ_new / RZ, zero)
+        P = Z + beta * P
+        RZ = RZ_new
+    return X
+
+
+def lanczos_logdet(matmul, probes, num_iter=30):
+    r"""
+    Estimates :math:`\log\det A` of a symmetric positive definite matrix by
+    stochastic Lanczos quadrature [1], accessing :math:`A` only through
+    products.
+
+    References:
+
+    [1] `Fast Estimation of tr(f(A)) via Stochastic Lanczos Quadrature`,
+    Shashanka Ubaru, Jie Chen, Yousef Saad
+
+    :param callable matmul: A function computing :math:`A V` for an
+        :math:`N \times K` matrix :math:`V`.
+    :param torch.Tensor probes: An :math:`N \times K` matrix of random probe
+        vectors with :math:`E[z z^T] = I`, e.g. Rademacher vectors.
+    :param int num_iter: Number of Lanczos iterations.
+    :returns: an estimate of :math:`\log\det A`.
+    :rtype: torch.Tensor
+    """
+    N, K = probes.shape
+    num_iter = min(num_iter, N)
+    probe_norms_sq = probes.pow(2).sum(0)
+    Q = probes / probe_norms_sq.sqrt()
+    Q_prev = torch.zeros_like(Q)
+    beta = Q.new_zeros(K)
+    alphas, betas = [], []
+    for i in range(num_iter):
+        W = matmul(Q) - beta * Q_prev
+        alpha = (W * Q).sum(0)
+        W = W - alpha * Q
+        alphas.append(alpha)
+        beta = W.norm(dim=0)
+        if i == num_iter - 1 or (beta < 1e-6 * alpha.abs()).any():
+            break
+        betas.append(beta)
+        Q_prev, Q = Q, W / beta
+
+    # Gauss quadrature from each tridiagonal Lanczos matrix T: e1.T @ log(T) @ e1
+    alphas = torch.stack(alphas, dim=-1)
+    betas = torch.stack(betas, dim=-1) if betas else alphas.new_zeros(K, 0)
+    quadratures = []
+    for k in range(K):
+        T = alphas[k].diag() + betas[k].diag(1) + betas[k].diag(-1)
+        evals, evecs = torch.symeig(T, eigenvectors=True)
+        quadratures.append((evecs[0].pow(2) * evals.clamp(min=torch.finfo(T.dtype).tiny).log()).sum())
+    return (torch.stack(quadratures) * probe_norms_sq).mean()
+
+
+def pivoted_cholesky(diag, get_row, rank, tol=1e-6):
+    r"""
+    Computes a low rank approximation :math:`L L^T` of a symmetric positive
+    semidefinite matrix :math:`A` by partial pivoted Cholesky decomposition,
+    accessing only the diagonal and ``rank`` rows of :math:`A`.
+
+    :param torch.Tensor diag: The diagonal of :math:`A`, of size :math:`N`.
+    :param callable get_row: A function computing the row :math:`A_{i,:}` given
+        an index :math:`i`.
+    :param int rank: Maximum rank of the approximation.
+    :param float tol: Stops early once the trace of the residual falls below
+        ``tol`` times the trace of :math:`A`.
+    :returns: the factor :math:`L` of shape :math:`N \times r` with
+        :math:`r \le rank`.
+    :rtype: torch.Tensor
+    """
+    d = diag.clone()
+    L = diag.new_zeros(diag.size(0), rank)
+    threshold = tol * d.sum()
+    for k in range(rank):
+        if d.sum() <= threshold:
+            return L[:, :k]
+        i = d.argmax().item()
+        row = get_row(i) - L[:, :k].matmul(L[i, :k])
+        L[:, k] = row / d[i].sqrt()
+        d = (d - L[:, k].pow(2)).clamp(min=0)
+    return L
@@ -6,10 +6,75 @@ from abc import ABCMeta, abstractmethod
 import torch
 from six import add_metaclass
 
-from pyro.ops.einsum import contract
+from pyro.ops.einsum import contract, largest_intermediate
 from pyro.ops.einsum.adjoint import SAMPLE_SYMBOL, Backward
 from pyro.util import ignore_jit_warnings
 
+# Minimum number of pairwise factors for a markov chain to be evaluated by
+# parallel scan rather than by sequential elimination.
+_MIN_SCAN_LENGTH = 8
+_CHAIN_CACHE = {}
+
+
+def _find_chain(inputs, dims):
+    """
+    Finds a markov chain structure in the packed dims of a sumproduct, i.e.
+    an ordering ``x0 - x1 - ... - xT`` of all sum dims such that each term
+    depends on at most one adjacent pair of them. Results are cached.
+
+    :param tuple inputs: a tuple of packed dims strings, one per term.
+    :param frozenset dims: sum dims to contract.
+    :return: either None or a tuple ``(path, edges, rest)`` where ``path`` is
+        the string of chain dims, ``edges[k]`` is a list of indices of terms
+        attached to the pair ``(path[k], path[k + 1])``, and ``rest`` is a list
+        of indices of terms that do not depend on any sum dim.
+    :rtype: tuple
+    """
+    key = inputs, dims
+    if key in _CHAIN_CACHE:
+        return _CHAIN_CACHE[key]
+    _CHAIN_CACHE[key] = None
+
+    term_dims = [[d for d in dims_str if d in dims] for dims_str in inputs]
+    neighbors = {}
+    for ds in term_dims:
+        if len(ds) > 2 or len(set(ds)) < len(ds):
+            return None
+        for d in ds:
+            neighbors.setdefault(d, set())
+        if len(ds) == 2:
+            neighbors[ds[0]].add(ds[1])
+            neighbors[ds[1]].add(ds[0])
+    if len(neighbors) <= _MIN_SCAN_LENGTH or any(len(n) not in (1, 2) for n in neighbors.values()):
+        return None
+    ends = sorted(d for d, n in neighbors.items() if len(n) == 1)
+    if len(ends) != 2:
+        return None
+
+    # Walk the chain from one end.
+    path = [ends[0]]
+    prev = None
+    while True:
+        pending = neighbors[path[-1]] - {prev}
+        if not pending:
+            break
+        prev = path[-1]
+        path.append(pending.pop())
+    if len(path) != len(neighbors):
+        return None
+
+    pos = {d: i for i, d in enumerate(path)}
+    edges = [[] for _ in range(len(path) - 1)]
+    rest = []
+    for i, ds in enumerate(term_dims):
+        if not ds:
+            rest.append(i)
+        else:
+            edges[max(0, max(pos[d] for d in ds) - 1)].append(i)
+    result = ''.join(path), edges, rest
+    _CHAIN_CACHE[key] = result
+    return result
+
 
 @add_metaclass(ABCMeta)
 class Ring(object):
@@ -27,9 +92,18 @@ class Ring(object):
 
     :param dict cache: an optional :func:`~opt_einsum.shared_intermediates`
         cache.
+    :param int memory_limit: an optional bound on the number of elements of
+        intermediates created by :meth:`sumproduct`. This is passed to the path
+        search of opt_einsum, and if no path satisfies the bound, rings that
+        support slicing contract slices of the largest sum dims one at a time.
     """
-    def __init__(self, cache=None):
+    # Whether the einsum backend records backward pointers, in which case
+    # sumproducts cannot be rewritten as other sequences of tensor ops.
+    _records_backward = False
+
+    def __init__(self, cache=None, memory_limit=None):
         self._cache = {} if cache is None else cache
+        self._memory_limit = memory_limit
 
     def _hash_by_id(self, tensor):
         """
@@ -40,6 +114,98 @@ class Ring(object):
         assert self._cache.setdefault(('tensor', result), tensor) is tensor
         return result
 
+    def _sliced_sumproduct(self, terms, dims, equation):
+        """
+        Computes a sumproduct by slicing along the largest sum dim if no
+        contraction path fits within ``memory_limit``, otherwise returns None.
+        """
+        if self._records_backward:
+            return None
+        with ignore_jit_warnings():
+            shapes = tuple(tuple(map(int, term.shape)) for term in terms)
+            if largest_intermediate(equation, *shapes, memory_limit=self._memory_limit) <= self._memory_limit:
+                return None
+            sizes = {dim: size for term, shape in zip(terms, shapes) for dim, size in zip(term._pyro_dims, shape)}
+        sliceable_dims = sorted(dim for dim in dims if sizes.get(dim, 1) > 1)
+        if not sliceable_dims:
+            return None
+        dim = max(sliceable_dims, key=sizes.get)
+
+        # Contract one slice at a time, accumulating results pairwise so that the
+        # peak footprint is independent of the size of the sliced dim.
+        result = None
+        for index in range(sizes[dim]):
+            sliced_terms = []
+            for term in terms:
+                pos = term._pyro_dims.find(dim)
+                if pos != -1:
+                    term_dims = term._pyro_dims.replace(dim, '')
+                    term = term.select(pos, index)
+                    term._pyro_dims = term_dims
+                sliced_terms.append(term)
+            part = self.sumproduct(sliced_terms, set(dims) - {dim})
+            if result is not None:
+                dims_str = part._pyro_dims
+                part = contract(dim + dims_str + '->' + dims_str, torch.stack([result, part]),
+                                backend=self._backend)
+                part._pyro_dims = dims_str
+            result = part
+        return result
+
+    def _scan_sumproduct(self, terms, dims, inputs):
+        """
+        Computes a sumproduct of terms forming a homogeneous markov chain by an
+        associative parallel scan with sequential depth logarithmic in the
+        length of the chain, otherwise returns None. The scan is skipped if its
+        stacked factors would exceed ``memory_limit``.
+        """
+        if self._records_backward or len(terms) < _MIN_SCAN_LENGTH:
+            return None
+        chain = _find_chain(tuple(inputs), frozenset(dims))
+        if chain is None:
+            return None
+        path, edges, rest = chain
+        with ignore_jit_warnings():
+            sizes = {d: size for term in terms for d, size in zip(term._pyro_dims, map(int, term.shape))}
+        if len(set(sizes[d] for d in path)) != 1:
+            return None
+        batch_dims = ''.join(sorted(set(sizes) - set(path)))
+        if self._memory_limit is not None:
+            stacked_size = (len(path) - 1) * sizes[path[0]] ** 2
+            for d in batch_dims:
+                stacked_size *= sizes[d]
+            if stacked_size > self._memory_limit:
+                return None
+
+        # Combine the terms attached to each pair of adjacent chain dims into a
+        # single factor of dims batch_dims + (x[k], x[k+1]), then stack.
+        factors = []
+        for k, edge in enumerate(edges):
+            factor = terms[edge[0]] if len(edge) == 1 else self.sumproduct([terms[i] for i in edge], set())
+            target_dims = batch_dims + path[k:k + 2]
+            dims_str = ''.join(sorted(factor._pyro_dims, key=target_dims.index))
+            factor = factor.permute(tuple(map(factor._pyro_dims.index, dims_str)))
+            factor = factor.reshape(tuple(sizes[d] if d in dims_str else 1 for d in target_dims))
+            factors.append(factor)
+        factors = torch.stack(torch.broadcast_tensors(*factors))
+
+        # Multiply adjacent factors pairwise until a single factor remains.
+        # The chain has more than three dims, so its symbols can be reused here.
+        step, x, y, z = path[:4]
+        equation = (step + batch_dims + x + y + ',' + step + batch_dims + y + z +
+                    '->' + step + batch_dims + x + z)
+        while factors.size(0) > 1:
+            num_pairs = factors.size(0) // 2
+            result = contract(equation, factors[0:2 * num_pairs:2], factors[1:2 * num_pairs:2],
+                              backend=self._backend)
+            if factors.size(0) % 2:
+                result = torch.cat([result, factors[-1:]])
+            factors = result
+
+        term = factors[0]
+        term._pyro_dims = batch_dims + path[0] + path[-1]
+        return self.sumproduct([term] + [terms[i] for i in rest], set(dims))
+
     @abstractmethod
     def sumproduct(self, terms, dims):
         """
@@ -133,15 +299,22 @@ class LinearRing(Ring):
     """
     _backend = 'torch'
 
-    def __init__(self, cache=None, dim_to_size=None):
-        super(LinearRing, self).__init__(cache=cache)
+    def __init__(self, cache=None, dim_to_size=None, memory_limit=None):
+        super(LinearRing, self).__init__(cache=cache, memory_limit=memory_limit)
         self._dim_to_size = {} if dim_to_size is None else dim_to_size
 
     def sumproduct(self, terms, dims):
         inputs = [term._pyro_dims for term in terms]
         output = ''.join(sorted(set(''.join(inputs)) - set(dims)))
         equation = ','.join(inputs) + '->' + output
-        term = contract(equation, *terms, backend=self._backend)
+        term = self._scan_sumproduct(terms, dims, inputs)
+        if term is not None:
+            return term
+        if self._memory_limit is not None:
+            term = self._sliced_sumproduct(terms, dims, equation)
+            if term is not None:
+                return term
+        term = contract(equation, *terms, backend=self._backend, memory_limit=self._memory_limit)
         term._pyro_dims = output
         return term
 
@@ -184,15 +357,22 @@ class LogRing(Ring):
     """
     _backend = 'pyro.ops.einsum.torch_log'
 
-    def __init__(self, cache=None, dim_to_size=None):
-        super(LogRing, self).__init__(cache=cache)
+    def __init__(self, cache=None, dim_to_size=None, memory_limit=None):
+        super(LogRing, self).__init__(cache=cache, memory_limit=memory_limit)
         self._dim_to_size = {} if dim_to_size is None else dim_to_size
 
     def sumproduct(self, terms, dims):
         inputs = [term._pyro_dims for term in terms]
         output = ''.join(sorted(set(''.join(inputs)) - set(dims)))
         equation = ','.join(inputs) + '->' + output
-        term = contract(equation, *terms, backend=self._backend)
+        term = self._scan_sumproduct(terms, dims, inputs)
+        if term is not None:
+            return term
+        if self._memory_limit is not None:
+            term = self._sliced_sumproduct(terms, dims, equation)
+            if term is not None:
+                return term
+        term = contract(equation, *terms, backend=self._backend, memory_limit=self._memory_limit)
         term._pyro_dims = output
         return term
 
@@ -255,6 +435,7 @@ class MapRing(LogRing):
     Ring of forward-maxsum backward-argmax operations.
     """
     _backend = 'pyro.ops.einsum.torch_map'
+    _records_backward = True
 
     def product(self, term, ordinal):
         result = super(MapRing, self).product(term, ordinal)
@@ -268,6 +449,7 @@ class SampleRing(LogRing):
     Ring of forward-sumproduct backward-sample operations in log space.
     """
     _backend = 'pyro.ops.einsum.torch_sample'
+    _records_backward = True
 
     def product(self, term, ordinal):
         result = super(SampleRing, self).product(term, ordinal)
@@ -308,6 +490,7 @@ class MarginalRing(LogRing):
     Ring of forward-sumproduct backward-marginal operations in log space.
     """
     _backend = 'pyro.ops.einsum.torch_marginal'
+    _records_backward = True
 
     def product(self, term, ordinal):
         result = super(MarginalRing, self).product(term, ordinal)
@@ -1,3 +1,7 @@
+from __future__ import absolute_import, division, print_function
+
+from functools import reduce
+
 import torch
 
 
@@ -45,3 +49,108 @@ class WelfordCovariance(object):
                 scaled_cov.view(-1)[::scaled_cov.size(0) + 1] += shrinkage
                 cov = scaled_cov
         return cov
+
+
+def _merge_moments(x, y):
+    # Combines the (count, mean, sum of squared deviations) of two disjoint
+    # sets of samples, following Chan et al.
+    n_x, mean_x, m2_x = x
+    n_y, mean_y, m2_y = y
+    n = n_x + n_y
+    delta = mean_y - mean_x
+    return n, mean_x + delta * (n_y / n), m2_x + m2_y + delta ** 2 * (n_x * n_y / n)
+
+
+class WelfordBatchMeans(object):
+    """
+    Implements Welford's online scheme (see :class:`WelfordCovariance`) for a
+    batch of MCMC chains, together with the method of batch means (see
+    :math:`[1]`) to estimate the effective sample size and split Gelman-Rubin
+    statistic of the samples seen so far. The memory used does not grow with
+    the number of samples: samples are summarized into at most ``num_batches``
+    consecutive batches of equal size, and adjacent batches are merged pairwise
+    whenever all batches are full.
+
+    **References**
+
+    [1] `Batch means and spectral variance estimators in Markov chain Monte Carlo`,
+    James M. Flegal, Galin L. Jones
+
+    :param int num_batches: maximum number of batches to keep, which must be
+        an even number of at least 4.
+    """
+    def __init__(self, num_batches=64):
+        if num_batches < 4 or num_batches % 2:
+            raise ValueError("num_batches must be an even number of at least 4, got {}."
+                             .format(num_batches))
+        self.num_batches = num_batches
+        self.reset()
+
+    def reset(self):
+        self._mean = 0.
+        self._m2 = 0.
+        self._batches = []
+        self._current = (0, 0., 0.)
+        self.batch_size = 1
+        self.n_samples = 0
+
+    def update(self, sample):
+        """
+        :param torch.Tensor sample: samples of all chains, with the chains
+            along the leftmost dimension.
+        """
+        self.n_samples += 1
+        delta_pre = sample - self._mean
+        self._mean = self._mean + delta_pre / self.n_samples
+        self._m2 = self._m2 + delta_pre * (sample - self._mean)
+
+        n, mean, m2 = self._current
+        n += 1
+        delta_pre = sample - mean
+        mean = mean + delta_pre / n
+        m2 = m2 + delta_pre * (sample - mean)
+        if n < self.batch_size:
+            self._current = n, mean, m2
+            return
+        self._batches.append((n, mean, m2))
+        self._current = (0, 0., 0.)
+        if len(self._batches) == self.num_batches:
+            self._batches = [_merge_moments(self._batches[i], self._batches[i + 1])
+                             for i in range(0, self.num_batches, 2)]
+            self.batch_size *= 2
+
+    def get_mean(self):
+        if self.n_samples < 1:
+            raise RuntimeError('Insufficient samples to estimate mean')
+        return self._mean
+
+    def get_variance(self):
+        if self.n_samples < 2:
+            raise RuntimeError('Insufficient samples to estimate variance')
+        return self._m2 / (self.n_samples - 1)
+
+    def get_effective_sample_size(self):
+        """
+        Estimates the effective sample size of all chains, summed over chains.
+        """
+        if len(self._batches) < 2 or self.n_samples < 2:
+            raise RuntimeError('Insufficient samples to estimate effective sample size')
+        batch_means = torch.stack([mean for _, mean, _ in self._batches])
+        asymptotic_variance = self.batch_size * batch_means.var(dim=0)
+        return (self.n_samples * self.get_variance() / asymptotic_variance).sum(dim=0)
+
+    def get_split_gelman_rubin(self):
+        """
+        Estimates the split Gelman-Rubin statistic over all chains, where each
+        chain is split into its first and second halves at a batch boundary.
+        """
+        num_half_batches = len(self._batches) // 2
+        if num_half_batches * self.batch_size < 2:
+            raise RuntimeError('Insufficient samples to estimate split Gelman-Rubin')
+        halves = [reduce(_merge_moments, self._batches[:num_half_batches]),
+                  reduce(_merge_moments, self._batches[num_half_batches:2 * num_half_batches])]
+        N = halves[0][0]
+        chain_mean = torch.cat([mean for _, mean, _ in halves])
+        var_within = torch.cat([m2 for _, _, m2 in halves]).div(N - 1).mean(dim=0)
+        var_estimator = (N - 1) / N * var_within + chain_mean.var(dim=0)
+        return (var_estimator / var_within).sqrt()
@@ -11,6 +11,8 @@ class PyroLRScheduler(PyroOptim):
     :param optim_constructor: a torch.optim.lr_scheduler
     :param optim_args: a dictionary of learning arguments for the optimizer or a callable that returns
         such dictionaries. must contain the key 'optimizer' with pytorch optimizer value
+    :param bool fused: whether to share a single optimizer and scheduler among all parameters with
+        equal learning arguments, see :class:`~pyro.optim.optim.PyroOptim`.
 
     Example::
 
@@ -19,7 +21,7 @@ class PyroLRScheduler(PyroOptim):
         svi = SVI(model, guide, pyro_scheduler, loss=TraceGraph_ELBO())
         svi.step()
     """
-    def __init__(self, scheduler_constructor, optim_args):
+    def __init__(self, scheduler_constructor, optim_args, fused=False):
         # pytorch scheduler
         self.pt_scheduler_constructor = scheduler_constructor
         # torch optimizer
@@ -29,7 +31,7 @@ class PyroLRScheduler(PyroOptim):
         self.kwargs = optim_args
         # current epoch
         self.epoch = None
-        super(PyroLRScheduler, self).__init__(pt_optim_constructor, optim_kwargs)
+        super(PyroLRScheduler, self).__init__(pt_optim_constructor, optim_kwargs, fused=fused)
 
     def __call__(self, params, *args, **kwargs):
         kwargs['epoch'] = self.epoch
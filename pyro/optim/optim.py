@@ -1,5 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
+import copy
+
 import torch
 
 import pyro
@@ -15,8 +17,16 @@ class PyroOptim(object):
     :param optim_constructor: a torch.optim.Optimizer
     :param optim_args: a dictionary of learning arguments for the optimizer or a callable that returns
         such dictionaries
+    :param bool fused: whether to share a single optimizer among all parameters with equal learning
+        arguments, rather than creating an optimizer per parameter. This reduces the per-step overhead
+        of models with many parameter sites. Parameters that are not being optimized in a given step are
+        left untouched. Defaults to False.
+
+    Example::
+
+        adam = pyro.optim.Adam({"lr": 0.01}, fused=True)
     """
-    def __init__(self, optim_constructor, optim_args):
+    def __init__(self, optim_constructor, optim_args, fused=False):
         self.pt_optim_constructor = optim_constructor
 
         # must be callable or dict
@@ -29,6 +39,10 @@ class PyroOptim(object):
         # holds the torch optimizer objects
         self.optim_objs = {}
 
+        # in fused mode, holds a list of (optim args, optim object) pairs shared among params
+        self.fused = fused
+        self._fused_objs = []
+
         # holds the current epoch
         self.epoch = None
 
@@ -43,6 +57,9 @@ class PyroOptim(object):
         Do an optimization step for each param in params. If a given param has never been seen before,
         initialize an optimizer for it.
         """
+        if self.fused:
+            return self._fused_step(params, *args, **kwargs)
+
         for p in params:
             # if we have not seen this param before, we instantiate and optim object to deal with it
             if p not in self.optim_objs:
@@ -55,13 +72,78 @@ class PyroOptim(object):
                     self.optim_objs[p].load_state_dict(state)
 
             # actually perform the step for the optim object
-            self.optim_objs[p].step(*args, **kwargs)
+            self._step(self.optim_objs[p], *args, **kwargs)
+
+    def _step(self, optim_obj, *args, **kwargs):
+        optim_obj.step(*args, **kwargs)
 
-            # if optim object was a scheduler, perform an actual optim step
-            if isinstance(self.optim_objs[p], torch.optim.lr_scheduler._LRScheduler):
-                optim_kwargs = kwargs.copy()
-                optim_kwargs.pop('epoch', None)
-                self.optim_objs[p].optimizer.step(*args, **optim_kwargs)
+        # if optim object was a scheduler, perform an actual optim step
+        if isinstance(optim_obj, torch.optim.lr_scheduler._LRScheduler):
+            optim_kwargs = kwargs.copy()
+            optim_kwargs.pop('epoch', None)
+            optim_obj.optimizer.step(*args, **optim_kwargs)
+
+    def _fused_step(self, params, *args, **kwargs):
+        params = list(params)
+        optim_objs = []
+        for p in params:
+            if p not in self.optim_objs:
+                self.optim_objs[p] = self._get_fused_optim(p)
+                param_name = pyro.get_param_store().param_name(p)
+                if param_name in self._state_waiting_to_be_consumed:
+                    state = self._state_waiting_to_be_consumed.pop(param_name)
+                    self._load_param_state(self.optim_objs[p], p, state)
+            optim_obj = self.optim_objs[p]
+            if not any(optim_obj is o for o in optim_objs):
+                optim_objs.append(optim_obj)
+
+        # hide the gradients of shared params that are not optimized in this step
+        active = set(params)
+        hidden = []
+        for optim_obj in optim_objs:
+            for p in _get_optimizer(optim_obj).param_groups[0]['params']:
+                if p not in active and p.grad is not None:
+                    hidden.append((p, p.grad))
+                    p.grad = None
+        try:
+            for optim_obj in optim_objs:
+                self._step(optim_obj, *args, **kwargs)
+        finally:
+            for p, grad in hidden:
+                p.grad = grad
+
+    def _get_fused_optim(self, param):
+        optim_args = self._get_optim_args(param)
+        for fused_args, optim_obj in self._fused_objs:
+            if fused_args == optim_args:
+                optimizer = _get_optimizer(optim_obj)
+                optimizer.param_groups[0]['params'].append(param)
+                # some optimizers (e.g. Adagrad) initialize per-param state at construction,
+                # so take it from a throwaway optimizer of this param
+                fresh_state = _get_optimizer(self._get_optim(param)).state
+                if param in fresh_state:
+                    optimizer.state[param] = fresh_state[param]
+                return optim_obj
+        optim_obj = self._get_optim(param)
+        self._fused_objs.append((optim_args, optim_obj))
+        return optim_obj
+
+    def _get_param_state(self, optim_obj, param):
+        # mimics the state dict of an optimizer of a single param, so that state is interchangeable
+        # between fused and unfused mode
+        if not isinstance(optim_obj, torch.optim.Optimizer):
+            return optim_obj.state_dict()
+        group = {k: v for k, v in optim_obj.param_groups[0].items() if k != 'params'}
+        group['params'] = [0]
+        state = {0: copy.deepcopy(optim_obj.state[param])} if param in optim_obj.state else {}
+        return {'state': state, 'param_groups': [group]}
+
+    def _load_param_state(self, optim_obj, param, state_dict):
+        if not isinstance(optim_obj, torch.optim.Optimizer):
+            return optim_obj.load_state_dict(state_dict)
+        state = copy.deepcopy(list(state_dict['state'].values()))
+        if state:
+            optim_obj.state[param] = {k: _cast_like(v, param) for k, v in state[0].items()}
 
     def get_state(self):
         """
@@ -71,7 +153,10 @@ class PyroOptim(object):
         state_dict = {}
         for param in self.optim_objs:
             param_name = pyro.get_param_store().param_name(param)
-            state_dict[param_name] = self.optim_objs[param].state_dict()
+            if self.fused:
+                state_dict[param_name] = self._get_param_state(self.optim_objs[param], param)
+            else:
+                state_dict[param_name] = self.optim_objs[param].state_dict()
         return state_dict
 
     def set_state(self, state_dict):
@@ -126,17 +211,31 @@ class PyroOptim(object):
             return self.pt_optim_args
 
 
-def AdagradRMSProp(optim_args):
+def _get_optimizer(optim_obj):
+    # unwraps the optimizer of a scheduler
+    return optim_obj if isinstance(optim_obj, torch.optim.Optimizer) else optim_obj.optimizer
+
+
+def _cast_like(value, param):
+    # follows torch.optim.Optimizer.load_state_dict
+    if isinstance(value, torch.Tensor):
+        if value.is_floating_point():
+            value = value.to(param.dtype)
+        return value.to(param.device)
+    return value
+
+
+def AdagradRMSProp(optim_args, **kwargs):
     """
     A wrapper for an optimizer that is a mash-up of
     :class:`~torch.optim.Adagrad` and :class:`~torch.optim.RMSprop`.
     """
-    return PyroOptim(pt_AdagradRMSProp, optim_args)
+    return PyroOptim(pt_AdagradRMSProp, optim_args, **kwargs)
 
 
-def ClippedAdam(optim_args):
+def ClippedAdam(optim_args, **kwargs):
     """
     A wrapper for a modification of the :class:`~torch.optim.Adam`
     optimization algorithm that supports gradient clipping.
     """
-    return PyroOptim(pt_ClippedAdam, optim_args)
+    return PyroOptim(pt_ClippedAdam, optim_args, **kwargs)
@@ -8,6 +8,55 @@ import torch
 from torch.distributions import constraints, transform_to
 
 
+class _FlatBuffer(object):
+    """
+    Contiguous storage shared by unconstrained params of a single dtype and
+    device. Each param's ``.data`` and ``.grad`` are views into ``data`` and
+    ``grad`` respectively.
+    """
+    def __init__(self, dtype, device):
+        self.data = torch.zeros(0, dtype=dtype, device=device)
+        self.grad = torch.zeros(0, dtype=dtype, device=device)
+        self.size = 0
+        self.params = []
+        self.offsets = []
+
+    def add(self, param):
+        numel = param.numel()
+        if self.size + numel > self.data.numel():
+            self._resize(max(2 * self.data.numel(), self.size + numel))
+        self._bind(param, self.size)
+        self.params.append(param)
+        self.offsets.append(self.size)
+        self.size += numel
+
+    def remove(self, param):
+        # leaves a hole, which is reclaimed at the next resize
+        i = next(i for i, p in enumerate(self.params) if p is param)
+        del self.params[i], self.offsets[i]
+
+    def _resize(self, capacity):
+        self.data = self.data.new_zeros(capacity)
+        self.grad = self.grad.new_zeros(capacity)
+        self.size = 0
+        for i, param in enumerate(self.params):
+            self._bind(param, self.size)
+            self.offsets[i] = self.size
+            self.size += param.numel()
+        self.data.grad = self.grad
+
+    def _bind(self, param, offset):
+        numel = param.numel()
+        data = self.data[offset:offset + numel].view(param.shape)
+        grad = self.grad[offset:offset + numel].view(param.shape)
+        with torch.no_grad():
+            data.copy_(param)
+            if param.grad is not None:
+                grad.copy_(param.grad)
+        param.data = data
+        param.grad = grad
+
+
 class ParamStoreDict(object):
     """
     Global store for parameters in Pyro. This is basically a key-value store.
@@ -29,6 +78,7 @@ class ParamStoreDict(object):
       two different modules each of which contains a parameter named `weight`. by contrast, a user
       can only have one top-level parameter named `weight` (outside of any module).
     - parameters can be saved and loaded from disk using `save` and `load`.
+    - unconstrained parameters can be packed into contiguous buffers using `flatten`.
     """
 
     # -------------------------------------------------------------------------------
@@ -41,6 +91,8 @@ class ParamStoreDict(object):
         self._params = {}  # dictionary from param name to param
         self._param_to_name = {}  # dictionary from unconstrained param to param name
         self._constraints = {}  # dictionary from param name to constraint object
+        self._flat_buffers = None  # dictionary from (dtype, device) to _FlatBuffer, if flattened
+        self._constrained_values = {}  # dictionary from param name to (unconstrained version, constrained param)
 
     def clear(self):
         """
@@ -49,6 +101,9 @@ class ParamStoreDict(object):
         self._params = {}
         self._param_to_name = {}
         self._constraints = {}
+        self._constrained_values = {}
+        if self._flat_buffers is not None:
+            self._flat_buffers = {}
 
     def items(self):
         """
@@ -93,20 +148,59 @@ class ParamStoreDict(object):
         unconstrained_value = constrained_value.unconstrained()
         self._param_to_name.pop(unconstrained_value)
         self._constraints.pop(name)
+        self._constrained_values.pop(name, None)
+        if self._flat_buffers is not None:
+            self._flat_buffer(unconstrained_value).remove(unconstrained_value)
 
     def __getitem__(self, name):
         """
         Get the constrained value of a named parameter.
+
+        Constrained values that require grad are memoized, so that repeated
+        reads of a parameter share a single transform and backward path. The
+        memo is invalidated when the unconstrained value is modified in place
+        by an operation that autograd tracks, and when a backward pass reaches
+        the constrained value, as in an SVI step. In-place edits of ``.data``
+        are not tracked by autograd; after making them outside of such a step,
+        set the parameter again to invalidate its memo. The memo is bypassed
+        while jit tracing, so that traced graphs depend on the unconstrained
+        value.
         """
         unconstrained_value = self._params[name]
 
+        # reuse the memoized constrained value if it is still valid
+        tracing = torch._C._get_tracing_state()
+        if tracing:
+            # e.g. pyro.ops.jit runs the function eagerly before tracing it
+            self._constrained_values.pop(name, None)
+        cached = self._constrained_values.get(name)
+        if cached is not None:
+            version, constrained_value = cached
+            if version == unconstrained_value._version and torch.is_grad_enabled():
+                return constrained_value
+
         # compute the constrained value
         constraint = self._constraints[name]
         constrained_value = transform_to(constraint)(unconstrained_value)
         constrained_value.unconstrained = weakref.ref(unconstrained_value)
 
+        if constrained_value is not unconstrained_value and constrained_value.requires_grad and not tracing:
+            self._constrained_values[name] = unconstrained_value._version, constrained_value
+            constrained_value.register_hook(self._invalidate_hook(name, constrained_value))
+
         return constrained_value
 
+    def _invalidate_hook(self, name, constrained_value):
+        ref = weakref.ref(constrained_value)
+
+        def hook(grad):
+            # the backward pass has consumed the graph of the constrained value
+            cached = self._constrained_values.get(name)
+            if cached is not None and cached[1] is ref():
+                del self._constrained_values[name]
+
+        return hook
+
     def __setitem__(self, name, new_constrained_value):
         """
         Set the constrained value of an existing parameter, or the value of a
@@ -123,9 +217,17 @@ class ParamStoreDict(object):
             unconstrained_value = unconstrained_value.contiguous()
         unconstrained_value.requires_grad_(True)
 
+        if self._flat_buffers is not None:
+            old_value = self._params.get(name)
+            if old_value is not None and old_value is not unconstrained_value:
+                self._flat_buffer(old_value).remove(old_value)
+            if old_value is not unconstrained_value:
+                self._flat_buffer(unconstrained_value).add(unconstrained_value)
+
         # store a bidirectional mapping between name and unconstrained tensor
         self._params[name] = unconstrained_value
         self._param_to_name[unconstrained_value] = name
+        self._constrained_values.pop(name, None)
 
     def setdefault(self, name, init_constrained_value, constraint=constraints.real):
         """
@@ -162,6 +264,61 @@ class ParamStoreDict(object):
         # get the param, which is guaranteed to exist
         return self[name]
 
+    # -------------------------------------------------------------------------------
+    # Flat buffer layout
+
+    def flatten(self):
+        """
+        Packs the unconstrained values of all parameters of each dtype and device
+        into a single contiguous buffer, so that each parameter's data and
+        gradient are views into shared storage. Parameters created later are
+        added to the buffers as they are registered.
+
+        This allows gradients to be zeroed by a single op via :meth:`zero_grad`,
+        parameters to be updated by a single optimizer step over
+        :meth:`flat_parameters`, and parameters to be saved as a single buffer.
+        """
+        if self._flat_buffers is not None:
+            return
+        self._flat_buffers = {}
+        for unconstrained_value in self._params.values():
+            self._flat_buffer(unconstrained_value).add(unconstrained_value)
+
+    def _flat_buffer(self, unconstrained_value):
+        key = unconstrained_value.dtype, unconstrained_value.device
+        if key not in self._flat_buffers:
+            self._flat_buffers[key] = _FlatBuffer(*key)
+        return self._flat_buffers[key]
+
+    def flat_parameters(self):
+        """
+        Returns the flat buffers of a flattened ParamStore, as leaf tensors whose
+        ``.grad`` holds the gradients of all parameters in the buffer. These can
+        be passed to a :class:`torch.optim.Optimizer` to update all parameters
+        at once.
+
+        .. warning:: Buffers are reallocated as new parameters are registered,
+            so this should be called once all parameters have been created.
+
+        :rtype: list
+        """
+        if self._flat_buffers is None:
+            raise ValueError("ParamStore is not flattened, call .flatten() first")
+        return [buf.data for buf in self._flat_buffers.values()]
+
+    def zero_grad(self):
+        """
+        Sets gradients of all unconstrained parameters to zero, in place. This
+        is a single op per buffer for a flattened ParamStore.
+        """
+        if self._flat_buffers is not None:
+            for buf in self._flat_buffers.values():
+                buf.grad.zero_()
+        else:
+            for unconstrained_value in self._params.values():
+                if unconstrained_value.grad is not None:
+                    unconstrained_value.grad.zero_()
+
     # -------------------------------------------------------------------------------
     # Old non-dict interface
 
@@ -242,8 +399,14 @@ class ParamStoreDict(object):
             "malformed ParamStore keys {}".format(state.keys())
 
         for param_name, param in state['params'].items():
+            if self._flat_buffers is not None:
+                old_param = self._params.get(param_name)
+                if old_param is not None:
+                    self._flat_buffer(old_param).remove(old_param)
+                self._flat_buffer(param).add(param)
             self._params[param_name] = param
             self._param_to_name[param] = param_name
+            self._constrained_values.pop(param_name, None)
 
         for param_name, constraint in state['constraints'].items():
             if isinstance(constraint, type(constraints.real)):
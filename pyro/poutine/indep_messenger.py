@@ -16,9 +16,11 @@ class CondIndepStackFrame(namedtuple("CondIndepStackFrame", ["name", "dim", "siz
         return self.dim is not None
 
     def _key(self):
-        with ignore_jit_warnings(["Converting a tensor to a Python number"]):
-            size = self.size.item() if isinstance(self.size, torch.Tensor) else self.size
-            return self.name, self.dim, size, self.counter
+        size = self.size
+        if isinstance(size, torch.Tensor):
+            with ignore_jit_warnings(["Converting a tensor to a Python number"]):
+                size = size.item()
+        return self.name, self.dim, size, self.counter
 
     def __eq__(self, other):
         return type(self) == type(other) and self._key() == other._key()
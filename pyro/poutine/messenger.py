@@ -1,6 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
-from .runtime import _PYRO_STACK
+from .runtime import _PYRO_STACK, invalidate_hook_cache, invalidate_stack_dispatch
 
 
 class Messenger(object):
@@ -46,6 +46,7 @@ class Messenger(object):
             # if this poutine is not already installed,
             # put it on the bottom of the stack.
             _PYRO_STACK.append(self)
+            invalidate_stack_dispatch()
 
             # necessary to return self because the return value of __enter__
             # is bound to VAR in with EXPR as VAR.
@@ -90,6 +91,7 @@ class Messenger(object):
             # if not, raise a ValueError because something really weird happened.
             if _PYRO_STACK[-1] == self:
                 _PYRO_STACK.pop()
+                invalidate_stack_dispatch()
             else:
                 # should never get here, but just in case...
                 raise ValueError("This Messenger is not on the bottom of the stack")
@@ -102,6 +104,7 @@ class Messenger(object):
                 loc = _PYRO_STACK.index(self)
                 for i in range(loc, len(_PYRO_STACK)):
                     _PYRO_STACK.pop()
+                invalidate_stack_dispatch()
 
     def _reset(self):
         pass
@@ -151,6 +154,7 @@ class Messenger(object):
             raise ValueError("An operation type name must be provided")
 
         setattr(cls, "_pyro_" + ("post_" if post else "") + type, staticmethod(fn))
+        invalidate_hook_cache()
         return fn
 
     @classmethod
@@ -180,4 +184,5 @@ class Messenger(object):
         except AttributeError:
             pass
 
+        invalidate_hook_cache()
         return fn
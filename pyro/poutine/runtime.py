@@ -5,6 +5,12 @@ from pyro.params.param_store import _MODULE_NAMESPACE_DIVIDER, ParamStoreDict  #
 # the global pyro stack
 _PYRO_STACK = []
 
+# per-message-type dispatch tables for the current configuration of _PYRO_STACK
+_PYRO_STACK_DISPATCH = {}
+
+# per-(Messenger class, message type) names of the hooks that do any work
+_PYRO_HOOK_CACHE = {}
+
 # the global ParamStore
 _PYRO_PARAM_STORE = ParamStoreDict()
 
@@ -159,6 +165,95 @@ def default_process_message(msg):
     msg["done"] = True
 
 
+def invalidate_stack_dispatch():
+    """
+    Invalidate the compiled dispatch tables used by :func:`apply_stack`.
+
+    This must be called whenever :data:`_PYRO_STACK` is modified, or when a
+    ``_pyro_<type>`` handler is added to or removed from a ``Messenger``.
+    """
+    _PYRO_STACK_DISPATCH.clear()
+
+
+def invalidate_hook_cache():
+    """
+    Invalidate the per-class hook lookups used by :func:`apply_stack`, e.g.
+    after a ``_pyro_<type>`` handler is added to or removed from a class.
+    """
+    _PYRO_HOOK_CACHE.clear()
+    invalidate_stack_dispatch()
+
+
+def _get_hook_name(cls, method_name, handler_name):
+    """
+    Returns the name of the method that instances of ``cls`` use to handle a
+    message in the given phase, or ``None`` if the class would do nothing.
+    """
+    from .messenger import Messenger  # avoid a circular import
+
+    frame_method = getattr(cls, method_name, None)
+    base_method = getattr(Messenger, method_name)
+    if getattr(frame_method, "__func__", frame_method) is not getattr(base_method, "__func__", base_method):
+        # the frame handles messages itself, so it must always be called
+        return method_name
+    if hasattr(cls, handler_name):
+        return handler_name
+    return None
+
+
+def _get_hooks(frame, msg_type):
+    """
+    Returns the bound ``(process, postprocess)`` hooks of ``frame`` for the
+    given message type, where a hook is ``None`` if it would do nothing.
+    """
+    key = type(frame), msg_type
+    names = _PYRO_HOOK_CACHE.get(key)
+    if names is None:
+        handler_names = "_pyro_" + msg_type, "_pyro_post_" + msg_type
+        names = (_get_hook_name(key[0], "_process_message", handler_names[0]),
+                 _get_hook_name(key[0], "_postprocess_message", handler_names[1]),
+                 handler_names)
+        _PYRO_HOOK_CACHE[key] = names
+    process_name, postprocess_name, handler_names = names
+    # handlers may also be set directly on an instance
+    frame_dict = getattr(frame, "__dict__", {})
+    if process_name is None and handler_names[0] in frame_dict:
+        process_name = handler_names[0]
+    if postprocess_name is None and handler_names[1] in frame_dict:
+        postprocess_name = handler_names[1]
+    return (None if process_name is None else getattr(frame, process_name),
+            None if postprocess_name is None else getattr(frame, postprocess_name))
+
+
+def _compile_stack_dispatch(stack, msg_type):
+    """
+    Precompute, for the current stack and a given message type, the frames
+    that actually override the process and postprocess hooks.
+
+    :returns: a pair ``(process, postprocess)`` of tuples of
+        ``(stack_index, hook)`` pairs, in the order they should be called.
+    """
+    process = []
+    postprocess = []
+    for i, frame in enumerate(stack):
+        process_hook, postprocess_hook = _get_hooks(frame, msg_type)
+        if process_hook is not None:
+            process.append((i, process_hook))
+        if postprocess_hook is not None:
+            postprocess.append((i, postprocess_hook))
+    process.reverse()
+    return tuple(process), tuple(postprocess)
+
+
+def _get_stack_dispatch(stack, msg_type):
+    key = msg_type, len(stack)
+    dispatch = _PYRO_STACK_DISPATCH.get(key)
+    if dispatch is None:
+        dispatch = _compile_stack_dispatch(stack, msg_type)
+        _PYRO_STACK_DISPATCH[key] = dispatch
+    return dispatch
+
+
 def apply_stack(initial_msg):
     """
     Execute the effect stack at a single site according to the following scheme:
@@ -172,6 +267,13 @@ def apply_stack(initial_msg):
            execute ``_postprocess_message`` to update the message and internal messenger state with the site results
         4. If the message field "continuation" is not ``None``, call it with the message
 
+    Frames whose hooks would be no-ops for the message type are skipped
+    entirely, using a dispatch table that is compiled once per stack
+    configuration and message type (see :func:`invalidate_stack_dispatch`
+    and :func:`invalidate_hook_cache`). If a frame changes the message type,
+    e.g. :class:`~pyro.poutine.lift_messenger.LiftMessenger`, the remaining
+    frames dispatch on the new type.
+
     :param dict initial_msg: the starting version of the trace site
     :returns: ``None``
     """
@@ -181,21 +283,40 @@ def apply_stack(initial_msg):
     # msg is used to pass information up and down the stack
     msg = initial_msg
 
-    pointer = 0
-    # go until time to stop?
-    for frame in reversed(stack):
-
-        pointer = pointer + 1
-
-        frame._process_message(msg)
+    msg_type = msg["type"]
+    process, postprocess = _get_stack_dispatch(stack, msg_type)
 
-        if msg["stop"]:
-            break
+    # go until time to stop?
+    pointer = 0  # index of the last frame to have processed the message
+    if msg["stop"] and stack:
+        # a pre-stopped message is seen only by the bottom of the stack
+        pointer = len(stack) - 1
+        if process and process[0][0] == pointer:
+            process[0][1](msg)
+    else:
+        index = 0
+        while index < len(process):
+            i, hook = process[index]
+            index += 1
+            hook(msg)
+            if msg["stop"]:
+                pointer = i
+                break
+            if msg["type"] != msg_type:
+                # e.g. lift turns param sites into sample sites partway through the
+                # stack, so the remaining frames dispatch on the new type
+                msg_type = msg["type"]
+                process, postprocess = _get_stack_dispatch(stack, msg_type)
+                index = next((n for n, (j, _) in enumerate(process) if j < i), len(process))
 
     default_process_message(msg)
 
-    for frame in stack[-pointer:]:  # reversed(stack[0:pointer])
-        frame._postprocess_message(msg)
+    if msg["type"] != msg_type:
+        postprocess = _get_stack_dispatch(stack, msg["type"])[1]
+
+    for i, hook in postprocess:
+        if i >= pointer:
+            hook(msg)
 
     cont = msg["continuation"]
     if cont is not None:
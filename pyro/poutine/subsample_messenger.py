@@ -16,7 +16,7 @@ class _Subsample(Distribution):
     Internal use only. This should only be used by `plate`.
     """
 
-    def __init__(self, size, subsample_size, use_cuda=None, device=None):
+    def __init__(self, size, subsample_size, use_cuda=None, device=None, stream=None):
         """
         :param int size: the size of the range to subsample from
         :param int subsample_size: the size of the returned subsample
@@ -24,9 +24,13 @@ class _Subsample(Distribution):
             Whether to use cuda tensors.
         :param str device: device to place the `sample` and `log_prob`
             results on.
+        :param stream: optional stream of indices with a ``next_indices()``
+            method, e.g. a :class:`~pyro.contrib.minibatch.IndexStream`, from
+            which subsamples are drawn instead of sampling them afresh.
         """
         self.size = size
         self.subsample_size = subsample_size
+        self.stream = stream
         self.use_cuda = use_cuda
         if self.use_cuda is not None:
             if self.use_cuda ^ (device != "cpu"):
@@ -44,7 +48,9 @@ class _Subsample(Distribution):
         if sample_shape:
             raise NotImplementedError
         subsample_size = self.subsample_size
-        if subsample_size is None or subsample_size >= self.size:
+        if self.stream is not None:
+            result = self.stream.next_indices().to(self.device)
+        elif subsample_size is None or subsample_size >= self.size:
             result = jit_compatible_arange(self.size, device=self.device)
         else:
             result = torch.multinomial(torch.ones(self.size), self.subsample_size,
@@ -80,6 +86,16 @@ class SubsampleMessenger(IndepMessenger):
         """
         Helper function for plate. See its docstrings for details.
         """
+        stream = None
+        if hasattr(subsample, "next_indices"):
+            # Draw a fresh subsample from the stream, recorded at a sample site
+            # so that it is replayed consistently between guide and model.
+            stream, subsample = subsample, None
+            if size is None:
+                size = stream.size
+            elif size != stream.size:
+                raise ValueError("size does not match the size of the subsample stream, {} vs {}."
+                                 .format(size, stream.size))
         if size is None:
             assert subsample_size is None
             assert subsample is None
@@ -89,7 +105,7 @@ class SubsampleMessenger(IndepMessenger):
             msg = {
                 "type": "sample",
                 "name": name,
-                "fn": _Subsample(size, subsample_size, use_cuda, device),
+                "fn": _Subsample(size, subsample_size, use_cuda, device, stream),
                 "is_observed": False,
                 "args": (),
                 "kwargs": {},
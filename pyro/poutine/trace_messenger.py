@@ -106,10 +106,11 @@ class TraceMessenger(Messenger):
 
     def _pyro_post_sample(self, msg):
         if not self.param_only:
-            self.trace.add_node(msg["name"], **msg.copy())
+            # keyword unpacking already makes a shallow copy of msg
+            self.trace.add_node(msg["name"], **msg)
 
     def _pyro_post_param(self, msg):
-        self.trace.add_node(msg["name"], **msg.copy())
+        self.trace.add_node(msg["name"], **msg)
 
 
 class TraceHandler(object):
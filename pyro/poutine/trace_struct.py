@@ -3,7 +3,6 @@ from __future__ import absolute_import, division, print_function
 import collections
 import sys
 
-import networkx
 import opt_einsum
 import six
 
@@ -14,9 +13,31 @@ from pyro.poutine.util import is_validation_enabled
 from pyro.util import warn_if_inf, warn_if_nan
 
 
-class Trace(networkx.DiGraph):
+class _TraceNodes(collections.OrderedDict):
     """
-    Execution trace data structure built on top of :class:`networkx.DiGraph`.
+    Ordered mapping from site names to site metadata, as stored in
+    :attr:`Trace.nodes`. Like :attr:`networkx.DiGraph.nodes` it can also be
+    called, e.g. ``trace.nodes()`` or ``trace.nodes(data=True)``.
+    """
+    def __call__(self, data=False):
+        if data:
+            return list(self.items())
+        return self
+
+
+class _TraceEdges(list):
+    """
+    List of ``(parent, child)`` site name pairs, as returned by
+    :attr:`Trace.edges`. Like :attr:`networkx.DiGraph.edges` it can also be
+    called, e.g. ``trace.edges()``.
+    """
+    def __call__(self):
+        return self
+
+
+class Trace(object):
+    """
+    Execution trace data structure.
 
     An execution trace of a Pyro program is a record of every call
     to ``pyro.sample()`` and ``pyro.param()`` in a single execution of that program.
@@ -51,7 +72,7 @@ class Trace(networkx.DiGraph):
         >>> list(name for name in trace.nodes.keys())  # doctest: +SKIP
         ["_INPUT", "s", "z", "_RETURN"]
 
-    As in :class:`networkx.DiGraph`, values of ``trace.nodes`` are dictionaries of node metadata:
+    Values of ``trace.nodes`` are dictionaries of node metadata:
 
         >>> trace.nodes["z"]  # doctest: +SKIP
         {'type': 'sample', 'name': 'z', 'is_observed': False,
@@ -66,54 +87,136 @@ class Trace(networkx.DiGraph):
     ``'cond_indep_stack'`` contains data structures corresponding to ``pyro.plate`` contexts
     appearing in the execution.
     ``'done'``, ``'stop'``, and ``'continuation'`` are only used by Pyro's internals.
-    """
 
-    node_dict_factory = collections.OrderedDict
+    Edges are only stored for traces that have them (e.g. those recorded with
+    ``graph_type="dense"``), so a "flat" trace is just an ordered dict of sites.
+    :meth:`successors`, :meth:`predecessors` and :meth:`topological_sort`
+    mirror the corresponding :class:`networkx.DiGraph` methods.
+    """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, graph_type="flat"):
         """
         :param string graph_type: string specifying the kind of trace graph to construct
-
-        Constructor. Currently identical to :meth:`networkx.DiGraph.__init__`,
-        except for storing the graph_type attribute
         """
-        graph_type = kwargs.pop("graph_type", "flat")
         assert graph_type in ("flat", "dense"), \
             "{} not a valid graph type".format(graph_type)
         self.graph_type = graph_type
-        super(Trace, self).__init__(*args, **kwargs)
+        self.nodes = _TraceNodes()
+        # adjacency is created lazily, only for sites that have edges
+        self._succ = {}
+        self._pred = {}
+
+    def __contains__(self, site_name):
+        return site_name in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
 
-    def add_node(self, site_name, *args, **kwargs):
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, site_name, **kwargs):
         """
         :param string site_name: the name of the site to be added
 
         Adds a site to the trace.
 
-        Identical to :meth:`networkx.DiGraph.add_node`
-        but raises an error when attempting to add a duplicate node
+        Raises an error when attempting to add a duplicate node
         instead of silently overwriting.
         """
-        if site_name in self:
-            site = self.nodes[site_name]
+        site = self.nodes.get(site_name)
+        if site is not None:
             if site['type'] != kwargs['type']:
                 # Cannot sample or observe after a param statement.
                 raise RuntimeError("{} is already in the trace as a {}".format(site_name, site['type']))
             elif kwargs['type'] != "param":
                 # Cannot sample after a previous sample statement.
                 raise RuntimeError("Multiple {} sites named '{}'".format(kwargs['type'], site_name))
+            site.update(kwargs)
+        else:
+            # kwargs is already a fresh dict, so store it as the site itself.
+            self.nodes[site_name] = kwargs
+
+    def add_edge(self, site1, site2):
+        """
+        Adds a directed edge from ``site1`` to ``site2``. Either site is added
+        with empty metadata if it is not already in the trace.
+        """
+        for site_name in (site1, site2):
+            if site_name not in self.nodes:
+                self.nodes[site_name] = {}
+        self._succ.setdefault(site1, collections.OrderedDict())[site2] = None
+        self._pred.setdefault(site2, collections.OrderedDict())[site1] = None
 
-        # XXX should copy in case site gets mutated, or dont bother?
-        super(Trace, self).add_node(site_name, *args, **kwargs)
+    def remove_node(self, site_name):
+        """
+        Removes a site and all of its edges from the trace.
+        """
+        del self.nodes[site_name]
+        for child in self._succ.pop(site_name, ()):
+            del self._pred[child][site_name]
+        for parent in self._pred.pop(site_name, ()):
+            del self._succ[parent][site_name]
+
+    @property
+    def edges(self):
+        """
+        :return: a list of ``(parent, child)`` pairs of site names
+        """
+        return _TraceEdges((site1, site2)
+                           for site1 in self.nodes
+                           for site2 in self._succ.get(site1, ()))
+
+    def successors(self, site_name):
+        """
+        :return: an iterator over the names of the children of a site
+        """
+        if site_name not in self.nodes:
+            raise KeyError("{} is not in the trace".format(site_name))
+        return iter(self._succ.get(site_name, ()))
+
+    def predecessors(self, site_name):
+        """
+        :return: an iterator over the names of the parents of a site
+        """
+        if site_name not in self.nodes:
+            raise KeyError("{} is not in the trace".format(site_name))
+        return iter(self._pred.get(site_name, ()))
+
+    def topological_sort(self, reverse=False):
+        """
+        Returns a list of site names such that every site comes after all of
+        its parents, breaking ties by order of insertion into the trace.
+
+        :param bool reverse: whether to return the sites in reverse order.
+        :rtype: list
+        """
+        in_degree = {name: len(parents) for name, parents in self._pred.items() if parents}
+        ready = [name for name in reversed(self.nodes) if name not in in_degree]
+        result = []
+        while ready:
+            name = ready.pop()
+            result.append(name)
+            for child in reversed(list(self._succ.get(name, ()))):
+                in_degree[child] -= 1
+                if not in_degree[child]:
+                    ready.append(child)
+        if len(result) != len(self.nodes):
+            raise ValueError("Trace contains a cycle")
+        if reverse:
+            result.reverse()
+        return result
 
     def copy(self):
         """
         Makes a shallow copy of self with nodes and edges preserved.
-        Identical to :meth:`networkx.DiGraph.copy`, but preserves the type
-        and the self.graph_type attribute
+        Each site's metadata dict is copied, but not the values it contains.
         """
-        trace = super(Trace, self).copy()
-        trace.__class__ = Trace
+        trace = Trace.__new__(Trace)
         trace.graph_type = self.graph_type
+        trace.nodes = _TraceNodes((name, site.copy()) for name, site in self.nodes.items())
+        trace._succ = {name: children.copy() for name, children in self._succ.items()}
+        trace._pred = {name: parents.copy() for name, parents in self._pred.items()}
         return trace
 
     def log_prob_sum(self, site_filter=lambda name, site: True):
@@ -145,8 +145,12 @@ class plate(PlateMessenger):
         Defaults to `size`.
     :param subsample: Optional custom subsample for user-defined subsampling
         schemes. If specified, then `subsample_size` will be set to
-        `len(subsample)`.
-    :type subsample: Anything supporting `len()`.
+        `len(subsample)`. Alternatively this may be a stream of subsamples
+        such as a :class:`~pyro.contrib.minibatch.DataSource`, in which case
+        each execution draws its next minibatch from the stream and `size`
+        defaults to the size of the stream.
+    :type subsample: Anything supporting `len()`, or an object with a
+        `next_indices()` method.
     :param int dim: An optional dimension to use for this independence index.
         If specified, ``dim`` should be negative, i.e. should index from the
         right. If not specified, ``dim`` is set to the rightmost dim that is
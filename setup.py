@@ -80,7 +80,6 @@ setup(
         # add them to `docs/requirements.txt`
         'contextlib2',
         'graphviz>=0.8',
-        'networkx>=2.2',
         'numpy>=1.7',
         'opt_einsum>=2.3.2',
         'six>=1.10.0',
@@ -91,6 +90,7 @@ setup(
         'extras': EXTRAS_REQUIRE,
         'test': EXTRAS_REQUIRE + [
             'nbval',
+            'networkx>=2.2',
             'pytest>=4.1',
             'pytest-cov',
             'scipy>=1.1',
@@ -99,6 +99,7 @@ setup(
         'dev': EXTRAS_REQUIRE + [
             'flake8',
             'isort',
+            'networkx>=2.2',
             'nbformat',
             'nbsphinx>=0.3.2',
             'nbstripout',
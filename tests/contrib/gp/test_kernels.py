@@ -168,3 +168,38 @@ def test_transforming():
     assert_equal(K_owarp.data, Warping(k, owarping_coef=owarping_coef)(X, Z).data)
     assert_equal(K_vscale.data, VerticalScaling(k, vscaling_fn=vscaling_fn)(X, Z).data)
     assert_equal(K.exp().data, Exponent(k)(X, Z).data)
+
+
+@pytest.mark.parametrize("kernel, X, Z, K_sum", TEST_CASES, ids=TEST_IDS)
+@pytest.mark.parametrize("num_cols", [None, 2])
+def test_kernel_matmul(kernel, X, Z, K_sum, num_cols):
+    for Z in [None, Z]:
+        M = (X if Z is None else Z).shape[0]
+        V = torch.randn(M) if num_cols is None else torch.randn(M, num_cols)
+        expected = kernel(X, Z).matmul(V)
+        assert_equal(kernel.matmul(X, Z, V, block_size=1), expected, prec=1e-4)
+        assert_equal(kernel.matmul(X, Z, V), expected, prec=1e-4)
+
+
+def test_combination_transforming_matmul():
+    k = Sum(Product(TEST_CASES[6][0], VerticalScaling(TEST_CASES[3][0], lambda x: x.sum(dim=1))),
+            Sum(Warping(TEST_CASES[2][0], iwarping_fn=lambda x: x**2), WhiteNoise(3)))
+    Xs = torch.cat([X, Z])
+    V = torch.randn(Xs.size(0), 2)
+    assert_equal(k.matmul(Xs, None, V, block_size=2), k(Xs).matmul(V), prec=1e-4)
+    assert_equal(k.matmul(Xs, Z, V[:3], block_size=2), k(Xs, Z).matmul(V[:3]), prec=1e-4)
+
+
+def test_iter_diag_plus_low_rank():
+    k = TEST_CASES[6][0]
+    Xs = torch.cat([X, Z])
+    Xu = Z[:2]
+    Luu = (k(Xu) + 1e-6 * torch.eye(2)).cholesky()
+    blocks = list(k.iter_diag_plus_low_rank(Xs, Xu, Luu, block_size=2))
+    assert len(blocks) == 3
+    W = torch.cat([Wb for Wb, _ in blocks], dim=1)
+    d = torch.cat([db for _, db in blocks])
+    Kuf = k(Xu, Xs)
+    assert_equal(W.t().matmul(W), Kuf.t().matmul(torch.inverse(k(Xu) + 1e-6 * torch.eye(2))).matmul(Kuf),
+                 prec=1e-4)
+    assert_equal(W.pow(2).sum(dim=0) + d, k(Xs, diag=True), prec=1e-4)
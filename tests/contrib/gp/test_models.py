@@ -1,17 +1,19 @@
 from __future__ import absolute_import, division, print_function
 
 import logging
+import threading
 from collections import defaultdict, namedtuple
 
 import pytest
 import torch
 
 import pyro.distributions as dist
+import pyro.poutine as poutine
 from pyro.contrib.gp.kernels import Cosine, Matern32, RBF, WhiteNoise
 from pyro.contrib.gp.likelihoods import Gaussian
 from pyro.contrib.gp.models import (GPLVM, GPRegression, SparseGPRegression,
                                     VariationalGP, VariationalSparseGP)
-from pyro.contrib.gp.util import train
+from pyro.contrib.gp.util import CGSolver, train, train_minibatch
 from pyro.infer.mcmc.hmc import HMC
 from pyro.infer.mcmc.mcmc import MCMC
 from tests.common import assert_equal
@@ -226,6 +228,86 @@ def test_inference_vsgp():
     assert_equal((loc - target).abs().mean().item(), 0, prec=0.06)
 
 
+@pytest.mark.init(rng_seed=0)
+@pytest.mark.parametrize("data", ["dataset", "iterable"])
+def test_inference_vsgp_minibatch(data):
+    N = 1000
+    X = dist.Uniform(torch.zeros(N), torch.ones(N)*5).sample()
+    y = 0.5 * torch.sin(3*X) + dist.Normal(torch.zeros(N), torch.ones(N)*0.5).sample()
+    kernel = RBF(input_dim=1)
+    Xu = torch.arange(0., 5.5, 0.5)
+
+    if data == "dataset":
+        vsgp = VariationalSparseGP(X[:100], y[:100], kernel, Xu, Gaussian())
+        train_minibatch(vsgp, (X, y), subsample_size=100, num_steps=1500)
+    else:
+        vsgp = VariationalSparseGP(X[:100], y[:100], kernel, Xu, Gaussian(), num_data=N)
+        train_minibatch(vsgp, list(zip(X.split(100), y.split(100))), num_steps=1500)
+    assert_equal(vsgp.X, X[:100])
+
+    Xnew = torch.arange(0., 5.05, 0.05)
+    loc, var = vsgp(Xnew, full_cov=False)
+    target = 0.5 * torch.sin(3*Xnew)
+
+    assert_equal((loc - target).abs().mean().item(), 0, prec=0.07)
+
+
+def test_vsgp_minibatch_multi_output():
+    X = torch.randn(10, 3)
+    y = torch.randn(2, 10)
+    vsgp = VariationalSparseGP(X, y, RBF(input_dim=3), X[:4], Gaussian())
+    vsgp._data_source = vsgp._get_data_source(None, 5, prefetch=False)
+    seen = []
+    for _ in range(2):
+        ind = vsgp._data_source.peek_indices()
+        trace = poutine.trace(vsgp.model).get_trace()
+        site = next(site for site in trace.nodes.values() if site["type"] == "sample" and site["is_observed"])
+        # minibatches are drawn along the last dim of y
+        assert site["value"].shape == (2, 5)
+        assert_equal(site["value"], y[..., ind])
+        seen.append(site["value"])
+    vsgp._data_source = None
+    assert_equal(torch.cat(seen, -1).sort(-1)[0], y.sort(-1)[0])
+    train_minibatch(vsgp, subsample_size=5, num_steps=2, prefetch=False)
+
+
+def test_vgp_minibatch_model():
+    X = torch.randn(10, 3)
+    y = torch.randn(10)
+    vgp = VariationalGP(X, y, RBF(input_dim=3), Gaussian())
+    with pytest.raises(ValueError):
+        train_minibatch(vgp, (X, y), subsample_size=4)
+
+    vgp._data_source = vgp._get_data_source(None, 4, prefetch=False)
+    seen = []
+    for _ in range(3):
+        trace = poutine.trace(vgp.model).get_trace()
+        site = next(site for site in trace.nodes.values() if site["type"] == "sample" and site["is_observed"])
+        assert site["scale"] == 10 / site["value"].size(0)
+        seen.append(site["value"])
+    vgp._data_source = None
+    assert_equal(torch.cat(seen).sort()[0], y.sort()[0])
+
+    # within a training step, the Cholesky decomposition of k(X, X) is reused
+    vgp._step_cache = {}
+    assert vgp._kernel_cholesky(vgp.X) is vgp._kernel_cholesky(vgp.X)
+    vgp._step_cache = None
+    assert vgp._kernel_cholesky(vgp.X) is not vgp._kernel_cholesky(vgp.X)
+    train_minibatch(vgp, subsample_size=4, num_steps=2)
+
+
+def test_vsgp_minibatch_lbfgs():
+    X = torch.randn(20, 3)
+    y = torch.randn(20)
+    vsgp = VariationalSparseGP(X[:5], y[:5], RBF(input_dim=3), X[:4], Gaussian(), num_data=20)
+    optimizer = torch.optim.LBFGS(vsgp.parameters(), max_iter=5)
+    num_threads = threading.active_count()
+    # LBFGS evaluates the closure several times per step, after updating parameters
+    losses = train_minibatch(vsgp, list(zip(X.split(5), y.split(5))), optimizer=optimizer, num_steps=3)
+    assert len(losses) == 3
+    assert threading.active_count() == num_threads
+
+
 @pytest.mark.init(rng_seed=0)
 def test_inference_whiten_vsgp():
     N = 1000
@@ -455,3 +537,70 @@ def test_mean_function_VSGP_whiten():
     optimizer = torch.optim.Adam(gpmodule.parameters(), lr=0.1)
     train(gpmodule, optimizer)
     _post_test_mean_function(gpmodule, Xnew, ynew)
+
+
+@pytest.mark.parametrize("model_class", [GPRegression, SparseGPRegression])
+def test_precompute(model_class):
+    X = torch.randn(20, 3)
+    y = torch.randn(2, 20)
+    kernel = RBF(input_dim=3)
+    if model_class is SparseGPRegression:
+        gp = model_class(X, y, kernel, X[:5])
+    else:
+        gp = model_class(X, y, kernel)
+    Xnew = torch.randn(7, 3)
+    expected = gp(Xnew, full_cov=False, noiseless=False)
+    expected_full = gp(Xnew, full_cov=True)
+
+    gp.precompute(batch_size=3)
+    state = gp._predictive_cache["state"]
+    assert_equal(gp(Xnew, full_cov=False, noiseless=False), expected)
+    assert_equal(gp(Xnew, full_cov=True), expected_full)
+    assert gp._predictive_cache["state"] is state
+
+    # changing a param invalidates the cache
+    with torch.no_grad():
+        gp.noise_unconstrained.add_(1.)
+    gp(Xnew)
+    assert gp._predictive_cache["state"] is not state
+
+    gp.set_data(X[:10], y[:, :10])
+    assert gp._predictive_cache is None
+
+
+def test_iter_sample():
+    X = torch.randn(10, 3)
+    y = torch.randn(10)
+    gp = GPRegression(X, y, RBF(input_dim=3))
+    sampler = gp.iter_sample()
+    xnew = torch.randn(1, 3)
+    ynew = sampler(xnew)
+    for _ in range(3):
+        # conditioned on the accepted sample, the posterior at xnew collapses
+        assert_equal(sampler(xnew), ynew, prec=1e-2)
+    # degenerate points are not accepted, so later samples remain well defined
+    assert not torch.isnan(sampler(torch.randn(1, 3))).any()
+
+
+def test_gpr_cg_solver():
+    X = torch.randn(30, 3)
+    y = torch.randn(2, 30)
+    kernel = RBF(input_dim=3)
+    gp = GPRegression(X, y, kernel)
+    gp_cg = GPRegression(X, y, kernel, solver=CGSolver(tol=1e-6, num_probes=200, block_size=7))
+
+    Xnew = torch.randn(5, 3)
+    for full_cov in [False, True]:
+        loc, cov = gp(Xnew, full_cov=full_cov, noiseless=False)
+        loc_cg, cov_cg = gp_cg(Xnew, full_cov=full_cov, noiseless=False)
+        assert_equal(loc_cg, loc, prec=1e-3)
+        assert_equal(cov_cg, cov, prec=1e-3)
+
+    expected = poutine.trace(gp.model).get_trace().log_prob_sum()
+    actual = poutine.trace(gp_cg.model).get_trace().log_prob_sum()
+    assert_equal(actual, expected, prec=0.05 * abs(expected.item()))
+
+    # gradients of the log likelihood estimate are unbiased
+    expected_grad = torch.autograd.grad(expected, [gp.noise_unconstrained])[0]
+    actual_grad = torch.autograd.grad(actual, [gp_cg.noise_unconstrained])[0]
+    assert_equal(actual_grad, expected_grad, prec=0.1 * abs(expected_grad.item()))
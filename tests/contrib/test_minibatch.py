@@ -0,0 +1,97 @@
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+import torch
+
+import pyro
+import pyro.distributions as dist
+import pyro.poutine as poutine
+from pyro.contrib.minibatch import DataSource, IndexStream, MemmapTensor, prefetch
+from tests.common import assert_equal
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_index_stream_epochs(shuffle, drop_last):
+    size, subsample_size = 10, 4
+    stream = IndexStream(size, subsample_size, shuffle=shuffle, drop_last=drop_last)
+    num_batches = 2 if drop_last else 3
+    for epoch in range(3):
+        batches = [stream.next_indices() for _ in range(num_batches)]
+        seen = torch.cat(batches)
+        assert all(len(b) == subsample_size for b in batches[:2])
+        if not drop_last:
+            assert_equal(seen.sort()[0], torch.arange(size))
+        assert len(set(seen.tolist())) == len(seen)
+        assert stream.epoch == epoch
+    expected = stream.peek_indices()
+    assert_equal(stream.next_indices(), expected)
+    assert stream.epoch == 3
+
+
+def test_plate_stream_scale():
+    size, subsample_size = 10, 3
+    stream = IndexStream(size, subsample_size)
+
+    def model():
+        with pyro.plate("data", subsample=stream) as ind:
+            pyro.sample("x", dist.Normal(0., 1.).expand([len(ind)]))
+        return ind
+
+    seen = []
+    for step in range(4):
+        guide_trace = poutine.trace(model).get_trace()
+        model_trace = poutine.trace(poutine.replay(model, trace=guide_trace)).get_trace()
+        ind = guide_trace.nodes["_RETURN"]["value"]
+        assert_equal(model_trace.nodes["_RETURN"]["value"], ind)
+        assert model_trace.nodes["x"]["scale"] == size / len(ind)
+        seen.append(ind)
+    assert [len(ind) for ind in seen] == [3, 3, 3, 1]
+    assert_equal(torch.cat(seen).sort()[0], torch.arange(size))
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_data_source(tmpdir, prefetch):
+    size, subsample_size = 20, 6
+    features = np.random.randn(size, 3).astype(np.float32)
+    filename = str(tmpdir.join("features.dat"))
+    features.tofile(filename)
+    labels = torch.arange(size)
+    source = DataSource((MemmapTensor(filename, np.float32, features.shape), labels),
+                        subsample_size, prefetch=prefetch)
+
+    for step in range(7):
+        with pyro.plate("data", subsample=source) as ind:
+            x, y = source[ind]
+        assert_equal(x, torch.from_numpy(features)[ind])
+        assert_equal(y, labels[ind])
+    assert source.epoch == 1
+
+
+@pytest.mark.parametrize("size", [1, 3])
+def test_prefetch(size):
+    assert list(prefetch(range(10), size)) == list(range(10))
+
+    def failing():
+        yield 0
+        raise ValueError("failed")
+
+    batches = prefetch(failing(), size)
+    assert next(batches) == 0
+    with pytest.raises(ValueError):
+        next(batches)
+
+
+def test_prefetch_close():
+
+    def infinite():
+        while True:
+            yield 0
+
+    batches = prefetch(infinite())
+    assert next(batches) == 0
+    batches.close()
+    assert not batches._thread.is_alive()
+    with pytest.raises(StopIteration):
+        next(batches)
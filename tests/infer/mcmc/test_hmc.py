@@ -285,3 +285,85 @@ def test_initial_trace(monkeypatch):
     hmc_kernel.setup(0, data)
     hmc_kernel.initial_trace
     assert len(trace_log_prob_replay) == 0
+
+
+@pytest.mark.parametrize("full_mass", [False, True])
+def test_vectorized_chains(full_mass):
+    def model(data):
+        loc = pyro.sample("loc", dist.Normal(0., 10.))
+        scale = pyro.sample("scale", dist.LogNormal(0., 1.))
+        with pyro.plate("data", data.shape[0]):
+            pyro.sample("obs", dist.Normal(loc, scale), obs=data)
+
+    data = dist.Normal(2., 0.5).sample(torch.Size((500,)))
+    hmc_kernel = HMC(model, trajectory_length=1, full_mass=full_mass)
+    mcmc_run = MCMC(hmc_kernel, num_samples=300, warmup_steps=200, num_chains=3,
+                    chain_method="vectorized").run(data)
+    support = mcmc_run.marginal(["loc", "scale"]).support()
+    assert support["loc"].shape == (3, 300)
+    assert_equal(support["loc"].mean(-1), torch.full((3,), 2.), prec=0.1)
+    assert_equal(support["scale"].mean(-1), torch.full((3,), 0.5), prec=0.1)
+
+
+def test_vectorized_chains_size_one_batch_dim():
+    def model(data):
+        with pyro.plate("components", 2):
+            # the size-1 leftmost batch dim is not padded by any plate
+            loc = pyro.sample("loc", dist.Normal(torch.zeros(1, 2), 10.))
+        with pyro.plate("data", data.shape[0], dim=-2):
+            pyro.sample("obs", dist.Normal(loc, 1.), obs=data)
+
+    data = dist.Normal(torch.tensor([-1., 1.]), 1.).sample(torch.Size((100,)))
+    hmc_kernel = HMC(model, trajectory_length=1, max_plate_nesting=2)
+    mcmc_run = MCMC(hmc_kernel, num_samples=100, warmup_steps=100, num_chains=3,
+                    chain_method="vectorized").run(data)
+    support = mcmc_run.marginal(["loc"]).support()
+    assert support["loc"].shape == (3, 100, 1, 2)
+    assert_equal(support["loc"].mean(1), data.mean(0).expand(3, 1, 2), prec=0.3)
+
+
+@pytest.mark.skipif('CI' in os.environ, reason='to reduce running time on CI')
+def test_jit_rerun_uses_current_values():
+    data = torch.randn(100)
+    prior_loc = torch.tensor(0.)
+
+    def model():
+        # reads a param and a global tensor, which are captured by the compiled potential energy
+        noise_scale = pyro.param("noise_scale", torch.tensor(1.))
+        loc = pyro.sample("loc", dist.Normal(prior_loc, 1.))
+        with pyro.plate("data", len(data)):
+            pyro.sample("obs", dist.Normal(loc, noise_scale), obs=data)
+
+    pyro.clear_param_store()
+    hmc_kernel = HMC(model, trajectory_length=1, jit_compile=True, ignore_jit_warnings=True)
+    for true_loc in [0., 5.]:
+        data.copy_(true_loc + torch.randn(100))
+        prior_loc.fill_(true_loc)
+        pyro.get_param_store()["noise_scale"] = torch.tensor(0.1 + true_loc)
+        mcmc_run = MCMC(hmc_kernel, num_samples=200, warmup_steps=100).run()
+        posterior = mcmc_run.marginal('loc').empirical['loc']
+        # the potential energy of the second run must use the current values
+        noise_var = (0.1 + true_loc) ** 2
+        expected_var = 1. / (1. + len(data) / noise_var)
+        expected_mean = expected_var * (true_loc + data.sum() / noise_var)
+        assert_equal(posterior.mean, expected_mean, prec=0.3)
+
+
+@pytest.mark.parametrize("num_chains", [
+    1,
+    pytest.param(2, marks=[pytest.mark.skipif("CI" in os.environ, reason="CI only provides 1 CPU")])
+])
+def test_traces_replay_enumerated_model(num_chains):
+    def model(data):
+        y_prob = pyro.sample("y_prob", dist.Beta(1.0, 1.0))
+        y = pyro.sample("y", dist.Bernoulli(y_prob))
+        pyro.sample("obs", dist.Normal(2. * y, 1.), obs=data)
+
+    data = torch.tensor([1.0, 2.0])
+    hmc_kernel = HMC(model, trajectory_length=1)
+    mcmc_run = MCMC(hmc_kernel, num_samples=5, warmup_steps=5, num_chains=num_chains).run(data)
+    # traces are rebuilt against the model as run by the chains, which enumerates "y"
+    trace = mcmc_run.exec_traces[-1]
+    assert trace.nodes["y"]["infer"].get("enumerate") == "parallel"
+    assert trace.nodes["y"]["value"].shape == (2,)
+    assert_equal(trace.nodes["y_prob"]["value"], mcmc_run.sample_store.values["y_prob"][-1, -1])
@@ -8,7 +8,8 @@ import torch
 import pyro
 import pyro.distributions as dist
 from pyro import poutine
-from pyro.infer.mcmc.mcmc import MCMC, _SingleSampler, _ParallelSampler
+from pyro.infer.abstract_infer import EmpiricalMarginal
+from pyro.infer.mcmc.mcmc import MCMC, _LazyTraces, _ParallelSampler, _SingleSampler, _VectorizedSampler
 from pyro.infer.mcmc.trace_kernel import TraceKernel
 from pyro.util import optional
 from tests.common import assert_equal
@@ -36,6 +37,15 @@ class PriorKernel(TraceKernel):
         return self.initial_trace()
 
 
+class PriorValuesKernel(PriorKernel):
+    """
+    Same as :class:`PriorKernel`, but only returns the latent values of samples.
+    """
+    def sample_values(self, values):
+        trace = self.initial_trace()
+        return {name: site["value"] for name, site in trace.iter_stochastic_nodes()}
+
+
 def normal_normal_model(data):
     x = torch.tensor([0.0])
     y = pyro.sample('y', dist.Normal(x, torch.ones(data.shape)))
@@ -86,3 +96,45 @@ def test_num_chains(num_chains, cpu_count, monkeypatch):
         assert isinstance(mcmc.sampler, _SingleSampler)
     else:
         assert isinstance(mcmc.sampler, _ParallelSampler)
+
+
+def test_vectorized_chain_method(monkeypatch):
+    monkeypatch.setattr(torch.multiprocessing, 'cpu_count', lambda: 1)
+    kernel = PriorKernel(normal_normal_model)
+    mcmc = MCMC(kernel, num_samples=10, num_chains=4, chain_method="vectorized")
+    assert mcmc.num_chains == 4
+    assert isinstance(mcmc.sampler, _VectorizedSampler)
+
+
+def test_invalid_chain_method():
+    kernel = PriorKernel(normal_normal_model)
+    with pytest.raises(ValueError, match="chain_method"):
+        MCMC(kernel, num_samples=10, num_chains=2, chain_method="threads")
+
+
+@pytest.mark.parametrize("num_chains", [
+    1,
+    pytest.param(2, marks=[pytest.mark.skipif("CI" in os.environ, reason="CI only provides 1 CPU")])
+])
+def test_sample_store(num_chains, monkeypatch):
+    data = torch.tensor([2.0]).repeat(3)
+    kernel = PriorValuesKernel(normal_normal_model)
+    mcmc = MCMC(kernel=kernel, num_samples=10, num_chains=num_chains).run(data)
+    samples = mcmc.sample_store.values["y"]
+
+    # latent values are read from the store, without rebuilding traces
+    with monkeypatch.context() as m:
+        m.setattr(_LazyTraces, "__getitem__", lambda self, i: pytest.fail("trace rebuilt"))
+        marginal = EmpiricalMarginal(mcmc, "y")
+        assert_equal(marginal.enumerate_support(), samples if num_chains > 1 else samples[0])
+        stacked = EmpiricalMarginal(mcmc, ["y", "y"])
+        assert stacked.enumerate_support().shape == marginal.enumerate_support().shape[:-1] + (2, 3)
+
+    assert samples.shape == (num_chains, 10) + data.shape
+    assert len(mcmc.exec_traces) == num_chains * 10
+    for chain_id in range(num_chains):
+        trace = mcmc.exec_traces[chain_id * 10 + 3]
+        assert_equal(trace.nodes["y"]["value"], samples[chain_id, 3])
+        assert_equal(trace.nodes["_RETURN"]["value"], samples[chain_id, 3])
+    support = mcmc.marginal(["y"]).support()
+    assert_equal(support["y"], samples if num_chains > 1 else samples[0])
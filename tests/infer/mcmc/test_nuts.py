@@ -12,7 +12,7 @@ import pyro.distributions as dist
 from pyro.contrib.autoguide import AutoDelta
 from pyro.infer import TraceEnum_ELBO, SVI
 from pyro.infer.mcmc.mcmc import MCMC
-from pyro.infer.mcmc.nuts import NUTS
+from pyro.infer.mcmc.nuts import NUTS, _leaf_idx_to_ckpt_idxs
 import pyro.optim as optim
 import pyro.poutine as poutine
 from pyro.util import ignore_jit_warnings
@@ -318,3 +318,42 @@ def test_gaussian_hmm(num_steps):
     if num_steps == 30:
         nuts_kernel.initial_trace = _get_initial_trace()
     MCMC(nuts_kernel, num_samples=5, warmup_steps=5).run(data)
+
+
+@pytest.mark.parametrize("use_multinomial_sampling", [True, False])
+def test_vectorized_chains(use_multinomial_sampling):
+    def model(data):
+        alpha = pyro.sample('alpha', dist.Gamma(concentration=1., rate=1.))
+        beta = pyro.sample('beta', dist.Gamma(concentration=1., rate=1.))
+        with pyro.plate("data", data.shape[0]):
+            pyro.sample('x', dist.Beta(concentration1=alpha, concentration0=beta), obs=data)
+
+    true_alpha = torch.tensor(5.)
+    true_beta = torch.tensor(1.)
+    data = dist.Beta(concentration1=true_alpha, concentration0=true_beta).sample(torch.Size((5000,)))
+    nuts_kernel = NUTS(model, use_multinomial_sampling=use_multinomial_sampling)
+    mcmc_run = MCMC(nuts_kernel, num_samples=300, warmup_steps=200, num_chains=3,
+                    chain_method="vectorized").run(data)
+    support = mcmc_run.marginal(['alpha', 'beta']).support()
+    assert support['alpha'].shape == (3, 300)
+    assert_equal(support['alpha'].mean(-1), true_alpha.expand(3), prec=0.08)
+    assert_equal(support['beta'].mean(-1), true_beta.expand(3), prec=0.05)
+
+
+@pytest.mark.parametrize("tree_depth", [1, 3, 6])
+def test_leaf_idx_to_ckpt_idxs(tree_depth):
+    # For each odd leaf, the checkpoints to check must hold the first leaves of
+    # all subtrees ending at that leaf, which are stored by the even leaves.
+    ckpts = {}
+    for leaf_idx in range(2 ** tree_depth):
+        idx_min, idx_max = _leaf_idx_to_ckpt_idxs(leaf_idx)
+        assert idx_max < tree_depth
+        if leaf_idx % 2 == 0:
+            ckpts[idx_max] = leaf_idx
+            continue
+        subtree_starts = []
+        size = 2
+        while (leaf_idx + 1) % size == 0:
+            subtree_starts.append(leaf_idx + 1 - size)
+            size *= 2
+        assert sorted(ckpts[i] for i in range(idx_min, idx_max + 1)) == sorted(subtree_starts)
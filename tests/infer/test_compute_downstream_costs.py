@@ -2,7 +2,6 @@ from __future__ import absolute_import, division, print_function
 
 import math
 
-import networkx
 import pytest
 import torch
 
@@ -15,6 +14,17 @@ from pyro.poutine.util import prune_subsample_sites
 from tests.common import assert_equal
 
 
+def _get_descendants(trace, node):
+    descendants = set()
+    frontier = [node]
+    while frontier:
+        for child in trace.successors(frontier.pop()):
+            if child not in descendants:
+                descendants.add(child)
+                frontier.append(child)
+    return descendants
+
+
 def _brute_force_compute_downstream_costs(model_trace, guide_trace,  #
                                           non_reparam_nodes):
 
@@ -28,7 +38,7 @@ def _brute_force_compute_downstream_costs(model_trace, guide_trace,  #
                                                    guide_trace.nodes[node]['log_prob']))
         downstream_guide_cost_nodes[node] = set([node])
 
-        descendants = networkx.descendants(guide_trace, node)
+        descendants = _get_descendants(guide_trace, node)
 
         for desc in descendants:
             desc_mft = MultiFrameTensor((stacks[desc],
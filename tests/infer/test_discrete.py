@@ -191,6 +191,38 @@ def test_hmm_smoke(temperature, length):
     logger.info("inferred states: {}".format(list(map(int, inferred_states))))
 
 
+@pytest.mark.parametrize('length', [1, 2, 10])
+def test_hmm_batched(length):
+    hidden_dim = 4
+    batch_size = 3
+    transition = 0.3 / hidden_dim + 0.7 * torch.eye(hidden_dim)
+    means = torch.arange(float(hidden_dim))
+
+    @config_enumerate
+    def hmm(data):
+        states = [torch.tensor(0)]
+        for t in pyro.markov(range(len(data))):
+            states.append(pyro.sample("states_{}".format(t),
+                                      dist.Categorical(transition[states[-1]])))
+            pyro.sample("obs_{}".format(t),
+                        dist.Normal(means[states[-1]], 1.),
+                        obs=data[t])
+        return torch.stack(states[1:])
+
+    data = 1 + 2 * torch.randn(length, batch_size)
+    decoder = infer_discrete(hmm, first_available_dim=-1, temperature=0, batch_size=batch_size)
+    actual = decoder(data)
+    assert actual.shape == (length, batch_size)
+    for i in range(batch_size):
+        expected = infer_discrete(hmm, first_available_dim=-1, temperature=0)(data[:, i])
+        assert_equal(actual[:, i], expected)
+
+    # Subsequent calls reuse the contraction plan.
+    assert_equal(decoder(data), actual)
+    assert decoder.plan_cache.misses == 1
+    assert decoder.plan_cache.hits == 1
+
+
 @pytest.mark.xfail(reason='infer_discrete log_prob is incorrect')
 @pytest.mark.parametrize('nderivs', [0, 1], ids=['value', 'grad'])
 def test_prob(nderivs):
@@ -8,6 +8,7 @@ from collections import defaultdict
 
 import pytest
 import torch
+from six.moves.queue import LifoQueue
 from torch.autograd import grad
 from torch.distributions import constraints, kl_divergence
 
@@ -17,7 +18,7 @@ import pyro.optim
 import pyro.poutine as poutine
 from pyro.distributions.testing.rejection_gamma import ShapeAugmentedGamma
 from pyro.infer import SVI, config_enumerate
-from pyro.infer.enum import iter_discrete_traces
+from pyro.infer.enum import iter_discrete_escape, iter_discrete_extend, iter_discrete_traces
 from pyro.infer.traceenum_elbo import TraceEnum_ELBO
 from pyro.infer.util import LAST_CACHE_SIZE
 from pyro.util import torch_isnan
@@ -55,6 +56,26 @@ def test_iter_discrete_traces_order(depth, graph_type):
         assert sites == ["x{}".format(i) for i in range(depth)]
 
 
+def test_iter_discrete_traces_infer_not_shared():
+
+    @config_enumerate(default="sequential")
+    def model():
+        pyro.sample("x", dist.Bernoulli(0.5))
+        pyro.sample("y", dist.Categorical(torch.ones(3)))
+
+    traces = []
+    for trace in iter_discrete_traces("flat", model):
+        # mutations of a trace must not leak into the traces of sibling branches
+        for name in ["x", "y"]:
+            assert "foo" not in trace.nodes[name]["infer"]
+            trace.nodes[name]["infer"]["foo"] = True
+        traces.append(trace)
+
+    assert len(traces) == 2 * 3
+    infers = [trace.nodes[name]["infer"] for trace in traces for name in ["x", "y"]]
+    assert len(set(map(id, infers))) == len(infers)
+
+
 @pytest.mark.parametrize("graph_type", ["flat", "dense"])
 def test_iter_discrete_traces_scalar(graph_type):
     pyro.clear_param_store()
@@ -100,6 +121,40 @@ def test_iter_discrete_traces_vector(expand, graph_type):
     assert len(traces) == 2 * probs.size(-1)
 
 
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_iter_discrete_traces_matches_queue(depth):
+    num_calls = defaultdict(int)
+
+    @config_enumerate(default="sequential")
+    def model(depth):
+        num_calls["model"] += 1
+        z = pyro.sample("z", dist.Normal(0., 1.))
+        for i in range(depth):
+            pyro.sample("x{}".format(i), dist.Categorical(torch.ones(3)))
+        return z
+
+    def get_values(trace):
+        return tuple((name, site["value"].item(), site["infer"].get("_enum_total"))
+                     for name, site in trace.nodes.items() if site["type"] == "sample")
+
+    expected = set()
+    queue = LifoQueue()
+    queue.put(poutine.Trace())
+    traced_model = poutine.trace(poutine.queue(model, queue, escape_fn=iter_discrete_escape,
+                                               extend_fn=iter_discrete_extend))
+    while not queue.empty():
+        expected.add(get_values(traced_model.get_trace(depth))[1:])
+    num_calls.clear()
+
+    traces = list(iter_discrete_traces("flat", model, depth))
+    actual = set(get_values(trace)[1:] for trace in traces)
+
+    # Each execution yields a complete trace, and all traces share the continuous sample.
+    assert num_calls["model"] == len(traces) == 3 ** depth
+    assert len(set(trace.nodes["z"]["value"].item() for trace in traces)) == 1
+    assert actual == expected
+
+
 # The usual dist.Bernoulli avoids NANs by clamping log prob. This unsafe version
 # allows us to test additional NAN avoidance in _compute_dice_elbo().
 class UnsafeBernoulli(dist.Bernoulli):
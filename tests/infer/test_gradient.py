@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import logging
+import math
 
 import numpy as np
 import pytest
@@ -11,8 +12,8 @@ import pyro
 import pyro.distributions as dist
 import pyro.poutine as poutine
 from pyro.distributions.testing import fakes
-from pyro.infer import (SVI, JitTrace_ELBO, JitTraceEnum_ELBO, JitTraceGraph_ELBO, JitTraceMeanField_ELBO, Trace_ELBO,
-                        TraceEnum_ELBO, TraceGraph_ELBO, TraceMeanField_ELBO, config_enumerate)
+from pyro.infer import (SVI, JitTrace_ELBO, JitTraceEnum_ELBO, JitTraceGraph_ELBO, JitTraceMeanField_ELBO, RenyiELBO,
+                        Trace_ELBO, TraceEnum_ELBO, TraceGraph_ELBO, TraceMeanField_ELBO, config_enumerate)
 from pyro.optim import Adam
 from tests.common import assert_equal, xfail_if_not_implemented, xfail_param
 
@@ -233,3 +234,105 @@ def test_subsample_gradient_sequential(Elbo, reparameterized, subsample):
         logger.info('expected {} = {}'.format(name, expected_grads[name]))
         logger.info('actual   {} = {}'.format(name, actual_grads[name]))
     assert_equal(actual_grads, expected_grads, prec=precision)
+
+
+@pytest.mark.parametrize("reparameterized", [True, False], ids=["reparam", "nonreparam"])
+@pytest.mark.parametrize("subsample", [False, True], ids=["full", "subsample"])
+@pytest.mark.parametrize("Elbo", [
+    Trace_ELBO,
+    TraceGraph_ELBO,
+    TraceMeanField_ELBO,
+    TraceEnum_ELBO,
+])
+def test_static_structure_gradient(Elbo, reparameterized, subsample):
+    data = torch.tensor([-0.5, 2.0, 1.0])
+    subsample_size = 2 if subsample else None
+    Normal = dist.Normal if reparameterized else fakes.NonreparameterizedNormal
+
+    def model():
+        with pyro.plate("data", len(data), subsample_size) as ind:
+            z = pyro.sample("z", Normal(0, 1))
+            pyro.sample("x", Normal(z, 1), obs=data[ind])
+
+    def guide():
+        loc = pyro.param("loc", lambda: torch.zeros(len(data), requires_grad=True))
+        with pyro.plate("data", len(data), subsample_size) as ind:
+            pyro.sample("z", Normal(loc[ind], 1))
+
+    results = []
+    for static_structure in [False, True]:
+        pyro.clear_param_store()
+        pyro.set_rng_seed(0)
+        elbo = Elbo(max_plate_nesting=1, static_structure=static_structure,
+                    strict_enumeration_warning=False)
+        inference = SVI(model, guide, Adam({"lr": 0.1}), loss=elbo)
+        with xfail_if_not_implemented():
+            losses = torch.tensor([inference.step() for _ in range(3)])
+        results.append((losses, pyro.param("loc").detach().clone()))
+
+    assert_equal(results[1][0], results[0][0])
+    assert_equal(results[1][1], results[0][1])
+
+
+@pytest.mark.parametrize("reparameterized", [True, False], ids=["reparam", "nonreparam"])
+@pytest.mark.parametrize("vectorize_particles", [False, True], ids=["seq", "vec"])
+@pytest.mark.parametrize("Elbo", [
+    Trace_ELBO,
+    TraceMeanField_ELBO,
+    RenyiELBO,
+])
+def test_fused_particles_gradient(Elbo, reparameterized, vectorize_particles):
+    if Elbo is TraceMeanField_ELBO and not reparameterized:
+        pytest.skip("TraceMeanField_ELBO requires reparameterized guides")
+    data = torch.tensor([-0.5, 2.0, 1.0])
+    Normal = dist.Normal if reparameterized else fakes.NonreparameterizedNormal
+
+    def model():
+        with pyro.plate("data", len(data)):
+            z = pyro.sample("z", Normal(0, 1))
+            pyro.sample("x", Normal(z, 1), obs=data)
+
+    def guide():
+        loc = pyro.param("loc", lambda: torch.zeros(len(data), requires_grad=True))
+        with pyro.plate("data", len(data)):
+            pyro.sample("z", Normal(loc, 1))
+
+    results = []
+    for fuse_particles in [False, True]:
+        pyro.clear_param_store()
+        pyro.set_rng_seed(0)
+        elbo = Elbo(num_particles=4, vectorize_particles=vectorize_particles, max_plate_nesting=1,
+                    strict_enumeration_warning=False, fuse_particles=fuse_particles)
+        inference = SVI(model, guide, Adam({"lr": 0.1}), loss=elbo)
+        with xfail_if_not_implemented():
+            losses = torch.tensor([inference.step() for _ in range(3)])
+            losses = torch.cat([losses, torch.tensor([inference.evaluate_loss()])])
+        results.append((losses, pyro.param("loc").detach().clone()))
+
+    assert_equal(results[1][0], results[0][0])
+    assert_equal(results[1][1], results[0][1])
+
+
+def test_fused_particles_renyi_loss_without_sites():
+    # only every other particle has a sample site
+    calls = []
+
+    def model():
+        calls.append(None)
+        if len(calls) % 2:
+            pyro.sample("x", dist.Normal(0., 1.), obs=torch.tensor(0.5))
+
+    def guide():
+        pass
+
+    losses = []
+    for fuse_particles in [False, True]:
+        del calls[:]
+        elbo = RenyiELBO(num_particles=2, fuse_particles=fuse_particles)
+        losses.append(elbo.loss(model, guide))
+
+    # with alpha=0, the loss is -log of the mean likelihood over particles
+    log_prob = dist.Normal(0., 1.).log_prob(torch.tensor(0.5)).item()
+    expected = -math.log(0.5 * (math.exp(log_prob) + 1.))
+    assert_equal(losses[1], losses[0])
+    assert_equal(losses[0], expected, prec=1e-5)
@@ -253,6 +253,32 @@ def test_svi(Elbo, num_particles):
         inference.step(data)
 
 
+@pytest.mark.parametrize('Elbo', [JitTrace_ELBO, JitTraceGraph_ELBO, JitTraceEnum_ELBO])
+def test_svi_constrained_param(Elbo):
+    data = torch.arange(10.)
+
+    def model(data):
+        scale = pyro.param("scale", constant(1.0), constraint=constraints.positive)
+        # read twice, as memoized constrained values are shared between reads
+        pyro.param("scale")
+        pyro.sample("x", dist.Normal(0., scale).expand_by(data.shape).to_event(1), obs=data)
+
+    def guide(data):
+        pass
+
+    scales = []
+    for elbo in [Trace_ELBO(), Elbo(strict_enumeration_warning=False)]:
+        pyro.clear_param_store()
+        inference = SVI(model, guide, Adam({"lr": 0.1}), elbo)
+        for i in range(3):
+            inference.step(data)
+        scales.append(pyro.param("scale").detach().clone())
+
+    # gradients reach the unconstrained value, and eager reads are up to date
+    assert_equal(scales[1], scales[0])
+    assert not torch.equal(scales[1], constant(1.0))
+
+
 @pytest.mark.parametrize("enumerate2", ["sequential", "parallel"])
 @pytest.mark.parametrize("enumerate1", ["sequential", "parallel"])
 @pytest.mark.parametrize("plate_dim", [1, 2])
@@ -1607,3 +1607,22 @@ def test_mean_field_warn():
         pyro.sample("x", dist.Normal(y, 1.))
 
     assert_warning(model, guide, TraceMeanField_ELBO())
+
+
+@pytest.mark.parametrize("Elbo", [Trace_ELBO, TraceGraph_ELBO, TraceEnum_ELBO])
+def test_static_structure_change_error(Elbo):
+    data = torch.tensor([0., 1., 2.])
+
+    def model(dim):
+        with pyro.plate("data", len(data), dim=dim):
+            pyro.sample("x", dist.Normal(0., 1.), obs=data)
+
+    def guide(dim):
+        pass
+
+    elbo = Elbo(max_plate_nesting=1, static_structure=True, strict_enumeration_warning=False)
+    inference = SVI(model, guide, Adam({"lr": 1e-6}), elbo)
+    inference.step(-1)
+    inference.step(-1)
+    with pytest.raises(ValueError, match="plate stack overflow"):
+        inference.step(-2)
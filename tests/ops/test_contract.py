@@ -11,9 +11,11 @@ import torch
 
 import pyro.ops.jit
 from pyro.distributions.util import logsumexp
-from pyro.ops.contract import _partition_terms, contract_tensor_tree, contract_to_tensor, einsum, naive_ubersum, ubersum
+from pyro.ops.contract import (ContractionPlanCache, _partition_terms, contract_tensor_tree, contract_to_tensor, einsum,
+                               naive_ubersum, ubersum)
 from pyro.ops.einsum.adjoint import require_backward
-from pyro.ops.rings import LogRing
+from pyro.ops.einsum import contract
+from pyro.ops.rings import LinearRing, LogRing
 from pyro.poutine.indep_messenger import CondIndepStackFrame
 from pyro.util import optional
 from tests.common import assert_equal
@@ -277,6 +279,117 @@ def test_contract_tensor_tree(example):
                 assert term.shape[frame.dim] == frame.size
 
 
+@pytest.mark.parametrize('example', EXAMPLES)
+def test_contraction_plan_cache(example):
+    symbol_to_size = dict(zip('abcdij', [4, 5, 6, 7, 2, 3]))
+    sum_dims = example['sum_dims']
+    target_dims = example['target_dims']
+    target_ordinal = example['target_ordinal']
+    plan_cache = ContractionPlanCache()
+
+    for step in range(3):
+        tensor_tree = OrderedDict()
+        for t, shapes in example['shape_tree'].items():
+            for dims in shapes:
+                tensor = torch.randn(tuple(symbol_to_size[s] for s in dims))
+                tensor._pyro_dims = dims
+                tensor_tree.setdefault(t, []).append(tensor)
+
+        expected = contract_to_tensor(tensor_tree, sum_dims, target_ordinal, target_dims)
+        actual = contract_to_tensor(tensor_tree, sum_dims, target_ordinal, target_dims, plan_cache=plan_cache)
+        assert actual._pyro_dims == expected._pyro_dims
+        assert_equal(actual, expected)
+
+        expected_tree = contract_tensor_tree(tensor_tree, sum_dims)
+        actual_tree = contract_tensor_tree(tensor_tree, sum_dims, plan_cache=plan_cache)
+        assert list(actual_tree) == list(expected_tree)
+        for ordinal, terms in actual_tree.items():
+            for actual, expected in zip(terms, expected_tree[ordinal]):
+                assert actual._pyro_dims == expected._pyro_dims
+                assert_equal(actual, expected)
+
+    assert len(plan_cache) == plan_cache.misses == 2
+    assert plan_cache.hits == 4
+
+
+def test_contraction_plan_cache_max_size():
+    plan_cache = ContractionPlanCache(max_size=2)
+
+    def contract(size):
+        x = torch.randn(size, 3)
+        x._pyro_dims = 'ai'
+        tensor_tree = OrderedDict([(frozenset(), [x])])
+        return contract_to_tensor(tensor_tree, {'a'}, plan_cache=plan_cache)
+
+    for size in [2, 3, 2, 4]:
+        contract(size)
+    # the plan for size 3 was least recently used, so it was evicted
+    assert len(plan_cache) == 2
+    assert plan_cache.misses == 3
+    assert plan_cache.hits == 1
+    contract(2)
+    contract(3)
+    assert plan_cache.misses == 4
+    assert plan_cache.hits == 2
+
+
+@pytest.mark.parametrize('length', [8, 9, 10, 33])
+@pytest.mark.parametrize('ring_class', [LinearRing, LogRing])
+def test_sumproduct_markov_chain(length, ring_class):
+    # Terms of an HMM batched along a plate dim, with transition factors
+    # in alternating orientation.
+    chain = [opt_einsum.get_symbol(i) for i in range(length + 1)]
+    plate = opt_einsum.get_symbol(length + 1)
+    inputs = [chain[0] + plate]
+    for x, y in zip(chain[:-1], chain[1:]):
+        inputs.append(x + y if len(inputs) % 2 else y + plate + x)
+        inputs.append(plate + y)
+    sizes = {d: 3 for d in chain}
+    sizes[plate] = 2
+    terms = []
+    for dims in inputs:
+        term = torch.randn(tuple(sizes[d] for d in dims))
+        if ring_class is LinearRing:
+            term = term.exp()
+        term._pyro_dims = dims
+        terms.append(term)
+
+    actual = ring_class().sumproduct(terms, set(chain))
+    expected = contract(','.join(inputs) + '->' + plate, *terms, backend=ring_class._backend)
+    assert actual._pyro_dims == plate
+    if ring_class is LinearRing:
+        actual, expected = actual.log(), expected.log()
+    assert_equal(actual, expected, prec=1e-4)
+
+
+@pytest.mark.parametrize('memory_limit,scanned', [(100, False), (1000, True)])
+@pytest.mark.parametrize('ring_class', [LinearRing, LogRing])
+def test_sumproduct_markov_chain_memory_limit(memory_limit, scanned, ring_class):
+    length = 9
+    chain = [opt_einsum.get_symbol(i) for i in range(length + 1)]
+    plate = opt_einsum.get_symbol(length + 1)
+    inputs = [chain[0] + plate] + [x + plate + y for x, y in zip(chain[:-1], chain[1:])]
+    sizes = {d: 3 for d in chain}
+    sizes[plate] = 2
+    terms = []
+    for dims in inputs:
+        term = torch.randn(tuple(sizes[d] for d in dims))
+        if ring_class is LinearRing:
+            term = term.exp()
+        term._pyro_dims = dims
+        terms.append(term)
+
+    # the scan stacks 9 factors of 2 x 3 x 3 elements
+    ring = ring_class(memory_limit=memory_limit)
+    assert (ring._scan_sumproduct(terms, set(chain), inputs) is not None) == scanned
+    actual = ring.sumproduct(terms, set(chain))
+    expected = contract(','.join(inputs) + '->' + plate, *terms, backend=ring_class._backend)
+    assert actual._pyro_dims == plate
+    if ring_class is LinearRing:
+        actual, expected = actual.log(), expected.log()
+    assert_equal(actual, expected, prec=1e-4)
+
+
 # Let abcde be enum dims and ijk be plates.
 UBERSUM_EXAMPLES = [
     ('->', ''),
@@ -423,6 +536,26 @@ def test_einsum_linear(equation, plates):
                          output, expected_part.detach().cpu(), actual_part.detach().cpu()))
 
 
+@pytest.mark.parametrize('backend', ['torch', 'pyro.ops.einsum.torch_log'])
+@pytest.mark.parametrize('equation,plates', UBERSUM_EXAMPLES)
+def test_einsum_memory_limit(equation, plates, backend):
+    inputs, outputs, operands, sizes = make_example(equation)
+    if backend == 'torch':
+        operands = [x.exp() for x in operands]
+
+    try:
+        expected = einsum(equation, *operands, plates=plates, modulo_total=True, backend=backend)
+    except NotImplementedError:
+        pytest.skip()
+
+    actual = einsum(equation, *operands, plates=plates, modulo_total=True, backend=backend, memory_limit=4)
+    assert len(actual) == len(expected)
+    for output, expected_part, actual_part in zip(outputs, expected, actual):
+        assert_equal(expected_part, actual_part, prec=1e-4,
+                     msg=u"For output '{}':\nExpected:\n{}\nActual:\n{}".format(
+                         output, expected_part.detach().cpu(), actual_part.detach().cpu()))
+
+
 @pytest.mark.parametrize('equation,plates', UBERSUM_EXAMPLES)
 def test_ubersum_jit(equation, plates):
     inputs, outputs, operands, sizes = make_example(equation)
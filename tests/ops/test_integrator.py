@@ -6,7 +6,8 @@ from collections import namedtuple
 import pytest
 import torch
 
-from pyro.ops.integrator import velocity_verlet
+from pyro.infer.mcmc.util import FlatLayout
+from pyro.ops.integrator import batched_velocity_verlet, velocity_verlet
 from tests.common import assert_equal
 
 logger = logging.getLogger(__name__)
@@ -150,3 +151,54 @@ def test_time_reversibility(example):
                                      args.step_size,
                                      args.num_steps)
     assert_equal(q_f, args.q_i, 1e-5)
+
+
+def test_batched_trajectory():
+    model = HarmonicOscillator
+    step_size = torch.tensor([0.01, 0.02])
+    num_steps = torch.tensor([100, 30])
+    q_i = {'x': torch.tensor([[0.0], [0.5]])}
+    p_i = {'x': torch.tensor([[1.0], [-1.0]])}
+
+    def potential_fn(q):
+        return 0.5 * (q['x'] ** 2).sum(-1)
+
+    q_f, p_f, _, potential_energy = batched_velocity_verlet(q_i,
+                                                            p_i,
+                                                            potential_fn,
+                                                            model.inverse_mass_matrix.expand(2, 1),
+                                                            step_size,
+                                                            num_steps)
+    for i in range(2):
+        expected_q, expected_p, _, expected_pe = velocity_verlet({'x': q_i['x'][i]},
+                                                                 {'x': p_i['x'][i]},
+                                                                 model.potential_fn,
+                                                                 model.inverse_mass_matrix,
+                                                                 step_size[i].item(),
+                                                                 num_steps[i].item())
+        assert_equal(q_f['x'][i], expected_q['x'])
+        assert_equal(p_f['x'][i], expected_p['x'])
+        assert_equal(potential_energy[i], expected_pe.sum())
+
+
+@pytest.mark.parametrize('dense_mass', [False, True])
+def test_flat_trajectory(dense_mass):
+    q_i = {'x': torch.tensor([0.5, -1.0]), 'y': torch.tensor([[1.0, 2.0], [0.0, -0.5]])}
+    p_i = {'x': torch.tensor([1.0, 0.2]), 'y': torch.tensor([[-1.0, 0.0], [0.3, 0.5]])}
+    layout = FlatLayout({name: value.shape for name, value in q_i.items()})
+    inverse_mass_matrix = torch.tensor([1.0, 2.0, 0.5, 1.0, 1.5, 3.0])
+    if dense_mass:
+        inverse_mass_matrix = inverse_mass_matrix.diag()
+
+    def potential_fn(q):
+        return 0.5 * (q['x'] ** 2).sum() + (q['y'] ** 4).sum() + q['x'].dot(q['y'].sum(0))
+
+    expected_q, expected_p, expected_grads, expected_pe = velocity_verlet(q_i, p_i, potential_fn,
+                                                                          inverse_mass_matrix, 0.01, 20)
+    q_f, p_f, z_grads, potential_energy = velocity_verlet(layout.pack(q_i), layout.pack(p_i),
+                                                          lambda q: potential_fn(layout.unpack(q)),
+                                                          inverse_mass_matrix, 0.01, 20)
+    assert_equal(layout.unpack(q_f), expected_q)
+    assert_equal(layout.unpack(p_f), expected_p)
+    assert_equal(layout.unpack(z_grads), expected_grads)
+    assert_equal(potential_energy, expected_pe)
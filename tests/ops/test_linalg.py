@@ -3,7 +3,7 @@ from __future__ import absolute_import, division, print_function
 import pytest
 import torch
 
-from pyro.ops.linalg import rinverse
+from pyro.ops.linalg import conjugate_gradient, lanczos_logdet, pivoted_cholesky, rinverse
 from tests.common import assert_equal
 
 
@@ -23,3 +23,31 @@ def test_sym_rinverse(A, use_sym):
     batched_A = A.unsqueeze(0).unsqueeze(0).expand(5, 4, d, d)
     expected_A = torch.inverse(A).unsqueeze(0).unsqueeze(0).expand(5, 4, d, d)
     assert_equal(rinverse(batched_A, sym=use_sym), expected_A, prec=1e-8)
+
+
+def _random_spd(N):
+    A = torch.randn(N, N)
+    return A.matmul(A.t()) + N * torch.eye(N)
+
+
+@pytest.mark.parametrize("use_precond", [False, True])
+def test_conjugate_gradient(use_precond):
+    A = _random_spd(20)
+    B = torch.randn(20, 3)
+    precond = (lambda V: V / A.diag().unsqueeze(-1)) if use_precond else None
+    X = conjugate_gradient(A.matmul, B, precond, tol=1e-6)
+    assert_equal(X, torch.gesv(B, A)[0], prec=1e-4)
+
+
+def test_lanczos_logdet():
+    A = _random_spd(20)
+    probes = torch.randn(20, 200)
+    assert_equal(lanczos_logdet(A.matmul, probes, num_iter=20), A.logdet(), prec=0.05 * A.logdet().item())
+
+
+def test_pivoted_cholesky():
+    L = torch.randn(20, 4)
+    A = L.matmul(L.t())
+    Lr = pivoted_cholesky(A.diag(), lambda i: A[i], rank=10)
+    assert Lr.size(1) <= 5
+    assert_equal(Lr.matmul(Lr.t()), A, prec=1e-4)
@@ -2,7 +2,8 @@ import numpy as np
 import pytest
 import torch
 
-from pyro.ops.welford import WelfordCovariance
+from pyro.ops.stats import split_gelman_rubin
+from pyro.ops.welford import WelfordBatchMeans, WelfordCovariance
 from pyro.util import optional
 from tests.common import assert_equal
 
@@ -49,3 +50,55 @@ def test_welford_dense(n_samples, dim_size):
         estimates = w.get_covariance(regularize=False).data.cpu().numpy()
         sample_cov = np.cov(torch.stack(samples).data.cpu().numpy(), bias=False, rowvar=False)
         assert_equal(estimates, sample_cov)
+
+
+@pytest.mark.parametrize('n_samples', [1000, 1, 3])
+@pytest.mark.parametrize('num_chains', [1, 4])
+@pytest.mark.init(rng_seed=7)
+def test_welford_batch_means(n_samples, num_chains):
+    w = WelfordBatchMeans(num_batches=16)
+    samples = torch.randn(n_samples, num_chains, 3)
+    for sample in samples:
+        w.update(sample)
+
+    assert_equal(w.get_mean(), samples.mean(dim=0))
+    with optional(pytest.raises(RuntimeError), n_samples < 2):
+        assert_equal(w.get_variance(), samples.var(dim=0))
+    with optional(pytest.raises(RuntimeError), n_samples < 4):
+        assert_equal(w.get_split_gelman_rubin(), split_gelman_rubin(samples.transpose(0, 1)), prec=0.05)
+
+
+@pytest.mark.init(rng_seed=7)
+def test_welford_batch_means_ess():
+    # AR(1) chains with autocorrelation rho ** lag, whose effective sample size
+    # is n_samples * (1 - rho) / (1 + rho) per chain
+    rho, n_samples, num_chains = 0.5, 6144, 8
+    noise = torch.randn(n_samples, num_chains, 3, dtype=torch.float64)
+    samples = [noise[0] / (1 - rho ** 2) ** 0.5]
+    for eps in noise[1:]:
+        samples.append(rho * samples[-1] + eps)
+    samples = torch.stack(samples)
+    w = WelfordBatchMeans(num_batches=64)
+    for sample in samples:
+        w.update(sample)
+    actual = w.get_effective_sample_size()
+
+    # batch means estimate over the full batches seen so far
+    num_batches = n_samples // w.batch_size
+    batch_means = samples[:num_batches * w.batch_size].reshape(
+        (num_batches, w.batch_size) + samples.shape[1:]).mean(dim=1)
+    expected = (n_samples * samples.var(dim=0) / (w.batch_size * batch_means.var(dim=0))).sum(dim=0)
+    assert_equal(actual / expected, torch.ones(3, dtype=torch.float64), prec=1e-6)
+
+    true_ess = n_samples * num_chains * (1 - rho) / (1 + rho)
+    assert_equal(actual / true_ess, torch.ones(3, dtype=torch.float64), prec=0.25)
+
+
+@pytest.mark.parametrize('n_samples', [0, 1, 2])
+def test_welford_batch_means_ess_insufficient_samples(n_samples):
+    w = WelfordBatchMeans(num_batches=4)
+    for sample in torch.randn(n_samples, 2, 3):
+        w.update(sample)
+
+    with optional(pytest.raises(RuntimeError, match='effective sample size'), n_samples < 2):
+        assert w.get_effective_sample_size().shape == (3,)
@@ -163,3 +163,74 @@ def test_clippedadam_lrd(lrd):
         x1.backward(g)
         opt_ca.step()
         assert opt_ca.param_groups[0]['lr'] == orig_lr * lrd**(step + 1)
+
+
+@pytest.mark.parametrize('factory, lr_name', [
+    (optim.Adam, 'lr'),
+    (optim.ClippedAdam, 'lr'),
+    (optim.SGD, 'lr'),
+    (optim.Adagrad, 'lr'),
+    (optim.AdagradRMSProp, 'eta'),
+])
+def test_fused_matches_unfused(factory, lr_name):
+
+    def model(step):
+        pyro.sample('latent', Normal(torch.tensor(0.), torch.tensor(1.)))
+
+    def guide(step):
+        locs = [pyro.param('loc_{}'.format(i), torch.tensor(float(i))) for i in range(5)]
+        scale = pyro.param('scale', torch.tensor(0.5), constraint=constraints.positive)
+        # only a subset of locs is optimized at each step
+        pyro.sample('latent', Normal(locs[step % 5] + locs[(step + 2) % 5], scale))
+
+    def optim_args(module_name, param_name):
+        return {lr_name: 0.1 if param_name == 'scale' else 0.01}
+
+    results = []
+    for fused in [False, True]:
+        pyro.clear_param_store()
+        pyro.set_rng_seed(0)
+        adam = factory(optim_args, fused=fused)
+        svi = SVI(model, guide, adam, loss=TraceGraph_ELBO())
+        for step in range(7):
+            svi.step(step)
+        if fused:
+            assert len(set(map(id, adam.optim_objs.values()))) == 2
+        params = {name: pyro.param(name).detach().clone()
+                  for name in pyro.get_param_store().get_all_param_names()}
+        results.append((params, adam.get_state()))
+
+    (expected_params, expected_state), (actual_params, actual_state) = results
+    assert_equal(actual_params, expected_params)
+    assert set(actual_state) == set(expected_state)
+    for name in expected_state:
+        assert_equal(list(actual_state[name]['state'].values()),
+                     list(expected_state[name]['state'].values()))
+
+
+def test_fused_state_round_trip():
+
+    def model():
+        pyro.sample('latent', Normal(torch.tensor(0.), torch.tensor(1.)))
+
+    def guide():
+        loc = pyro.param('loc', torch.tensor(0.))
+        pyro.sample('latent', Normal(loc, torch.tensor(1.)))
+
+    pyro.clear_param_store()
+    adam = optim.Adam({'lr': 0.01})
+    svi = SVI(model, guide, adam, loss=TraceGraph_ELBO())
+    svi.step()
+    state = adam.get_state()
+
+    fused_adam = optim.Adam({'lr': 0.01}, fused=True)
+    fused_adam.set_state(state)
+    svi = SVI(model, guide, fused_adam, loss=TraceGraph_ELBO())
+    svi.step()
+    assert list(fused_adam.get_state()['loc']['state'].values())[0]['step'] == 2
+
+    adam = optim.Adam({'lr': 0.01})
+    adam.set_state(fused_adam.get_state())
+    svi = SVI(model, guide, adam, loss=TraceGraph_ELBO())
+    svi.step()
+    assert list(adam.get_state()['loc']['state'].values())[0]['step'] == 3
@@ -10,6 +10,7 @@ from torch import nn as nn
 from torch.distributions import constraints
 
 import pyro
+from pyro.infer.util import zero_grads
 from tests.common import assert_equal
 
 
@@ -123,3 +124,65 @@ def test_dict_interface():
     assert param_store['y'].shape == (4, 5)
     assert_equal(param_store.setdefault('y', torch.zeros(4, 5)), torch.ones(4, 5))
     assert_equal(param_store['y'].unconstrained(), torch.zeros(4, 5))
+
+
+def test_flatten():
+    param_store = pyro.get_param_store()
+    param_store.clear()
+    param_store['x'] = torch.zeros(2, 3)
+    param_store.setdefault('y', torch.ones(4), constraint=constraints.positive)
+    param_store.flatten()
+    param_store.setdefault('z', torch.full((5,), 2.))
+
+    unconstrained = dict(param_store.named_parameters())
+    buffers = param_store.flat_parameters()
+    assert len(buffers) == 1
+    buffer = buffers[0]
+    for value in unconstrained.values():
+        assert value.is_leaf and value.requires_grad
+        assert value.storage().data_ptr() == buffer.storage().data_ptr()
+    assert_equal(param_store['x'], torch.zeros(2, 3))
+    assert_equal(param_store['y'], torch.ones(4))
+    assert_equal(param_store['z'], torch.full((5,), 2.))
+
+    # a single optimizer over the flat buffer updates all params
+    loss = sum(param_store[name].sum() for name in ['x', 'y', 'z'])
+    loss.backward()
+    assert_equal(unconstrained['x'].grad, torch.ones(2, 3))
+    torch.optim.SGD(buffers, lr=0.1).step()
+    assert_equal(param_store['x'], torch.full((2, 3), -0.1))
+    assert_equal(param_store['z'], torch.full((5,), 1.9))
+
+    param_store.zero_grad()
+    for value in unconstrained.values():
+        assert_equal(value.grad, torch.zeros(value.shape))
+    zero_grads(unconstrained.values())
+    assert buffer.grad.storage().data_ptr() == unconstrained['y'].grad.storage().data_ptr()
+    param_store.clear()
+
+
+def test_constrained_value_memo():
+    param_store = pyro.get_param_store()
+    param_store.clear()
+    x = param_store.setdefault('x', torch.ones(3), constraint=constraints.positive)
+    assert param_store['x'] is x
+    with torch.no_grad():
+        assert param_store['x'] is not x
+
+    # in-place updates invalidate the memo
+    with torch.no_grad():
+        x.unconstrained().add_(1.)
+    y = param_store['x']
+    assert y is not x
+    assert_equal(y, torch.full((3,), 1.).exp())
+
+    # backward passes invalidate the memo
+    optim = torch.optim.SGD([y.unconstrained()], lr=0.1)
+    for step in range(2):
+        z = param_store['x']
+        assert param_store['x'] is z
+        (z.sum() + param_store['x'].sum()).backward()
+        optim.step()
+        optim.zero_grad()
+        assert param_store['x'] is not z
+    param_store.clear()
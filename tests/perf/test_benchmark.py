@@ -78,7 +78,10 @@ def poisson_gamma_model(reparameterized, Elbo):
 
 
 @register_model(kernel=NUTS, step_size=0.02, num_samples=300, id='BernoulliBeta::NUTS')
+@register_model(kernel=NUTS, step_size=0.02, num_samples=300, jit_compile=True, id='BernoulliBeta::NUTS_jit')
 @register_model(kernel=HMC, step_size=0.02, num_steps=3, num_samples=1000, id='BernoulliBeta::HMC')
+@register_model(kernel=HMC, step_size=0.02, num_steps=3, num_samples=1000, jit_compile=True,
+                id='BernoulliBeta::HMC_jit')
 def bernoulli_beta_hmc(**kwargs):
     def model(data):
         alpha = pyro.param('alpha', torch.tensor([1.1, 1.1]))
@@ -97,6 +100,26 @@ def bernoulli_beta_hmc(**kwargs):
     return mcmc_run.marginal('p_latent').empirical
 
 
+@register_model(num_sites=1000, num_steps=20, Elbo=Trace_ELBO, id='ManySites::Trace')
+def many_sites(num_sites, num_steps, Elbo):
+    # measures the per-site overhead of the effect stack and trace bookkeeping
+    pyro.set_rng_seed(0)
+    pyro.clear_param_store()
+
+    def model():
+        for i in range(num_sites):
+            pyro.sample("z_{}".format(i), dist.Normal(0., 1.))
+
+    def guide():
+        loc = pyro.param("loc", torch.tensor(0.))
+        for i in range(num_sites):
+            pyro.sample("z_{}".format(i), dist.Normal(loc, 1.))
+
+    svi = SVI(model, guide, optim.Adam({"lr": 0.01}), loss=Elbo())
+    for step in range(num_steps):
+        svi.step()
+
+
 @register_model(num_steps=2000, whiten=False, id='VSGP::MultiClass_whiten=False')
 @register_model(num_steps=2000, whiten=True, id='VSGP::MultiClass_whiten=True')
 def vsgp_multiclass(num_steps, whiten):
@@ -0,0 +1,122 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+import torch
+
+import pyro
+import pyro.distributions as dist
+import pyro.poutine as poutine
+from pyro.poutine.messenger import Messenger
+from pyro.poutine.runtime import _PYRO_STACK
+from tests.common import assert_equal
+
+
+class _RecordingMessenger(Messenger):
+    def __init__(self, name, log, stop=False):
+        self.name = name
+        self.log = log
+        self.stop = stop
+        super(_RecordingMessenger, self).__init__()
+
+    def _pyro_sample(self, msg):
+        self.log.append(("process", self.name))
+        if self.stop:
+            msg["stop"] = True
+
+    def _pyro_post_sample(self, msg):
+        self.log.append(("postprocess", self.name))
+
+
+class _NoopMessenger(Messenger):
+    pass
+
+
+@pytest.mark.parametrize("stop_at", [None, 0, 1, 2])
+def test_apply_stack_skips_noop_frames(stop_at):
+    log = []
+    frames = []
+    for i in range(3):
+        frames.append(_RecordingMessenger(i, log, stop=(i == stop_at)))
+        frames.append(_NoopMessenger())
+
+    for frame in frames:
+        frame.__enter__()
+    try:
+        pyro.sample("x", dist.Normal(0., 1.))
+    finally:
+        for frame in reversed(frames):
+            frame.__exit__(None, None, None)
+
+    stop_at = 0 if stop_at is None else stop_at
+    expected = [("process", i) for i in reversed(range(stop_at, 3))]
+    expected += [("postprocess", i) for i in range(stop_at, 3)]
+    assert log == expected
+    assert not _PYRO_STACK
+
+
+def test_apply_stack_stack_changes():
+    log = []
+
+    with _RecordingMessenger("outer", log):
+        pyro.sample("x", dist.Normal(0., 1.))
+        with _RecordingMessenger("inner", log):
+            pyro.sample("y", dist.Normal(0., 1.))
+        pyro.sample("z", dist.Normal(0., 1.))
+
+    assert log == [("process", "outer"), ("postprocess", "outer"),
+                   ("process", "inner"), ("process", "outer"),
+                   ("postprocess", "outer"), ("postprocess", "inner"),
+                   ("process", "outer"), ("postprocess", "outer")]
+
+
+def test_apply_stack_register_unregister():
+    log = []
+
+    def _pyro_foo(msg):
+        log.append(msg["name"])
+
+    foo = poutine.runtime.effectful(lambda: torch.tensor(0.), type="foo")
+    with _NoopMessenger():
+        foo(name="a")
+        _NoopMessenger.register(_pyro_foo, type="foo")
+        try:
+            foo(name="b")
+        finally:
+            _NoopMessenger.unregister(_pyro_foo, type="foo")
+        foo(name="c")
+
+    assert log == ["b"]
+
+
+def test_apply_stack_instance_handler():
+    log = []
+    frame = _NoopMessenger()
+    frame._pyro_sample = lambda msg: log.append(msg["name"])
+    with _NoopMessenger():
+        pyro.sample("x", dist.Normal(0., 1.))
+    with frame:
+        pyro.sample("y", dist.Normal(0., 1.))
+
+    assert log == ["y"]
+
+
+def test_apply_stack_lift_replay():
+    def model():
+        return pyro.param("loc", torch.tensor(0.))
+
+    prior = dist.Normal(0., 1.)
+    guide_trace = poutine.trace(poutine.lift(model, prior)).get_trace()
+    # lift turns the param site into a sample site, which replay must see
+    trace = poutine.trace(poutine.replay(poutine.lift(model, prior), trace=guide_trace)).get_trace()
+    assert trace.nodes["loc"]["type"] == "sample"
+    assert_equal(trace.nodes["loc"]["value"], guide_trace.nodes["loc"]["value"])
+
+
+def test_apply_stack_lift_trace_param_only():
+    def model():
+        pyro.param("scale", torch.tensor(1.))
+        return pyro.param("loc", torch.tensor(0.))
+
+    trace = poutine.trace(poutine.lift(model, {"loc": dist.Normal(0., 1.)}), param_only=True).get_trace()
+    assert "scale" in trace.nodes
+    assert "loc" not in trace.nodes
@@ -0,0 +1,81 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from pyro.poutine import Trace
+
+
+def _make_trace(names, edges=()):
+    trace = Trace(graph_type="dense" if edges else "flat")
+    for name in names:
+        trace.add_node(name, name=name, type="sample")
+    for site1, site2 in edges:
+        trace.add_edge(site1, site2)
+    return trace
+
+
+def test_nodes_are_ordered():
+    trace = _make_trace(["c", "a", "b"])
+    assert list(trace.nodes) == ["c", "a", "b"]
+    assert list(trace.nodes()) == ["c", "a", "b"]
+    assert list(trace) == ["c", "a", "b"]
+    assert len(trace) == 3
+    assert "a" in trace
+    assert "d" not in trace
+    assert trace.edges() == []
+
+
+def test_duplicate_site_error():
+    trace = _make_trace(["a"])
+    with pytest.raises(RuntimeError):
+        trace.add_node("a", name="a", type="sample")
+    with pytest.raises(RuntimeError):
+        trace.add_node("a", name="a", type="param")
+
+
+@pytest.mark.parametrize("edges", [
+    [],
+    [("a", "b"), ("b", "c")],
+    [("c", "b"), ("b", "a")],
+    [("a", "c"), ("b", "c"), ("c", "d")],
+    [("d", "a"), ("d", "b"), ("a", "c"), ("b", "c")],
+])
+def test_topological_sort(edges):
+    trace = _make_trace(["a", "b", "c", "d"], edges)
+    order = trace.topological_sort()
+    assert sorted(order) == ["a", "b", "c", "d"]
+    for site1, site2 in edges:
+        assert order.index(site1) < order.index(site2)
+    assert trace.topological_sort(reverse=True) == order[::-1]
+    if not edges:
+        assert order == ["a", "b", "c", "d"]
+
+
+def test_topological_sort_cycle_error():
+    trace = _make_trace(["a", "b"], [("a", "b"), ("b", "a")])
+    with pytest.raises(ValueError):
+        trace.topological_sort()
+
+
+def test_remove_node():
+    trace = _make_trace(["a", "b", "c"], [("a", "b"), ("b", "c"), ("a", "c")])
+    trace.remove_node("b")
+    assert list(trace.nodes) == ["a", "c"]
+    assert set(trace.edges) == {("a", "c")}
+    assert list(trace.successors("a")) == ["c"]
+    assert list(trace.predecessors("c")) == ["a"]
+
+
+def test_copy():
+    trace = _make_trace(["a", "b"], [("a", "b")])
+    copy = trace.copy()
+    assert copy.graph_type == trace.graph_type
+    assert list(copy.nodes) == ["a", "b"]
+    assert copy.edges == [("a", "b")]
+
+    copy.nodes["a"]["value"] = 0.
+    copy.add_node("c", name="c", type="sample")
+    copy.add_edge("b", "c")
+    assert "value" not in trace.nodes["a"]
+    assert "c" not in trace
+    assert list(trace.successors("b")) == []